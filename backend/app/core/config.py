@@ -28,10 +28,59 @@ class Settings:
         self.CONTRACT_ADDRESS = "0x950c656375dbeb78a59a498c69df136fc35f9fcc"
         self.PRIVATE_KEY = ""
         self.SERVER_ADDRESS = ""
+        # 额外的热钱包签名私钥(逗号分隔)，需在合约中通过 addAdvisor 授权；与 PRIVATE_KEY 一起轮流发送交易
+        self.SIGNER_PRIVATE_KEYS: List[str] = []
         self.CHAIN_ID = 11155111
         self.NETWORK_NAME = "sepolia"
         self.CONTRACT_ABI = ""
         
+        # 区块链调用设置: 同步web3调用在有界线程池中执行
+        self.BLOCKCHAIN_EXECUTOR_WORKERS = 8
+        self.RECEIPT_POLL_INTERVAL = 2.0
+        self.RECEIPT_TIMEOUT = 120
+        self.RECEIPT_BATCH_SIZE = 100
+        
+        # RPC节点池设置: BLOCKCHAIN_RPC_URL 与 RPC_URLS 按延迟评分选择，失败时切换
+        self.RPC_URLS: List[str] = []
+        self.RPC_REQUEST_TIMEOUT = 10.0
+        self.RPC_EWMA_ALPHA = 0.3
+        self.RPC_HEDGE_DELAY = 0.2
+        self.RPC_FAILURE_THRESHOLD = 3
+        self.RPC_COOLDOWN = 30.0
+        self.RPC_HEALTH_INTERVAL = 15.0
+        self.RPC_MAX_BLOCK_LAG = 5
+        
+        # 交易费用设置: eip1559 按 eth_feeHistory 分位数报价，legacy 使用 gasPrice
+        self.FEE_MODE = "eip1559"
+        self.FEE_TARGET_BLOCKS = 2
+        self.FEE_HISTORY_BLOCKS = 20
+        self.FEE_PRIORITY_PERCENTILE = 50
+        self.FEE_MIN_PRIORITY_FEE = 100000000
+        self.FEE_MAX_FEE_PER_GAS = 0
+        self.FEE_QUOTE_TTL = 6.0
+        self.GAS_ESTIMATE_MARGIN = 0.25
+        
+        # 卡住交易替换设置
+        self.TX_STUCK_BLOCKS = 3
+        self.TX_MAX_REPLACEMENTS = 3
+        self.TX_FEE_BUMP_PERCENT = 15.0
+        self.TX_HISTORY_SIZE = 1000
+        
+        # 上链模式: single 每个请求一笔 recordRequest，batch 按窗口聚合为Merkle根后 anchorBatch
+        self.ANCHOR_MODE = "single"
+        self.ANCHOR_BATCH_WINDOW = 5.0
+        self.ANCHOR_BATCH_MAX_ITEMS = 200
+        self.ANCHOR_DB_PATH = "./data/anchors.db"
+        
+        # 事件索引设置: 同步 RequestRecorded 事件到本地SQLite，为 /api/history 提供分页查询
+        # 默认关闭；启用时必须把 INDEXER_START_BLOCK 设为合约部署所在区块，为0时不会启动
+        self.INDEXER_ENABLED = False
+        self.INDEXER_DB_PATH = "./data/events.db"
+        self.INDEXER_START_BLOCK = 0
+        self.INDEXER_CHUNK_SIZE = 2000
+        self.INDEXER_REORG_DEPTH = 12
+        self.INDEXER_POLL_INTERVAL = 12.0
+        
         # IPFS设置
         self.PINATA_API_KEY = None
         self.PINATA_SECRET_KEY = None
@@ -46,6 +95,59 @@ class Settings:
         self.DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
         self.DEEPSEEK_MODEL = "deepseek-chat"
         
+        # 建议任务队列设置
+        self.ADVICE_WORKERS = 4
+        self.ADVICE_QUEUE_SIZE = 100
+        self.ADVICE_JOB_RETENTION = 3600
+        self.ADVICE_JOB_MAX_STORED = 1000
+        self.ADVICE_IDEMPOTENCY_WINDOW = 86400
+        self.ADVICE_IDEMPOTENCY_MAX_ENTRIES = 10000
+        
+        # 投资建议缓存设置
+        self.ADVICE_CACHE_SIZE = 256
+        self.ADVICE_CACHE_TTL = 600
+        self.ADVICE_CACHE_FEAR_GREED_BAND = 10
+        
+        # 市场数据缓存设置(秒)
+        self.FEAR_GREED_CACHE_TTL = 300
+        self.GAS_PRICE_CACHE_TTL = 15
+        self.MARKET_CACHE_STALE_TTL = 120
+        self.MARKET_POLL_INTERVAL = 30
+        self.MARKET_HISTORY_PATH = "./data/market_history.bin"
+        self.MARKET_HISTORY_CAPACITY = 86400
+        self.MARKET_STREAM_QUEUE_SIZE = 8
+        self.MARKET_STREAM_HEARTBEAT = 15
+        
+        # 多链GAS预言机设置，格式为 "链名称:链ID"
+        self.GAS_ORACLE_CHAINS = [
+            "ethereum:1",
+            "polygon:137",
+            "bsc:56",
+            "arbitrum:42161",
+            "optimism:10",
+            "base:8453",
+            "avalanche:43114",
+        ]
+        self.GAS_ORACLE_TIMEOUT = 5.0
+        
+        # 共享HTTP连接池设置
+        self.HTTP_POOL_LIMIT = 100
+        self.HTTP_POOL_LIMIT_PER_HOST = 20
+        self.HTTP_KEEPALIVE_TIMEOUT = 30
+        self.HTTP_DNS_CACHE_TTL = 300
+        self.HTTP_WARMUP = True
+        
+        # 响应压缩设置
+        self.COMPRESSION_MIN_SIZE = 1024
+        self.GZIP_LEVEL = 6
+        self.BROTLI_QUALITY = 5
+        
+        # IPFS设置: 本地预先计算CID，使上传与签名、上链并行
+        self.IPFS_PRECOMPUTE_CID = True
+        
+        # 追踪设置: 请求携带该头时在 Server-Timing 响应头中回显各阶段耗时
+        self.TRACE_HEADER = "X-Trace-Id"
+        
         # 日志设置
         self.LOG_LEVEL = "INFO"
         
@@ -73,8 +175,10 @@ class Settings:
                     setattr(self, attr_name, env_value.lower() == "true")
                 elif isinstance(current_value, int):
                     setattr(self, attr_name, int(env_value))
-                elif isinstance(current_value, list) and attr_name == "CORS_ORIGINS":
-                    setattr(self, attr_name, env_value.split(","))
+                elif isinstance(current_value, float):
+                    setattr(self, attr_name, float(env_value))
+                elif isinstance(current_value, list):
+                    setattr(self, attr_name, [item.strip() for item in env_value.strip("\"'").split(",") if item.strip()])
                 else:
                     # 特殊处理，移除可能的引号
                     processed_value = env_value
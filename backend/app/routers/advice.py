@@ -1,118 +1,227 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+import asyncio
 import time
 from eth_utils import keccak
 import json
 import logging
+from typing import Any, Dict, Optional
 
+from ..core.config import settings
 from ..schemas.advice import AdviceRequest, ActionResponse, RecommendationData, TradeData, VerifyTransactionResponse
-from ..services.ai_model import generate_investment_advice
-from ..services.blockchain import record_to_blockchain, create_signature, verify_transaction, get_user_requests
-from ..services.ipfs import store_data_to_ipfs, retrieve_data_from_ipfs, check_ipfs_content_availability
+from ..services.ai_model import advice_cache
+from ..services.advice_jobs import advice_jobs
+from ..services.batch_anchor import batch_anchorer
+from ..services.event_indexer import event_indexer
+from ..services.blockchain import verify_transaction, get_user_requests_page
+from ..services.ipfs import retrieve_data_from_ipfs, check_ipfs_content_availability
+from ..utils.cursor import CHAIN_CURSOR, INDEX_CURSOR, decode_cursor
+from ..utils.sse import format_sse_event, SSE_HEADERS
+from ..utils.http_cache import cached_json_response, is_not_modified, make_etag, not_modified_response
 
 router = APIRouter(prefix="/api", tags=["投资建议"])
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
-@router.post("/advice", response_model=ActionResponse)
-async def get_investment_advice(request: AdviceRequest):
+# IPFS内容按CID寻址，内容不会变化，可永久缓存
+IPFS_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 任务进度推送的心跳间隔(秒)
+JOB_EVENTS_HEARTBEAT = 15
+
+@router.post("/advice", status_code=status.HTTP_202_ACCEPTED)
+async def get_investment_advice(
+    request: AdviceRequest,
+    response: Response,
+    wait: bool = Query(False, description="为true时等待任务完成并直接返回最终结果")
+):
     """
-    获取AI投资建议并在区块链上记录存证
+    提交AI投资建议任务
     
-    处理流程:
-    1. 记录请求信息
-    2. 调用AI模型生成建议或交易方案
-    3. 存储数据到IPFS
-    4. 创建签名并上链存证
-    5. 返回结果给前端
+    请求立即返回任务ID，生成建议、存储IPFS、签名和上链存证由后台worker依次执行。
+    通过 GET /api/advice/jobs/{job_id} 查询进度，或订阅 /api/advice/jobs/{job_id}/events。
+    相同 (userAddress, requestHash) 的重复提交返回已有任务，不会重复生成和上链。
     """
+    # 简单记录前端传过来的哈希值，不进行验证
+    logger.info(f"前端请求哈希: {request.requestHash}")
+    logger.info(f"输入数据: {request.input.dict()}")
+    
     try:
-        # 简单记录前端传过来的哈希值，不进行验证
-        logger.info(f"前端请求哈希: {request.requestHash}")
-        logger.info(f"输入数据: {request.input.dict()}")
-        
-        # 1. 调用AI模型生成建议
-        recommendation = await generate_investment_advice(request.input)
-        
-        # 2. 存储到IPFS
-        data_to_store = {
-            "input": request.input.dict(),
-            "output": recommendation,
-            "timestamp": int(time.time())
-        }
-        
-        # 添加元数据
-        metadata = {
-            "name": f"advice-{request.userAddress[:10]}.json",
-            "type": "investment-advice"
+        job, duplicate = advice_jobs.submit(request)
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试"
+        )
+    
+    if wait:
+        await job.done.wait()
+        if job.status == "failed":
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=job.error
+            )
+        response.status_code = status.HTTP_200_OK
+        return job.result
+    
+    if duplicate:
+        response.status_code = status.HTTP_200_OK
+    return {
+        "success": True,
+        "data": {
+            "jobId": job.id,
+            "status": job.status,
+            "duplicate": duplicate,
+            "statusUrl": f"/api/advice/jobs/{job.id}",
+            "eventsUrl": f"/api/advice/jobs/{job.id}/events"
         }
-        
-        # 存储到IPFS并获取CID
-        cid = await store_data_to_ipfs(data_to_store, metadata)
-        
-        # 3. 签名CID
-        signature, timestamp = create_signature(cid)
-        
-        # 4. 上链存证
-        tx_hash = await record_to_blockchain(
-            request.userAddress, 
-            request.requestHash, 
-            cid, 
-            signature
+    }
+
+
+@router.get("/advice/jobs/{job_id}")
+async def get_advice_job(job_id: str):
+    """
+    查询建议任务的状态、各阶段耗时和部分结果
+    """
+    job = advice_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"任务不存在或已过期: {job_id}"
         )
+    return {
+        "success": True,
+        "data": job.to_dict()
+    }
+
+
+@router.get("/advice/jobs/{job_id}/events")
+async def stream_advice_job(job_id: str, request: Request):
+    """
+    以Server-Sent Events推送建议任务的阶段进度，任务结束后关闭连接
+    """
+    job = advice_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"任务不存在或已过期: {job_id}"
+        )
+    
+    async def event_stream():
+        queue = job.subscribe()
+        try:
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), timeout=JOB_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+                    continue
+                yield format_sse_event("progress", snapshot)
+                if snapshot["status"] in ("completed", "failed"):
+                    break
+        finally:
+            job.unsubscribe(queue)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/advice/stream")
+async def stream_investment_advice_sse(request: AdviceRequest):
+    """
+    以Server-Sent Events流式返回AI投资建议
+    
+    事件顺序:
+    1. job: 任务ID及是否复用了已有任务
+    2. token: 模型逐步生成的文本片段
+    3. advice: 校验后的完整建议(尚未上链)
+    4. result: 存储到IPFS并上链存证后的最终响应，与 POST /api/advice 的响应相同
+    出错时发送 error 事件
+    
+    与 POST /api/advice 共用 (userAddress, requestHash) 幂等索引: 重复提交不会再次调用模型、
+    存储IPFS和上链，而是等待已有任务并推送其建议和结果(不重放 token 事件)。
+    客户端断开后任务继续执行，可通过 /api/advice/jobs/{job_id} 查询。
+    """
+    logger.info(f"前端请求哈希(流式): {request.requestHash}")
+    try:
+        job, duplicate, tokens = advice_jobs.submit_stream(request)
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试"
+        )
+    
+    async def event_stream():
+        yield format_sse_event("job", {"jobId": job.id, "duplicate": duplicate})
+        if tokens is not None:
+            while True:
+                token = await tokens.get()
+                if token is None:
+                    break
+                yield format_sse_event("token", {"content": token})
         
-        # 构建响应 - 根据操作类型返回不同格式
-        action = recommendation.get("action", "recommend")
-        
-        if action == "recommend":
-            # 投资建议
-            return {
-                "action": "recommend",
-                "success": True,
-                "data": {
-                    "recommendation": recommendation.get("allocationText", ""),
-                    "allocation": recommendation.get("allocation", []),
-                    "cid": cid,
-                    "txHash": tx_hash,
-                    "signature": signature,
-                    "timestamp": timestamp
-                }
-            }
-        elif action == "trade":
-            # 交易执行
-            return {
-                "action": "trade",
-                "success": True,
-                "data": {
-                    "tradeSummary": recommendation.get("tradeSummary", ""),
-                    "trades": recommendation.get("trades", []),
-                    "cid": cid,
-                    "txHash": tx_hash,
-                    "signature": signature,
-                    "timestamp": timestamp
-                }
-            }
-        else:
-            # 未知操作类型
-            return {
-                "action": "unknown",
-                "success": False,
-                "error": "UNKNOWN_ACTION",
-                "message": f"未知的操作类型: {action}"
-            }
-            
-    except HTTPException as e:
-        # 重新抛出HTTP异常
-        raise
-    except Exception as e:
-        # 记录详细错误并返回通用错误消息
-        import traceback
-        traceback.print_exc()
-        
+        queue = job.subscribe()
+        try:
+            advice_sent = False
+            while True:
+                snapshot = await queue.get()
+                recommendation = snapshot["partial"].get("recommendation")
+                if recommendation is not None and not advice_sent:
+                    yield format_sse_event("advice", recommendation)
+                    advice_sent = True
+                if snapshot["status"] == "completed":
+                    yield format_sse_event("result", snapshot["result"])
+                    break
+                if snapshot["status"] == "failed":
+                    yield format_sse_event("error", {"success": False, "error": "INTERNAL_ERROR", "message": snapshot["error"]})
+                    break
+        finally:
+            job.unsubscribe(queue)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/advice/cache/stats")
+async def get_advice_cache_stats():
+    """
+    获取投资建议缓存的命中率和淘汰统计
+    """
+    return {
+        "success": True,
+        "data": advice_cache.stats()
+    }
+
+
+@router.get("/proof/{cid}")
+async def get_merkle_proof(cid: str):
+    """
+    获取批次上链模式下CID的Merkle证明
+    
+    返回批次根、交易哈希和证明路径，可调用合约 verifyBatchedRequest 独立验证
+    """
+    proof = await batch_anchorer.get_proof(cid)
+    if proof is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"处理请求时出错: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"未找到该CID的批次证明: {cid}"
         )
+    return {
+        "success": True,
+        "data": proof
+    }
+
+
+@router.get("/anchor/stats")
+async def get_anchor_stats():
+    """
+    获取批次上链的统计信息
+    """
+    return {
+        "success": True,
+        "data": batch_anchorer.stats()
+    }
 
 
 @router.get("/verify/{tx_hash}", response_model=VerifyTransactionResponse)
@@ -136,10 +245,16 @@ async def verify_blockchain_tx(tx_hash: str):
 
 
 @router.get("/ipfs/{cid}")
-async def get_ipfs_data(cid: str):
+async def get_ipfs_data(cid: str, request: Request):
     """
     从IPFS获取数据
+    
+    CID即内容本身的哈希，客户端携带匹配的 If-None-Match 时直接返回304，无需访问网关
     """
+    etag = make_etag("ipfs", cid)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag, cache_control=IPFS_CACHE_CONTROL)
+    
     try:
         # 检查CID是否可用
         is_available = await check_ipfs_content_availability(cid)
@@ -152,10 +267,15 @@ async def get_ipfs_data(cid: str):
         # 获取数据
         data = await retrieve_data_from_ipfs(cid)
         
-        return {
-            "success": True,
-            "data": data
-        }
+        return cached_json_response(
+            request,
+            {
+                "success": True,
+                "data": data
+            },
+            etag=etag,
+            cache_control=IPFS_CACHE_CONTROL
+        )
     except HTTPException as e:
         raise
     except Exception as e:
@@ -166,27 +286,53 @@ async def get_ipfs_data(cid: str):
 
 
 @router.get("/history/{user_address}")
-async def get_user_history(user_address: str):
+async def get_user_history(
+    user_address: str,
+    limit: int = Query(50, ge=1, le=200, description="每页记录数"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor")
+):
     """
     获取指定用户的历史投资建议记录
     
+    按时间倒序分页返回。索引已追上链头时从本地事件索引查询，否则调用合约的分页查询；
+    翻页时沿用游标所属的数据源。批次上链(ANCHOR_MODE=batch)的请求只有 RequestRecorded 事件，
+    没有合约存储，只能从事件索引查到
+    
     Args:
         user_address: 用户的以太坊地址
+        limit: 每页记录数
+        cursor: 分页游标
     
     Returns:
-        用户的所有历史记录
+        用户的历史记录，nextCursor 为空表示没有更多记录
     """
     try:
-        # 从区块链获取用户历史记录
-        user_requests = await get_user_requests(user_address)
+        kind, keys = decode_cursor(cursor) if cursor else (None, ())
+        if kind == INDEX_CURSOR and not event_indexer.store.is_open:
+            raise ValueError("事件索引未启用，分页游标已失效")
+        
+        if kind == INDEX_CURSOR or (kind is None and settings.INDEXER_ENABLED and event_indexer.synced):
+            user_requests, next_cursor = await event_indexer.get_user_history(user_address, limit, keys or None)
+        else:
+            if kind == CHAIN_CURSOR and len(keys) != 1:
+                raise ValueError(f"无效的分页游标: {cursor}")
+            # 从区块链分页获取用户历史记录
+            before = keys[0] if kind == CHAIN_CURSOR else None
+            user_requests, next_cursor = await get_user_requests_page(user_address, limit, before)
         
         return {
             "success": True,
-            "data": user_requests
+            "data": user_requests,
+            "nextCursor": next_cursor
         }
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"获取用户历史记录时出错: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取用户历史记录失败: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
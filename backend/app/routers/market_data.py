@@ -1,40 +1,69 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+import asyncio
 import logging
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional
 
-from app.services.market_data import get_all_market_data, get_fear_greed_index, get_market_trend, get_eth_gas_price
+from app.services.market_data import get_market_cache_stats
+from app.services.market_history import market_history, METRICS
+from app.services.market_poller import get_market_snapshot
+from app.services.market_stream import market_broadcaster
+from app.services.gas_oracle import gas_oracle
+from app.core.config import settings
+from app.utils.sse import format_sse_event, SSE_HEADERS
+from app.utils.http_cache import cached_json_response, is_not_modified, make_etag, not_modified_response
 
 router = APIRouter(prefix="/api/market", tags=["market"])
 logger = logging.getLogger(__name__)
 
+def _market_cache_control() -> str:
+    """市场快照在下一次轮询前不会变化，允许浏览器和CDN缓存一个轮询周期"""
+    return f"public, max-age={settings.MARKET_POLL_INTERVAL}"
+
+
+async def _snapshot_response(request: Request, section: str, build, message: str):
+    """
+    基于市场快照版本生成ETag，客户端缓存有效时直接返回304
+    """
+    snapshot = await get_market_snapshot()
+    etag = make_etag(section, snapshot.version, snapshot.updated_at)
+    if is_not_modified(request, etag, snapshot.updated_at):
+        return not_modified_response(etag, snapshot.updated_at, _market_cache_control())
+    return cached_json_response(
+        request,
+        {
+            "success": True,
+            "data": build(snapshot),
+            "message": message
+        },
+        etag=etag,
+        last_modified=snapshot.updated_at,
+        cache_control=_market_cache_control()
+    )
+
 @router.get("/data")
-async def get_market_data() -> Dict[str, Any]:
+async def get_market_data(request: Request):
     """
     获取所有市场数据，包括恐慌与贪婪指数、市场趋势和以太坊GAS费等
     """
     try:
-        data = await get_all_market_data()
-        return {
-            "success": True,
-            "data": data,
-            "message": "市场数据获取成功"
-        }
+        return await _snapshot_response(
+            request, "data", lambda snapshot: snapshot.to_dict(), "市场数据获取成功"
+        )
     except Exception as e:
         logger.error(f"获取市场数据失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取市场数据失败: {str(e)}")
 
 @router.get("/fear-greed")
-async def get_market_fear_greed() -> Dict[str, Any]:
+async def get_market_fear_greed(request: Request):
     """
     获取恐慌与贪婪指数数据
     """
     try:
-        data = await get_fear_greed_index()
-        return {
-            "success": True,
-            "data": data,
-            "message": "恐慌与贪婪指数获取成功"
-        }
+        return await _snapshot_response(
+            request, "fear-greed", lambda snapshot: dict(snapshot.fear_greed_index), "恐慌与贪婪指数获取成功"
+        )
     except Exception as e:
         logger.error(f"获取恐慌与贪婪指数失败: {str(e)}")
         return {
@@ -44,17 +73,14 @@ async def get_market_fear_greed() -> Dict[str, Any]:
         }
 
 @router.get("/trend")
-async def get_market_trend_data() -> Dict[str, Any]:
+async def get_market_trend_data(request: Request):
     """
     获取市场趋势数据
     """
     try:
-        data = await get_market_trend()
-        return {
-            "success": True,
-            "data": data,
-            "message": "市场趋势数据获取成功"
-        }
+        return await _snapshot_response(
+            request, "trend", lambda snapshot: dict(snapshot.market_trend), "市场趋势数据获取成功"
+        )
     except Exception as e:
         logger.error(f"获取市场趋势数据失败: {str(e)}")
         return {
@@ -64,21 +90,142 @@ async def get_market_trend_data() -> Dict[str, Any]:
         }
 
 @router.get("/gas")
-async def get_gas_price() -> Dict[str, Any]:
+async def get_gas_price(request: Request):
     """
     获取以太坊GAS费数据
     """
     try:
-        data = await get_eth_gas_price()
+        return await _snapshot_response(
+            request, "gas", lambda snapshot: dict(snapshot.eth_gas_price), "以太坊GAS费数据获取成功"
+        )
+    except Exception as e:
+        logger.error(f"获取以太坊GAS费数据失败: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "以太坊GAS费数据获取失败"
+        } 
+
+@router.get("/gas/chains")
+async def get_multi_chain_gas_price(
+    chains: Optional[str] = Query(None, description="逗号分隔的链名称，例如 ethereum,polygon,bsc；为空时返回所有已配置的链")
+) -> Dict[str, Any]:
+    """
+    并发获取多条链的GAS费数据
+    """
+    try:
+        chain_list = [chain for chain in chains.split(",") if chain.strip()] if chains else None
+        data = await gas_oracle.get_gas_prices(chain_list)
         return {
             "success": True,
             "data": data,
-            "message": "以太坊GAS费数据获取成功"
+            "message": "多链GAS费数据获取成功"
         }
     except Exception as e:
-        logger.error(f"获取以太坊GAS费数据失败: {str(e)}")
+        logger.error(f"获取多链GAS费数据失败: {str(e)}")
         return {
             "success": False,
             "error": str(e),
-            "message": "以太坊GAS费数据获取失败"
-        } 
\ No newline at end of file
+            "message": "多链GAS费数据获取失败"
+        }
+
+@router.get("/cache/stats")
+async def get_cache_stats() -> Dict[str, Any]:
+    """
+    获取市场数据缓存的命中率与数据年龄统计
+    """
+    return {
+        "success": True,
+        "data": get_market_cache_stats(),
+        "message": "缓存统计获取成功"
+    }
+
+@router.get("/history")
+async def get_market_history(
+    metric: str = Query("fear_greed", description=f"指标名: {', '.join(METRICS)}"),
+    start: Optional[float] = Query(None, description="起始Unix时间戳(秒)，默认最近24小时"),
+    end: Optional[float] = Query(None, description="结束Unix时间戳(秒)，默认当前时间"),
+    buckets: Optional[int] = Query(None, ge=1, le=1000, description="降采样分桶数量，每个桶返回min/max/avg"),
+) -> Dict[str, Any]:
+    """
+    获取市场指标历史数据，支持时间范围查询和服务端降采样
+    """
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"未知的指标: {metric}，可选: {', '.join(METRICS)}")
+    
+    if end is None:
+        end = time.time()
+    if start is None:
+        start = end - 86400
+    if start > end:
+        raise HTTPException(status_code=400, detail="start 不能大于 end")
+    
+    try:
+        points = market_history.query(metric, start=start, end=end, buckets=buckets)
+        return {
+            "success": True,
+            "data": {
+                "metric": metric,
+                "start": start,
+                "end": end,
+                "buckets": buckets,
+                "points": points
+            },
+            "message": "市场历史数据获取成功"
+        }
+    except Exception as e:
+        logger.error(f"获取市场历史数据失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取市场历史数据失败: {str(e)}")
+
+
+def _format_snapshot_event(snapshot) -> str:
+    """将市场快照格式化为SSE事件"""
+    payload = snapshot.to_dict()
+    payload["version"] = snapshot.version
+    return format_sse_event("market", payload, event_id=snapshot.version)
+
+
+@router.get("/stream")
+async def stream_market_data(request: Request):
+    """
+    以Server-Sent Events推送市场数据，仅在数值变化时推送新快照
+    """
+    subscriber = market_broadcaster.subscribe()
+    
+    async def event_stream():
+        try:
+            # 连接后先发送当前快照
+            yield _format_snapshot_event(await get_market_snapshot())
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(subscriber.queue.get(), timeout=settings.MARKET_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+                    continue
+                if snapshot is None:
+                    # 消费过慢被推送器断开
+                    yield format_sse_event("dropped", {})
+                    break
+                yield _format_snapshot_event(snapshot)
+        finally:
+            market_broadcaster.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@router.get("/stream/stats")
+async def get_stream_stats() -> Dict[str, Any]:
+    """
+    获取市场推送的订阅者数量和推送统计
+    """
+    return {
+        "success": True,
+        "data": market_broadcaster.stats(),
+        "message": "推送统计获取成功"
+    }
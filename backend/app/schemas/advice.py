@@ -1,6 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Dict, List, Optional, Any
 
+from ..utils.hash_utils import normalize_address, normalize_request_hash
+
 
 class CryptoAsset(BaseModel):
     symbol: str = Field(..., description="加密货币符号，例如BTC, ETH, USDC等")
@@ -40,6 +42,17 @@ class AdviceRequest(BaseModel):
     input: InputData = Field(..., description="用户输入参数")
     requestHash: str = Field(..., description="通过keccak256哈希计算的请求内容哈希")
 
+    # 在生成建议、上传IPFS和签名之前校验，格式错误的请求直接返回422
+    @field_validator("userAddress")
+    @classmethod
+    def check_user_address(cls, value: str) -> str:
+        return normalize_address(value)
+
+    @field_validator("requestHash")
+    @classmethod
+    def check_request_hash(cls, value: str) -> str:
+        return normalize_request_hash(value)
+
 
 class RecommendationData(BaseModel):
     recommendation: str = Field(..., description="文本形式的建议")
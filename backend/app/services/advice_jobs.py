@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from ..schemas.advice import AdviceRequest
+from ..utils.tracing import Trace, current_trace, use_trace
+from .advice_pipeline import record_advice
+from .ai_model import generate_investment_advice, stream_investment_advice
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 建议任务依次经过的阶段
+JOB_STAGES = ("generating", "storing", "signing", "recording")
+
+
+class AdviceJob:
+    """
+    一次异步建议请求的状态
+
+    stages 记录每个阶段的开始/结束时间，partial 保存已产出的部分结果
+    (建议内容在上链确认之前即可获取)
+    """
+
+    def __init__(self, request: AdviceRequest, trace: Optional[Trace] = None):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        # 提交请求携带追踪头时，worker中各阶段的span记录到同一个追踪
+        self.trace = trace
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.partial: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.done = asyncio.Event()
+        self._listeners: List[asyncio.Queue] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态的可序列化表示"""
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": {name: dict(info) for name, info in self.stages.items()},
+            "partial": dict(self.partial),
+            "result": self.result,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
+            "trace": self.trace.to_dict() if self.trace is not None else None,
+        }
+
+    def subscribe(self) -> asyncio.Queue:
+        """订阅任务进度，每次状态变化时收到一份 to_dict 快照"""
+        queue: asyncio.Queue = asyncio.Queue()
+        queue.put_nowait(self.to_dict())
+        self._listeners.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self._listeners:
+            self._listeners.remove(queue)
+
+    def _notify(self) -> None:
+        self.updated_at = time.time()
+        snapshot = self.to_dict()
+        for queue in self._listeners:
+            queue.put_nowait(snapshot)
+
+    def start_stage(self, stage: str, partial: Optional[Dict[str, Any]] = None) -> None:
+        """结束当前阶段并进入下一阶段"""
+        now = time.time()
+        if self.stage is not None:
+            self.stages[self.stage]["finishedAt"] = now
+        self.status = "running"
+        self.stage = stage
+        self.stages[stage] = {"startedAt": now, "finishedAt": None}
+        if partial:
+            self.partial.update(partial)
+        self._notify()
+
+    def complete(self, result: Dict[str, Any]) -> None:
+        if self.stage is not None:
+            self.stages[self.stage]["finishedAt"] = time.time()
+        self.status = "completed"
+        self.result = result
+        self.done.set()
+        self._notify()
+
+    def fail(self, error: str) -> None:
+        if self.stage is not None:
+            self.stages[self.stage]["finishedAt"] = time.time()
+        self.status = "failed"
+        self.error = error
+        self.done.set()
+        self._notify()
+
+
+class AdviceJobQueue:
+    """
+    有界的建议任务队列
+
+    固定数量的worker依次执行 生成建议 -> 存储IPFS -> 签名 -> 上链 各阶段，
+    HTTP请求只负责提交任务，不再在整个流程期间占用连接。
+    已结束的任务保留 retention 秒以供查询，最多保留 max_stored 个。
+
+    提交按 (userAddress, requestHash) 幂等：idempotency_window 秒内的重复提交
+    直接返回已有任务(进行中的继续等待，已完成的返回存储的结果)，失败的任务允许重试。
+    幂等索引最多保留 idempotency_max_entries 个键。流式请求 (submit_stream) 与普通提交共用同一幂等索引。
+
+    流式任务与worker共用 workers 个执行名额，同时执行的建议流程不超过 workers 个；
+    排队中的普通任务和等待名额的流式任务合计不超过 queue_size 个，超出时抛出 asyncio.QueueFull。
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        retention: float,
+        max_stored: int,
+        idempotency_window: float,
+        idempotency_max_entries: int,
+    ):
+        self.workers = workers
+        self.retention = retention
+        self.max_stored = max_stored
+        self.idempotency_window = idempotency_window
+        self.idempotency_max_entries = idempotency_max_entries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._jobs: "OrderedDict[str, AdviceJob]" = OrderedDict()
+        self._idempotency: "OrderedDict[Tuple[str, str], AdviceJob]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+        # 流式请求的后台任务，不经过worker队列
+        self._stream_tasks: Set[asyncio.Task] = set()
+        # worker和流式任务共用的执行名额
+        self._slots = asyncio.Semaphore(workers)
+        self._streams_waiting = 0
+        self._duplicates = 0
+
+    @staticmethod
+    def idempotency_key(request: AdviceRequest) -> Tuple[str, str]:
+        """幂等键: 地址不区分大小写"""
+        return request.userAddress.lower(), request.requestHash
+
+    def _find_duplicate(self, key: Tuple[str, str]) -> Optional[AdviceJob]:
+        """查找窗口内可复用的任务"""
+        job = self._idempotency.get(key)
+        if job is None:
+            return None
+        if job.status == "failed" or time.time() - job.created_at >= self.idempotency_window:
+            del self._idempotency[key]
+            return None
+        return job
+
+    def submit(self, request: AdviceRequest) -> Tuple[AdviceJob, bool]:
+        """
+        提交任务，重复提交时返回已有任务
+
+        Returns:
+            Tuple[AdviceJob, bool]: (任务, 是否复用了已有任务)
+
+        Raises:
+            asyncio.QueueFull: 队列已满
+        """
+        existing = self._existing(request)
+        if existing is not None:
+            return existing, True
+
+        self._check_capacity()
+        job = AdviceJob(request, trace=current_trace())
+        self._queue.put_nowait(job)
+        self._register(job)
+        return job, False
+
+    def submit_stream(self, request: AdviceRequest) -> Tuple[AdviceJob, bool, Optional[asyncio.Queue]]:
+        """
+        提交流式建议任务，重复提交时返回已有任务
+
+        任务不经过worker队列，立即在后台协程中执行；模型输出的文本片段放入返回的队列，以 None 结束。
+        客户端断开后任务继续执行到上链完成，重试的请求复用同一任务。
+
+        Returns:
+            Tuple[AdviceJob, bool, Optional[asyncio.Queue]]: (任务, 是否复用了已有任务, 文本片段队列)；
+                复用已有任务时文本片段不会重放，队列为None
+
+        Raises:
+            asyncio.QueueFull: 等待执行的任务已达上限
+        """
+        existing = self._existing(request)
+        if existing is not None:
+            return existing, True, None
+
+        self._check_capacity()
+        job = AdviceJob(request, trace=current_trace())
+        tokens: asyncio.Queue = asyncio.Queue()
+        self._register(job)
+        # 在提交时计数，同一时刻的并发提交也能看到彼此
+        self._streams_waiting += 1
+        task = asyncio.create_task(self._run_stream(job, tokens))
+        self._stream_tasks.add(task)
+        task.add_done_callback(self._stream_tasks.discard)
+        return job, False, tokens
+
+    def _check_capacity(self) -> None:
+        """排队的普通任务和等待名额的流式任务合计达到上限时拒绝新任务"""
+        if self._queue.maxsize > 0 and self._queue.qsize() + self._streams_waiting >= self._queue.maxsize:
+            raise asyncio.QueueFull
+
+    def _existing(self, request: AdviceRequest) -> Optional[AdviceJob]:
+        existing = self._find_duplicate(self.idempotency_key(request))
+        if existing is not None:
+            self._duplicates += 1
+            logger.info(f"重复的建议请求，复用任务 {existing.id}: {request.requestHash}")
+        return existing
+
+    def _register(self, job: AdviceJob) -> None:
+        self._jobs[job.id] = job
+        self._idempotency[self.idempotency_key(job.request)] = job
+        self._prune()
+
+    def get(self, job_id: str) -> Optional[AdviceJob]:
+        """按ID查询任务，包括已移出任务表但仍在幂等窗口内的任务"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = next((job for job in self._idempotency.values() if job.id == job_id), None)
+        return job
+
+    def _prune(self) -> None:
+        """清理过期和超出数量上限的已结束任务"""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.updated_at > self.retention:
+                del self._jobs[job_id]
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_stored)]:
+            del self._jobs[job_id]
+
+        # 幂等索引独立于任务表清理，已完成任务的结果在窗口内仍可返回
+        for key, job in list(self._idempotency.items()):
+            if now - job.created_at >= self.idempotency_window:
+                del self._idempotency[key]
+        while len(self._idempotency) > self.idempotency_max_entries:
+            self._idempotency.popitem(last=False)
+
+    async def start(self) -> None:
+        """启动worker"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"建议任务队列已启动，worker数量: {self.workers}")
+
+    async def stop(self) -> None:
+        """停止worker和流式任务，未执行的任务标记为失败"""
+        tasks = [*self._tasks, *self._stream_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            self._queue.get_nowait().fail("服务关闭，任务未执行")
+        logger.info("建议任务队列已停止")
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                async with self._slots:
+                    with use_trace(job.trace):
+                        await self._run(job)
+            except asyncio.CancelledError:
+                job.fail("服务关闭，任务被中断")
+                raise
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: AdviceJob) -> None:
+        """执行单个任务的所有阶段"""
+        request = job.request
+        try:
+            logger.info(f"开始处理建议任务 {job.id}, 请求哈希: {request.requestHash}")
+            job.start_stage("generating")
+            recommendation = await generate_investment_advice(request.input)
+
+            async def on_stage(stage: str, partial: Dict[str, Any]) -> None:
+                job.start_stage(stage, partial)
+
+            # 建议在上链确认之前就作为部分结果提供
+            job.partial["recommendation"] = recommendation
+            result = await record_advice(request, recommendation, on_stage=on_stage)
+            job.complete(result)
+        except Exception as e:
+            logger.error(f"建议任务 {job.id} 失败: {str(e)}")
+            job.fail(f"处理请求时出错: {str(e)}")
+
+    async def _run_stream(self, job: AdviceJob, tokens: asyncio.Queue) -> None:
+        """执行流式任务: 等待执行名额后，生成阶段逐个转发文本片段，之后与 _run 相同"""
+        request = job.request
+        try:
+            try:
+                await self._slots.acquire()
+            finally:
+                self._streams_waiting -= 1
+            try:
+                with use_trace(job.trace):
+                    logger.info(f"开始处理流式建议任务 {job.id}, 请求哈希: {request.requestHash}")
+                    job.start_stage("generating")
+                    recommendation = None
+                    async for kind, value in stream_investment_advice(request.input):
+                        if kind == "token":
+                            tokens.put_nowait(value)
+                        else:
+                            recommendation = value
+                    tokens.put_nowait(None)
+
+                    async def on_stage(stage: str, partial: Dict[str, Any]) -> None:
+                        job.start_stage(stage, partial)
+
+                    job.partial["recommendation"] = recommendation
+                    result = await record_advice(request, recommendation, on_stage=on_stage)
+                    job.complete(result)
+            finally:
+                self._slots.release()
+        except asyncio.CancelledError:
+            job.fail("服务关闭，任务被中断")
+            raise
+        except Exception as e:
+            logger.error(f"流式建议任务 {job.id} 失败: {str(e)}")
+            job.fail(f"处理请求时出错: {str(e)}")
+        finally:
+            tokens.put_nowait(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回队列长度和任务状态统计"""
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "streaming": len(self._stream_tasks),
+            "streams_waiting": self._streams_waiting,
+            "capacity": self._queue.maxsize,
+            "jobs": counts,
+            "idempotency_keys": len(self._idempotency),
+            "duplicates": self._duplicates,
+        }
+
+
+# 全局任务队列，由 main.py 的 lifespan 启动和停止
+advice_jobs = AdviceJobQueue(
+    workers=settings.ADVICE_WORKERS,
+    queue_size=settings.ADVICE_QUEUE_SIZE,
+    retention=settings.ADVICE_JOB_RETENTION,
+    max_stored=settings.ADVICE_JOB_MAX_STORED,
+    idempotency_window=settings.ADVICE_IDEMPOTENCY_WINDOW,
+    idempotency_max_entries=settings.ADVICE_IDEMPOTENCY_MAX_ENTRIES,
+)
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..schemas.advice import AdviceRequest
+from ..utils.cid import compute_cid_v0, encode_json_content
+from ..utils.hash_utils import normalize_address, normalize_request_hash
+from ..utils.tracing import span
+from .batch_anchor import batch_anchorer
+from .blockchain import record_to_blockchain, create_signature
+from .ipfs import CIDMismatchError, pin_content_to_ipfs, store_data_to_ipfs
+from .tx_watchdog import tx_watchdog
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 存证流程各阶段的进度回调: (阶段名称, 该阶段产出的部分结果)
+StageCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+def build_action_response(
+    recommendation: Dict[str, Any],
+    cid: str,
+    tx_hash: str,
+    signature: str,
+    timestamp: int,
+    anchor: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    根据操作类型构建返回给前端的响应
+    
+    批次上链模式下 anchor 为该请求的Merkle证明，附加到响应数据中；
+    交易曾因未及时打包被提高费用替换时，附加被替换的交易哈希
+
+    Returns:
+        Dict: 符合 ActionResponse 的响应内容
+    """
+    action = recommendation.get("action", "recommend")
+    proof_fields = {}
+    if anchor is not None:
+        proof_fields = {
+            "merkleRoot": anchor["merkleRoot"],
+            "merkleProof": anchor["proof"],
+            "leafIndex": anchor["leafIndex"],
+            "batchSize": anchor["batchSize"]
+        }
+    lineage = tx_watchdog.lineage(tx_hash) if tx_hash else None
+    if lineage is not None and lineage["replacedTxHashes"]:
+        proof_fields["replacedTxHashes"] = lineage["replacedTxHashes"]
+
+    if action == "recommend":
+        # 投资建议
+        return {
+            "action": "recommend",
+            "success": True,
+            "data": {
+                "recommendation": recommendation.get("allocationText", ""),
+                "allocation": recommendation.get("allocation", []),
+                "cid": cid,
+                "txHash": tx_hash,
+                "signature": signature,
+                "timestamp": timestamp,
+                **proof_fields
+            }
+        }
+    elif action == "trade":
+        # 交易执行
+        return {
+            "action": "trade",
+            "success": True,
+            "data": {
+                "tradeSummary": recommendation.get("tradeSummary", ""),
+                "trades": recommendation.get("trades", []),
+                "cid": cid,
+                "txHash": tx_hash,
+                "signature": signature,
+                "timestamp": timestamp,
+                **proof_fields
+            }
+        }
+    else:
+        # 未知操作类型
+        return {
+            "action": "unknown",
+            "success": False,
+            "error": "UNKNOWN_ACTION",
+            "message": f"未知的操作类型: {action}"
+        }
+
+
+async def _pin(content: bytes, cid: str, metadata: Dict[str, str]) -> str:
+    with span("ipfs_store"):
+        return await pin_content_to_ipfs(content, cid, metadata)
+
+
+async def _anchor_on_chain(
+    user_address: str,
+    request_hash: str,
+    cid: str,
+    signature: str,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    上链存证: 单笔模式调用 recordRequest，批次模式加入Merkle批次
+    
+    Returns:
+        Tuple: (交易哈希, 批次模式下的Merkle证明)
+    """
+    with span("chain_record"):
+        if settings.ANCHOR_MODE == "batch":
+            anchor = await batch_anchorer.submit(user_address, request_hash, cid)
+            return anchor["txHash"], anchor
+        tx_hash = await record_to_blockchain(
+            user_address,
+            request_hash,
+            cid,
+            signature
+        )
+        return tx_hash, None
+
+
+async def record_advice(
+    request: AdviceRequest,
+    recommendation: Dict[str, Any],
+    on_stage: Optional[StageCallback] = None,
+) -> Dict[str, Any]:
+    """
+    将建议存储到IPFS、签名并上链存证
+    
+    默认在本地预先计算CID，IPFS上传与签名、上链并行；
+    上传返回的CID与本地计算结果不一致时抛出 CIDMismatchError
+
+    Args:
+        request: 原始建议请求
+        recommendation: 模型生成的建议或交易方案
+        on_stage: 可选的进度回调，每个阶段开始和完成时调用
+
+    Returns:
+        Dict: 符合 ActionResponse 的响应内容
+
+    Raises:
+        ValueError: 用户地址或请求哈希无效
+    """
+    # 在存储IPFS和签名之前校验，格式错误的请求不会留下无主的pin和签名
+    user_address = normalize_address(request.userAddress)
+    request_hash = normalize_request_hash(request.requestHash)
+
+    async def notify(stage: str, partial: Optional[Dict[str, Any]] = None) -> None:
+        if on_stage is not None:
+            await on_stage(stage, partial or {})
+
+    # 存储到IPFS
+    data_to_store = {
+        "input": request.input.dict(),
+        "output": recommendation,
+        "timestamp": int(time.time())
+    }
+
+    # 添加元数据
+    metadata = {
+        "name": f"advice-{user_address[:10]}.json",
+        "type": "investment-advice"
+    }
+
+    if not settings.IPFS_PRECOMPUTE_CID:
+        # 串行流程: 等待Pinata返回CID后再签名上链
+        await notify("storing")
+        with span("ipfs_store"):
+            cid = await store_data_to_ipfs(data_to_store, metadata)
+        
+        await notify("signing", {"cid": cid})
+        with span("sign"):
+            signature, timestamp = create_signature(cid)
+        
+        await notify("recording", {"signature": signature, "timestamp": timestamp})
+        tx_hash, anchor = await _anchor_on_chain(user_address, request_hash, cid, signature)
+        return build_action_response(recommendation, cid, tx_hash, signature, timestamp, anchor)
+    
+    # 由即将上传的字节在本地计算CID，上传与签名、上链并行进行
+    content = encode_json_content(data_to_store)
+    cid = compute_cid_v0(content)
+    await notify("storing", {"cid": cid})
+    pin_task = asyncio.create_task(_pin(content, cid, metadata))
+    
+    try:
+        await notify("signing")
+        with span("sign"):
+            signature, timestamp = create_signature(cid)
+        
+        await notify("recording", {"signature": signature, "timestamp": timestamp})
+        tx_hash, anchor = await _anchor_on_chain(user_address, request_hash, cid, signature)
+    except BaseException:
+        pin_task.cancel()
+        raise
+    
+    try:
+        await pin_task
+    except CIDMismatchError:
+        # 链上已记录的CID与实际存储的内容不一致，必须人工处理
+        logger.critical(f"交易 {tx_hash} 记录的CID {cid} 与Pinata存储结果不一致")
+        raise
+    
+    return build_action_response(recommendation, cid, tx_hash, signature, timestamp, anchor)
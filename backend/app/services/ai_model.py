@@ -1,11 +1,17 @@
+import copy
+import hashlib
 import logging
+import math
 import time
 import json
-import aiohttp
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Optional, Tuple
 from ..schemas.advice import InputData
 from ..core.config import settings
-from .market_data import get_all_market_data
+from ..utils.cache import LRUCache
+from ..utils.tracing import span
+from .http_client import get_http_session
+from .market_poller import get_market_snapshot
+from .gas_oracle import gas_oracle
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -15,27 +21,34 @@ DEEPSEEK_API_KEY = settings.DEEPSEEK_API_KEY
 DEEPSEEK_API_URL = settings.DEEPSEEK_API_URL
 DEEPSEEK_MODEL = settings.DEEPSEEK_MODEL
 
+# 相同输入在相同市场区间内的建议缓存
+advice_cache = LRUCache("investment_advice", settings.ADVICE_CACHE_SIZE, settings.ADVICE_CACHE_TTL)
 
-async def generate_investment_advice(input_data: InputData) -> Dict[str, Any]:
+
+def build_advice_cache_key(input_data: InputData, market_data: Dict[str, Any]) -> str:
     """
-    使用DeepSeek API生成投资建议
+    由规范化的用户输入和分档后的市场数据生成缓存键
     
-    Args:
-        input_data: 用户输入数据
-        
-    Returns:
-        Dict: 包含资产配置的投资建议
+    恐慌与贪婪指数按 ADVICE_CACHE_FEAR_GREED_BAND 分档，GAS费按2的幂分档，
+    同一档内的市场变化不会改变建议
     """
-    try:
-        if not DEEPSEEK_API_KEY:
-            logger.error("DeepSeek API密钥未配置")
-            raise ValueError("DeepSeek API密钥未配置")
-        
-        # 获取市场数据
-        market_data = await get_all_market_data()
-        
-        # 构建提示词
-        system_prompt = """
+    payload = input_data.dict()
+    if payload.get("userMessage"):
+        payload["userMessage"] = " ".join(payload["userMessage"].split())
+    
+    fear_greed_value = market_data.get("fear_greed_index", {}).get("value", 50)
+    average_gas = market_data.get("eth_gas_price", {}).get("average") or 0
+    market_band = {
+        "fear_greed": int(fear_greed_value) // settings.ADVICE_CACHE_FEAR_GREED_BAND,
+        "gas": int(math.log2(average_gas)) if average_gas > 0 else -1,
+    }
+    
+    canonical = json.dumps({"input": payload, "market": market_band}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# 系统提示词
+SYSTEM_PROMPT = """
         你是一个专业的投资顾问和交易执行Agent，根据用户提供的风险偏好、资产总价值、当前加密货币资产分布和最新市场数据提供投资建议，并可以执行资产交换操作。
         
         你需要根据用户需求提供以下两种功能：
@@ -80,74 +93,271 @@ async def generate_investment_advice(input_data: InputData) -> Dict[str, Any]:
         4. 提供的交易计划应考虑当前市场情况和Gas费用
         5. 明确区分不同链上的同名资产(例如以太坊上的USDC和Polygon上的USDC)
         """
+
+
+def build_user_message(input_data: InputData, market_data: Dict[str, Any]) -> str:
+    """
+    根据用户输入和市场数据构建发送给模型的用户消息
+    """
+    # 格式化当前加密货币资产分布
+    crypto_assets_text = ""
+    for asset in input_data.cryptoAssets:
+        asset_line = f"- {asset.symbol}: {asset.percentage}% (链: {asset.chain}"
+        if asset.amount:
+            asset_line += f", 数量: {asset.amount}"
+        if asset.price:
+            asset_line += f", 单价: ${asset.price}"
+        asset_line += ")\n"
+        crypto_assets_text += asset_line
+    
+    # 格式化市场数据
+    fear_greed = market_data.get("fear_greed_index", {})
+    market_trend = market_data.get("market_trend", {})
+    gas_price = market_data.get("eth_gas_price", {})
+    
+    market_data_text = f"""
+    市场情绪指数: {fear_greed.get('value', 50)} ({fear_greed.get('value_classification', 'Neutral')})
+    市场趋势: {market_trend.get('trend', '盘整')} - {market_trend.get('description', '无法确定市场趋势')}
+    以太坊GAS费: 低: {gas_price.get('low', 0)} Gwei, 平均: {gas_price.get('average', 0)} Gwei, 高: {gas_price.get('high', 0)} Gwei
+    """
+    
+    # 格式化其他链的GAS费(以太坊主网已在上方列出)
+    for chain, chain_gas in market_data.get("chain_gas_prices", {}).items():
+        if chain != "ethereum" and chain_gas.get("average") is not None:
+            market_data_text += f"""{chain} GAS费: 低: {chain_gas.get('low', 0)} Gwei, 平均: {chain_gas.get('average', 0)} Gwei, 高: {chain_gas.get('high', 0)} Gwei
+    """
+    
+    # 构建用户消息
+    user_message = f"""
+    请根据以下投资者信息和最新市场数据提供加密货币资产配置建议：
+    风险偏好：{input_data.riskLevel}（low=保守, medium=中等, high=激进）
+    资产总价值：${input_data.totalValue}
+    
+    当前加密货币资产分布：
+    {crypto_assets_text}
+    
+    最新市场数据：
+    {market_data_text}
+    """
+    
+    # 添加用户的具体需求描述（如果有）
+    if hasattr(input_data, 'userMessage') and input_data.userMessage:
+        user_message += f"""
+    投资者额外需求：
+    {input_data.userMessage}
+    """
         
-        # 格式化当前加密货币资产分布
-        crypto_assets_text = ""
-        for asset in input_data.cryptoAssets:
-            asset_line = f"- {asset.symbol}: {asset.percentage}% (链: {asset.chain}"
-            if asset.amount:
-                asset_line += f", 数量: {asset.amount}"
-            if asset.price:
-                asset_line += f", 单价: ${asset.price}"
-            asset_line += ")\n"
-            crypto_assets_text += asset_line
+    user_message += """
+    我希望获得一个具体的加密货币投资组合方案，包括不同资产的配置比例，并请注明推荐的区块链网络。
+    请根据我当前的资产分布、风险偏好和个人需求，提供更加合理的配置建议。
+    """
+    
+    return user_message
+
+
+def build_deepseek_payload(input_data: InputData, market_data: Dict[str, Any], stream: bool = False) -> Dict[str, Any]:
+    """
+    构建DeepSeek chat completions请求体
+    
+    Args:
+        input_data: 用户输入数据
+        market_data: 市场数据
+        stream: 是否使用流式输出
+    """
+    payload = {
+        "model": DEEPSEEK_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_user_message(input_data, market_data)}
+        ],
+        "temperature": 0.3,  # 较低的温度以获得更确定的结果
+        "max_tokens": 1000
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _deepseek_headers() -> Dict[str, str]:
+    """DeepSeek API请求头"""
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
+    }
+
+
+def parse_advice_response(ai_response: str, market_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    从模型输出中提取并校验JSON格式的建议或交易方案
+    
+    Args:
+        ai_response: 模型生成的完整文本
+        market_data: 生成建议时使用的市场数据，随结果一起存储到IPFS
+    
+    Returns:
+        Dict: 校验后的投资建议或交易方案
+    
+    Raises:
+        ValueError: 输出中没有有效的JSON或格式不正确
+    """
+    try:
+        # 提取JSON部分，如果有多个JSON块，则选取第一个
+        json_start = ai_response.find('{')
+        json_end = ai_response.rfind('}') + 1
         
-        # 格式化市场数据
-        fear_greed = market_data.get("fear_greed_index", {})
-        market_trend = market_data.get("market_trend", {})
-        gas_price = market_data.get("eth_gas_price", {})
+        if json_start >= 0 and json_end > json_start:
+            json_str = ai_response[json_start:json_end]
+            ai_data = json.loads(json_str)
+        else:
+            # 如果没有找到JSON格式，尝试解析整个文本
+            ai_data = json.loads(ai_response)
         
-        market_data_text = f"""
-        市场情绪指数: {fear_greed.get('value', 50)} ({fear_greed.get('value_classification', 'Neutral')})
-        市场趋势: {market_trend.get('trend', '盘整')} - {market_trend.get('description', '无法确定市场趋势')}
-        以太坊GAS费: 低: {gas_price.get('low', 0)} Gwei, 平均: {gas_price.get('average', 0)} Gwei, 高: {gas_price.get('high', 0)} Gwei
-        """
+        # 根据action字段判断是投资建议还是交易执行
+        action = ai_data.get("action", "recommend")  # 默认为投资建议
         
-        # 构建用户消息
-        user_message = f"""
-        请根据以下投资者信息和最新市场数据提供加密货币资产配置建议：
-        风险偏好：{input_data.riskLevel}（low=保守, medium=中等, high=激进）
-        资产总价值：${input_data.totalValue}
+        if action == "recommend":
+            # 处理投资建议
+            # 确保正确的结构
+            if "allocation" not in ai_data or "allocationText" not in ai_data:
+                raise ValueError("API返回的投资建议数据格式不正确")
+            
+            # 处理分配数据，确保百分比总和为100%
+            allocation = ai_data["allocation"]
+            
+            # 确保每个分配项都有chain字段
+            for item in allocation:
+                if "chain" not in item:
+                    item["chain"] = "ethereum"  # 默认使用以太坊网络
+            
+            total = sum(item["percentage"] for item in allocation)
+            
+            # 如果百分比总和不为100%，进行调整
+            if total != 100:
+                logger.warning(f"资产配置百分比总和为{total}%，调整为100%")
+                scale_factor = 100 / total
+                for item in allocation:
+                    item["percentage"] = round(item["percentage"] * scale_factor)
+                
+                # 确保调整后总和为100%
+                current_sum = sum(item["percentage"] for item in allocation)
+                if current_sum != 100:
+                    # 加到第一个资产上
+                    allocation[0]["percentage"] += (100 - current_sum)
+            
+            result = {
+                "modelVersion": f"deepseek-api-{DEEPSEEK_MODEL}",
+                "timestamp": int(time.time()),
+                "action": "recommend",
+                "allocation": allocation,
+                "allocationText": ai_data["allocationText"],
+                "market_data": market_data  # 添加市场数据到返回中，用于IPFS存储
+            }
+            return result
         
-        当前加密货币资产分布：
-        {crypto_assets_text}
+        elif action == "trade":
+            # 处理交易执行请求
+            if "trades" not in ai_data or "tradeSummary" not in ai_data:
+                raise ValueError("API返回的交易执行数据格式不正确")
+            
+            # 验证交易数据
+            trades = ai_data["trades"]
+            for trade in trades:
+                if "fromAsset" not in trade or "toAsset" not in trade or "amount" not in trade:
+                    raise ValueError("交易数据缺少必要字段")
+                
+                # 确保每个交易有链信息
+                if "fromChain" not in trade:
+                    trade["fromChain"] = "ethereum"
+                if "toChain" not in trade:
+                    trade["toChain"] = "ethereum"
+            
+            result = {
+                "modelVersion": f"deepseek-api-{DEEPSEEK_MODEL}",
+                "timestamp": int(time.time()),
+                "action": "trade",
+                "trades": trades,
+                "tradeSummary": ai_data["tradeSummary"],
+                "market_data": market_data
+            }
+            return result
+        else:
+            raise ValueError(f"未知的操作类型: {action}")
         
-        最新市场数据：
-        {market_data_text}
-        """
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.error(f"解析DeepSeek API响应失败: {str(e)}")
+        raise ValueError(f"无法从DeepSeek API响应中提取有效的JSON: {str(e)}")
+
+
+async def fallback_advice(error: Exception) -> Dict[str, Any]:
+    """
+    生成失败时提供的安全配置建议
+    """
+    return {
+        "modelVersion": "fallback",
+        "timestamp": int(time.time()),
+        "action": "recommend",  # 默认提供建议而不是交易
+        "error": str(error),
+        "allocation": [
+            {"asset": "USDC", "percentage": 50, "chain": "ethereum"},
+            {"asset": "BTC", "percentage": 20, "chain": "ethereum"},
+            {"asset": "ETH", "percentage": 15, "chain": "ethereum"},
+            {"asset": "USDT", "percentage": 15, "chain": "ethereum"}
+        ],
+        "allocationText": "由于处理请求时出错，提供安全配置：50% USDC, 20% BTC, 15% ETH, 15% USDT",
+        "market_data": (await get_market_snapshot()).to_dict()
+    }
+
+
+async def _prepare_market_context(input_data: InputData) -> Tuple[Dict[str, Any], str, Optional[Dict[str, Any]]]:
+    """
+    读取市场数据并检查建议缓存
+    
+    Returns:
+        Tuple: (市场数据, 缓存键, 命中的缓存建议或None)
+    """
+    if not DEEPSEEK_API_KEY:
+        logger.error("DeepSeek API密钥未配置")
+        raise ValueError("DeepSeek API密钥未配置")
+    
+    with span("market_data") as info:
+        # 读取后台轮询发布的市场数据快照
+        market_data = (await get_market_snapshot()).to_dict()
         
-        # 添加用户的具体需求描述（如果有）
-        if hasattr(input_data, 'userMessage') and input_data.userMessage:
-            user_message += f"""
-        投资者额外需求：
-        {input_data.userMessage}
-        """
-            
-        user_message += """
-        我希望获得一个具体的加密货币投资组合方案，包括不同资产的配置比例，并请注明推荐的区块链网络。
-        请根据我当前的资产分布、风险偏好和个人需求，提供更加合理的配置建议。
-        """
+        # 相同输入在相同市场区间内直接复用已生成的建议
+        cache_key = build_advice_cache_key(input_data, market_data)
+        cached_advice = advice_cache.get(cache_key)
+        if cached_advice is not None:
+            logger.info("命中投资建议缓存")
+            info["cache"] = "hit"
+            return market_data, cache_key, copy.deepcopy(cached_advice)
         
-        # 构建DeepSeek API请求
-        payload = {
-            "model": DEEPSEEK_MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            "temperature": 0.3,  # 较低的温度以获得更确定的结果
-            "max_tokens": 1000
-        }
+        # 并发获取用户资产涉及的各条链的GAS费
+        chains = ["ethereum"] + [asset.chain for asset in input_data.cryptoAssets]
+        market_data["chain_gas_prices"] = await gas_oracle.get_gas_prices(chains)
+        return market_data, cache_key, None
+
+
+async def generate_investment_advice(input_data: InputData) -> Dict[str, Any]:
+    """
+    使用DeepSeek API生成投资建议
+    
+    Args:
+        input_data: 用户输入数据
         
-        # 请求头
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-        }
+    Returns:
+        Dict: 包含资产配置的投资建议
+    """
+    try:
+        market_data, cache_key, cached_advice = await _prepare_market_context(input_data)
+        if cached_advice is not None:
+            return cached_advice
+        
+        payload = build_deepseek_payload(input_data, market_data)
         
         # 发送请求到DeepSeek API
-        async with aiohttp.ClientSession() as session:
-            async with session.post(DEEPSEEK_API_URL, json=payload, headers=headers) as response:
+        with span("llm") as info:
+            async with get_http_session().post(DEEPSEEK_API_URL, json=payload, headers=_deepseek_headers()) as response:
+                info["status_code"] = response.status
                 if response.status != 200:
                     error_text = await response.text()
                     logger.error(f"DeepSeek API请求失败: {error_text}")
@@ -155,111 +365,75 @@ async def generate_investment_advice(input_data: InputData) -> Dict[str, Any]:
                 
                 # 解析API响应
                 response_data = await response.json()
-                
-                # 提取AI生成的内容
-                ai_response = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                logger.info(f"DeepSeek API返回: {ai_response[:100]}...")
-                
-                # 从响应中提取JSON
-                try:
-                    # 提取JSON部分，如果有多个JSON块，则选取第一个
-                    json_start = ai_response.find('{')
-                    json_end = ai_response.rfind('}') + 1
-                    
-                    if json_start >= 0 and json_end > json_start:
-                        json_str = ai_response[json_start:json_end]
-                        ai_data = json.loads(json_str)
-                    else:
-                        # 如果没有找到JSON格式，尝试解析整个文本
-                        ai_data = json.loads(ai_response)
-                    
-                    # 根据action字段判断是投资建议还是交易执行
-                    action = ai_data.get("action", "recommend")  # 默认为投资建议
-                    
-                    if action == "recommend":
-                        # 处理投资建议
-                        # 确保正确的结构
-                        if "allocation" not in ai_data or "allocationText" not in ai_data:
-                            raise ValueError("API返回的投资建议数据格式不正确")
-                        
-                        # 处理分配数据，确保百分比总和为100%
-                        allocation = ai_data["allocation"]
-                        
-                        # 确保每个分配项都有chain字段
-                        for item in allocation:
-                            if "chain" not in item:
-                                item["chain"] = "ethereum"  # 默认使用以太坊网络
-                        
-                        total = sum(item["percentage"] for item in allocation)
-                        
-                        # 如果百分比总和不为100%，进行调整
-                        if total != 100:
-                            logger.warning(f"资产配置百分比总和为{total}%，调整为100%")
-                            scale_factor = 100 / total
-                            for item in allocation:
-                                item["percentage"] = round(item["percentage"] * scale_factor)
-                            
-                            # 确保调整后总和为100%
-                            current_sum = sum(item["percentage"] for item in allocation)
-                            if current_sum != 100:
-                                # 加到第一个资产上
-                                allocation[0]["percentage"] += (100 - current_sum)
-                        
-                        return {
-                            "modelVersion": f"deepseek-api-{DEEPSEEK_MODEL}",
-                            "timestamp": int(time.time()),
-                            "action": "recommend",
-                            "allocation": allocation,
-                            "allocationText": ai_data["allocationText"],
-                            "market_data": market_data  # 添加市场数据到返回中，用于IPFS存储
-                        }
-                    
-                    elif action == "trade":
-                        # 处理交易执行请求
-                        if "trades" not in ai_data or "tradeSummary" not in ai_data:
-                            raise ValueError("API返回的交易执行数据格式不正确")
-                        
-                        # 验证交易数据
-                        trades = ai_data["trades"]
-                        for trade in trades:
-                            if "fromAsset" not in trade or "toAsset" not in trade or "amount" not in trade:
-                                raise ValueError("交易数据缺少必要字段")
-                            
-                            # 确保每个交易有链信息
-                            if "fromChain" not in trade:
-                                trade["fromChain"] = "ethereum"
-                            if "toChain" not in trade:
-                                trade["toChain"] = "ethereum"
-                        
-                        return {
-                            "modelVersion": f"deepseek-api-{DEEPSEEK_MODEL}",
-                            "timestamp": int(time.time()),
-                            "action": "trade",
-                            "trades": trades,
-                            "tradeSummary": ai_data["tradeSummary"],
-                            "market_data": market_data
-                        }
-                    else:
-                        raise ValueError(f"未知的操作类型: {action}")
-                    
-                except (json.JSONDecodeError, ValueError) as e:
-                    logger.error(f"解析DeepSeek API响应失败: {str(e)}")
-                    raise ValueError(f"无法从DeepSeek API响应中提取有效的JSON: {str(e)}")
-                    
+        
+        # 提取AI生成的内容
+        ai_response = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
+        logger.info(f"DeepSeek API返回: {ai_response[:100]}...")
+        
+        result = parse_advice_response(ai_response, market_data)
+        advice_cache.set(cache_key, copy.deepcopy(result))
+        return result
+    
     except Exception as e:
         logger.error(f"生成投资建议时出错: {str(e)}")
         # 提供后备建议，并记录错误
-        return {
-            "modelVersion": "fallback",
-            "timestamp": int(time.time()),
-            "action": "recommend",  # 默认提供建议而不是交易
-            "error": str(e),
-            "allocation": [
-                {"asset": "USDC", "percentage": 50, "chain": "ethereum"},
-                {"asset": "BTC", "percentage": 20, "chain": "ethereum"},
-                {"asset": "ETH", "percentage": 15, "chain": "ethereum"},
-                {"asset": "USDT", "percentage": 15, "chain": "ethereum"}
-            ],
-            "allocationText": "由于处理请求时出错，提供安全配置：50% USDC, 20% BTC, 15% ETH, 15% USDT",
-            "market_data": await get_all_market_data()  
-        } 
\ No newline at end of file
+        return await fallback_advice(e)
+
+
+async def stream_investment_advice(input_data: InputData) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    使用DeepSeek流式输出生成投资建议
+    
+    逐个产出 ("token", 文本片段)，结束后产出一次 ("result", 建议)；
+    建议经过与 generate_investment_advice 相同的校验，失败时产出后备建议
+    
+    Args:
+        input_data: 用户输入数据
+    """
+    try:
+        market_data, cache_key, cached_advice = await _prepare_market_context(input_data)
+        if cached_advice is not None:
+            yield "result", cached_advice
+            return
+        
+        payload = build_deepseek_payload(input_data, market_data, stream=True)
+        chunks: List[str] = []
+        
+        with span("llm_stream") as info:
+            started = time.perf_counter()
+            async with get_http_session().post(DEEPSEEK_API_URL, json=payload, headers=_deepseek_headers()) as response:
+                info["status_code"] = response.status
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"DeepSeek API请求失败: {error_text}")
+                    raise Exception(f"DeepSeek API请求失败: {response.status}")
+            
+                # 流式响应为SSE格式，每行 "data: {...}"，以 "data: [DONE]" 结束
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        delta = json.loads(data).get("choices", [{}])[0].get("delta", {}).get("content")
+                    except (json.JSONDecodeError, IndexError, AttributeError):
+                        logger.warning(f"无法解析DeepSeek流式数据: {data[:100]}")
+                        continue
+                    if delta:
+                        if not chunks:
+                            info["first_token"] = round(time.perf_counter() - started, 6)
+                        chunks.append(delta)
+                        yield "token", delta
+        
+        ai_response = "".join(chunks)
+        logger.info(f"DeepSeek API流式返回: {ai_response[:100]}...")
+        
+        result = parse_advice_response(ai_response, market_data)
+        advice_cache.set(cache_key, copy.deepcopy(result))
+        yield "result", result
+    
+    except Exception as e:
+        logger.error(f"流式生成投资建议时出错: {str(e)}")
+        yield "result", await fallback_advice(e)
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+from ..utils.hash_utils import normalize_address, normalize_request_hash
+from ..utils.merkle import build_tree, get_proof, hash_leaf, verify_proof
+from .blockchain import anchor_batch
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class AnchorStore:
+    """
+    批次上链记录的本地存储(SQLite)
+
+    保存每个CID所在批次的根、叶子和证明，供 /api/proof/{cid} 查询
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def open(self) -> None:
+        """打开数据库，不存在时创建"""
+        if self._conn is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS anchor_batches (
+                root TEXT PRIMARY KEY,
+                tx_hash TEXT NOT NULL,
+                leaf_count INTEGER NOT NULL,
+                anchored_at INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS anchor_leaves (
+                cid TEXT PRIMARY KEY,
+                user_address TEXT NOT NULL,
+                request_hash TEXT NOT NULL,
+                leaf TEXT NOT NULL,
+                leaf_index INTEGER NOT NULL,
+                proof TEXT NOT NULL,
+                root TEXT NOT NULL REFERENCES anchor_batches(root)
+            );
+            CREATE INDEX IF NOT EXISTS idx_anchor_leaves_user ON anchor_leaves(user_address);
+        """)
+        self._conn.commit()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.open()
+        return self._conn
+
+    def save_batch(self, root: str, tx_hash: str, anchored_at: int, leaves: List[Dict[str, Any]]) -> None:
+        """在一个事务中写入批次及其所有叶子"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO anchor_batches (root, tx_hash, leaf_count, anchored_at) VALUES (?, ?, ?, ?)",
+                (root, tx_hash, len(leaves), anchored_at),
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO anchor_leaves "
+                "(cid, user_address, request_hash, leaf, leaf_index, proof, root) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        leaf["cid"], leaf["userAddress"].lower(), leaf["requestHash"], leaf["leaf"],
+                        leaf["leafIndex"], json.dumps(leaf["proof"]), root,
+                    )
+                    for leaf in leaves
+                ],
+            )
+
+    def get_proof(self, cid: str) -> Optional[Dict[str, Any]]:
+        """按CID查询所在批次和Merkle证明"""
+        row = self.conn.execute(
+            "SELECT l.cid, l.user_address, l.request_hash, l.leaf, l.leaf_index, l.proof, "
+            "b.root, b.tx_hash, b.leaf_count, b.anchored_at "
+            "FROM anchor_leaves l JOIN anchor_batches b ON l.root = b.root WHERE l.cid = ?",
+            (cid,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "cid": row[0],
+            "userAddress": row[1],
+            "requestHash": row[2],
+            "leaf": row[3],
+            "leafIndex": row[4],
+            "proof": json.loads(row[5]),
+            "merkleRoot": row[6],
+            "txHash": row[7],
+            "batchSize": row[8],
+            "anchoredAt": row[9],
+        }
+
+
+class _PendingLeaf:
+    __slots__ = ("user_address", "request_hash", "cid", "future")
+
+    def __init__(self, user_address: str, request_hash: str, cid: str, future: asyncio.Future):
+        self.user_address = user_address
+        self.request_hash = request_hash
+        self.cid = cid
+        self.future = future
+
+
+class BatchAnchorer:
+    """
+    Merkle批次上链
+
+    在 window 秒内或累计 max_items 条后，将收集到的请求构建成Merkle树，只把根通过
+    anchorBatch 上链；每个请求拿到自己的叶子、证明和批次交易哈希。
+
+    合约为批次中每条请求发出 RequestRecorded 事件但不写入用户存储，因此批次中的请求
+    只能通过事件索引出现在 /api/history 中，不会出现在合约的 getUserRequestsPage 里。
+    """
+
+    def __init__(self, store: AnchorStore, window: float, max_items: int):
+        self.store = store
+        self.window = window
+        self.max_items = max_items
+        self._pending: List[_PendingLeaf] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: set = set()
+        self._batches = 0
+        self._leaves = 0
+
+    async def submit(self, user_address: str, request_hash: str, cid: str) -> Dict[str, Any]:
+        """
+        加入当前批次并等待批次上链
+
+        Returns:
+            Dict: 包含 txHash、merkleRoot、leaf、leafIndex、proof、batchSize
+
+        Raises:
+            ValueError: 地址或请求哈希无效，只拒绝这一条请求，不进入批次
+        """
+        user_address = normalize_address(user_address)
+        request_hash = normalize_request_hash(request_hash)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingLeaf(user_address, request_hash, cid, future))
+        if len(self._pending) >= self.max_items:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+        return await future
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window)
+        self._timer = None
+        self._flush_now()
+
+    def _flush_now(self) -> None:
+        """取出当前批次并在后台上链"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._anchor(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _anchor(self, batch: List[_PendingLeaf]) -> None:
+        try:
+            leaves = [hash_leaf(item.user_address, item.request_hash, item.cid) for item in batch]
+            levels = build_tree(leaves)
+            root = levels[-1][0]
+            tx_hash = await anchor_batch(root, [(item.user_address, item.request_hash, item.cid) for item in batch])
+
+            root_hex = "0x" + root.hex()
+            records = [
+                {
+                    "cid": item.cid,
+                    "userAddress": item.user_address,
+                    "requestHash": item.request_hash,
+                    "leaf": "0x" + leaves[index].hex(),
+                    "leafIndex": index,
+                    "proof": ["0x" + node.hex() for node in get_proof(levels, index)],
+                }
+                for index, item in enumerate(batch)
+            ]
+            await asyncio.to_thread(self.store.save_batch, root_hex, tx_hash, int(time.time()), records)
+            self._batches += 1
+            self._leaves += len(batch)
+        except Exception as e:
+            logger.error(f"批次上链失败，共 {len(batch)} 条: {str(e)}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        for item, record in zip(batch, records):
+            if not item.future.done():
+                item.future.set_result({
+                    **record,
+                    "txHash": tx_hash,
+                    "merkleRoot": root_hex,
+                    "batchSize": len(batch),
+                })
+
+    async def get_proof(self, cid: str) -> Optional[Dict[str, Any]]:
+        """查询CID的Merkle证明，并在本地重新校验"""
+        record = await asyncio.to_thread(self.store.get_proof, cid)
+        if record is None:
+            return None
+        leaf = hash_leaf(record["userAddress"], record["requestHash"], record["cid"])
+        record["verified"] = leaf == bytes.fromhex(record["leaf"][2:]) and verify_proof(
+            leaf,
+            [bytes.fromhex(node[2:]) for node in record["proof"]],
+            bytes.fromhex(record["merkleRoot"][2:]),
+        )
+        return record
+
+    def start(self) -> None:
+        self.store.open()
+
+    async def stop(self) -> None:
+        """立即上链尚未满窗口的批次，并等待进行中的批次完成"""
+        self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        self.store.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": settings.ANCHOR_MODE,
+            "window": self.window,
+            "max_items": self.max_items,
+            "pending": len(self._pending),
+            "anchoring": len(self._flushes),
+            "batches_anchored": self._batches,
+            "leaves_anchored": self._leaves,
+        }
+
+
+# 全局批次上链器，由 main.py 的 lifespan 启动和停止
+batch_anchorer = BatchAnchorer(
+    store=AnchorStore(settings.ANCHOR_DB_PATH),
+    window=settings.ANCHOR_BATCH_WINDOW,
+    max_items=settings.ANCHOR_BATCH_MAX_ITEMS,
+)
@@ -1,14 +1,32 @@
 import os
+import asyncio
+import contextvars
+import functools
 import logging
+import threading
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from web3 import Web3
 from web3.middleware import geth_poa_middleware
 from eth_account import Account
+from eth_account.signers.local import LocalAccount
 from eth_account.messages import encode_defunct
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Callable, Dict, Any, List, Optional, Tuple, TypeVar
 from web3.exceptions import ContractLogicError, TransactionNotFound
 from ..core.config import settings
+from ..utils.cursor import CHAIN_CURSOR, encode_cursor
+from ..utils.hash_utils import normalize_address, normalize_request_hash
+from ..utils.singleflight import SingleFlight
+from ..utils.tracing import record_retry, span
+from .chain_context import ChainContext
+from .confirmation_tracker import confirmation_tracker, format_receipt
+from .fee_engine import fee_engine, gas_limits
+from .json_rpc import JsonRpcError, json_rpc, json_rpc_batch, rpc_pool
+from .pooled_provider import PooledHTTPProvider
+from .tx_watchdog import tx_watchdog
+from .nonce_manager import SEND_REJECTED, SEND_UNKNOWN, NonceManager
+from .signer_pool import Signer, SignerPool
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -22,11 +40,25 @@ CHAIN_ID = settings.CHAIN_ID
 NETWORK_NAME = settings.NETWORK_NAME
 CONTRACT_ABI_JSON = settings.CONTRACT_ABI
 
-# 初始化Web3连接
-w3 = Web3(Web3.HTTPProvider(BLOCKCHAIN_RPC_URL))
+# 初始化Web3连接，由RPC节点池选择节点
+w3 = Web3(PooledHTTPProvider(rpc_pool, settings.RPC_REQUEST_TIMEOUT))
 # 针对Sepolia网络添加POA中间件
 w3.middleware_onion.inject(geth_poa_middleware, layer=0)
 
+
+def rpc_metrics_middleware(make_request, w3):
+    """记录每个JSON-RPC调用的耗时和结果"""
+    def middleware(method, params):
+        with span(method, kind="rpc") as info:
+            response = make_request(method, params)
+            if "error" in response:
+                info["status"] = "error"
+            return response
+    return middleware
+
+
+w3.middleware_onion.add(rpc_metrics_middleware, "rpc_metrics")
+
 # 转换合约地址为校验和格式
 CONTRACT_ADDRESS = w3.to_checksum_address(CONTRACT_ADDRESS_RAW)
 
@@ -57,6 +89,73 @@ except json.JSONDecodeError as e:
 
 logger.info("使用内置ABI配置")
 
+# 合并对同一用户历史或同一交易的并发链上读取
+chain_read_flight = SingleFlight("blockchain_read")
+
+# web3 客户端是同步的，所有RPC调用在有界线程池中执行，避免阻塞事件循环
+_chain_executor = ThreadPoolExecutor(
+    max_workers=settings.BLOCKCHAIN_EXECUTOR_WORKERS,
+    thread_name_prefix="web3"
+)
+
+T = TypeVar("T")
+
+
+async def run_in_chain_executor(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    在区块链线程池中执行同步的web3调用
+
+    复制当前上下文，使线程中的RPC耗时仍记录到当前请求的追踪中
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _chain_executor, functools.partial(context.run, fn, *args, **kwargs)
+    )
+
+
+def shutdown_chain_executor() -> None:
+    """关闭区块链线程池，由 main.py 的 lifespan 在关闭时调用"""
+    _chain_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 启动时构建的链上下文，由 main.py 的 lifespan 调用 init_chain_context 解析
+_chain_context: Optional[ChainContext] = None
+_chain_context_lock = threading.Lock()
+
+
+def get_chain_context() -> ChainContext:
+    """获取链上下文，尚未构建时查询一次链ID后构建(同步)"""
+    global _chain_context
+    if _chain_context is None:
+        with _chain_context_lock:
+            if _chain_context is None:
+                _chain_context = ChainContext.resolve(
+                    w3,
+                    CONTRACT_ADDRESS,
+                    CONTRACT_ABI,
+                    CHAIN_ID,
+                    Account.from_key(PRIVATE_KEY) if PRIVATE_KEY else None,
+                )
+    return _chain_context
+
+
+async def init_chain_context() -> ChainContext:
+    """在线程池中构建链上下文，避免首笔交易承担链ID查询的开销"""
+    return await run_in_chain_executor(get_chain_context)
+
+
+async def wait_for_receipt(tx_hash: bytes, timeout: float) -> Any:
+    """
+    等待交易回执
+
+    由共享的确认跟踪器统一按区块批量查询，不再为每笔交易单独轮询
+
+    Raises:
+        TimeoutError: 超时仍未获取到回执
+    """
+    return await confirmation_tracker.wait(tx_hash, timeout)
+
 
 def create_signature(message_to_sign: str, timestamp: Optional[int] = None) -> Tuple[str, int]:
     """
@@ -110,6 +209,215 @@ def create_signature(message_to_sign: str, timestamp: Optional[int] = None) -> T
         raise
 
 
+async def _fetch_pending_nonce(address: str) -> int:
+    return await run_in_chain_executor(w3.eth.get_transaction_count, address, "pending")
+
+
+async def _fetch_mined_nonce(address: str) -> int:
+    return await run_in_chain_executor(w3.eth.get_transaction_count, address, "latest")
+
+
+async def _transaction_exists(tx_hash: str) -> bool:
+    try:
+        await run_in_chain_executor(w3.eth.get_transaction, tx_hash)
+        return True
+    except TransactionNotFound:
+        return False
+
+
+def _load_signer_accounts() -> List[LocalAccount]:
+    """主私钥和 SIGNER_PRIVATE_KEYS 中的热钱包账户，按地址去重"""
+    accounts: Dict[str, LocalAccount] = {}
+    for private_key in [PRIVATE_KEY, *settings.SIGNER_PRIVATE_KEYS]:
+        if not private_key:
+            continue
+        try:
+            account = Account.from_key(private_key)
+        except Exception as e:
+            logger.error(f"无法加载签名账户私钥: {str(e)}")
+            continue
+        accounts.setdefault(account.address, account)
+    return list(accounts.values())
+
+
+# 填补nonce空洞的0值转账的gas上限
+GAP_FILL_GAS_LIMIT = 21000
+
+
+async def _fill_nonce_gap(account: LocalAccount, nonce: int) -> str:
+    """在被丢弃交易的nonce上发送0值转给自己的交易，使其后已广播的交易可以被打包"""
+    context = get_chain_context()
+    tx = context.build_transaction(b"", nonce, GAP_FILL_GAS_LIMIT, (await fee_engine.quote()).fields)
+    tx["to"] = account.address
+    raw_tx = context.sign_transaction(tx, account)
+    await run_in_chain_executor(w3.eth.send_raw_transaction, raw_tx)
+    tx_hash = Web3.keccak(raw_tx).hex()
+    logger.warning(f"已在nonce {nonce} 上发送填补交易: {tx_hash}")
+    return tx_hash
+
+
+# 签名账户池，每个账户一条独立的nonce序列，并发提交的交易分散到各账户
+signer_pool = SignerPool(
+    _load_signer_accounts(),
+    lambda account: NonceManager(
+        account.address,
+        functools.partial(_fetch_pending_nonce, account.address),
+        _transaction_exists,
+        functools.partial(_fill_nonce_gap, account),
+    ),
+)
+logger.info(f"签名账户数: {len(signer_pool)}")
+
+# 发送交易遇到nonce过低时，重新同步后最多重试的次数
+NONCE_RETRY_LIMIT = 2
+
+# gas估算失败时使用的gas上限
+RECORD_GAS_LIMIT = 2000000
+ANCHOR_GAS_LIMIT = 300000
+# 批次每条请求的叶子哈希、RequestRecorded 事件和调用数据
+ANCHOR_GAS_PER_LEAF = 20000
+
+
+def _sign_transaction(data: bytes, account: LocalAccount, nonce: int, gas: int, fees: Dict[str, int]) -> bytes:
+    """
+    由预编码的调用数据在本地构建并签名交易，不访问节点
+
+    Returns:
+        bytes: 已签名的原始交易
+    """
+    context = get_chain_context()
+    tx = context.build_transaction(data, nonce, gas, fees)
+    return context.sign_transaction(tx, account)
+
+
+async def _broadcast(raw_tx: bytes) -> bytes:
+    """广播已签名的交易，返回交易哈希"""
+    await run_in_chain_executor(w3.eth.send_raw_transaction, raw_tx)
+    return Web3.keccak(raw_tx)
+
+
+async def _estimate_gas(data: bytes) -> int:
+    result = await json_rpc("eth_estimateGas", [{
+        "from": SERVER_ADDRESS,
+        "to": get_chain_context().contract_address,
+        "data": "0x" + data.hex(),
+    }], hedge=True)
+    return int(result, 16)
+
+
+async def _transact(function_name: str, args: Tuple, size: int, default_gas: int) -> Tuple[bytes, Any]:
+    """
+    调用合约函数并等待确认
+    
+    gas上限按函数和动态参数长度分桶缓存，费用来自 eth_feeHistory 报价；
+    确认后把实际打包耗时和gas消耗反馈给费用估算器和gas缓存
+    
+    Args:
+        function_name: 合约函数名
+        args: 函数参数
+        size: 动态参数的字节数，用于gas缓存分桶
+        default_gas: 估算失败时使用的gas上限
+    
+    Returns:
+        Tuple[bytes, Any]: (交易哈希, 交易回执)
+    """
+    data = get_chain_context().encode_call(function_name, *args)
+    gas = await gas_limits.get(function_name, size, lambda: _estimate_gas(data), default_gas)
+    quote = await fee_engine.quote()
+    
+    started = time.monotonic()
+    tx_hash, tx_receipt = await submit_transaction(
+        lambda account, nonce, fees: _sign_transaction(data, account, nonce, gas, fees), quote.fields
+    )
+    fee_engine.record_inclusion(quote, tx_receipt.blockNumber, time.monotonic() - started)
+    gas_limits.observe(function_name, size, tx_receipt.gasUsed, gas, tx_receipt.status)
+    return tx_hash, tx_receipt
+
+
+async def submit_transaction(
+    sign: Callable[[LocalAccount, int, Dict[str, int]], bytes],
+    fees: Dict[str, int],
+) -> Tuple[bytes, Any]:
+    """
+    选择负载最低的签名账户，使用该账户本地分配的nonce发送交易并等待回执
+    
+    交易长时间未打包时由看门狗以相同账户、相同nonce和更高的费用替换
+    
+    Args:
+        sign: 接收签名账户、nonce和费用字段，构建并签名交易的同步函数，返回已签名的原始交易
+        fees: 费用字段
+    
+    Returns:
+        Tuple[bytes, Any]: (实际被打包的交易哈希, 交易回执)
+    """
+    async with signer_pool.lease() as signer:
+        return await _submit_with_signer(signer, sign, fees)
+
+
+async def _submit_with_signer(
+    signer: Signer,
+    sign: Callable[[LocalAccount, int, Dict[str, int]], bytes],
+    fees: Dict[str, int],
+) -> Tuple[bytes, Any]:
+    nonce_manager = signer.nonces
+    # 从本地分配器获取nonce，nonce过低时重新同步后重试
+    for attempt in range(NONCE_RETRY_LIMIT + 1):
+        nonce = await nonce_manager.allocate()
+        try:
+            raw_tx = sign(signer.account, nonce, fees)
+        except Exception:
+            nonce_manager.release(nonce)
+            raise
+        # 广播前记录交易哈希，广播结果不明时 recover_gaps 可以按哈希判断交易是否被丢弃
+        tx_hash = Web3.keccak(raw_tx)
+        nonce_manager.mark_sent(nonce, tx_hash.hex())
+        try:
+            await _broadcast(raw_tx)
+            break
+        except Exception as e:
+            outcome = await nonce_manager.handle_send_error(nonce, e)
+            if outcome == SEND_UNKNOWN:
+                # 交易可能已到达节点，按哈希等待确认；确实未送达时由看门狗重新发送或超时后填补空洞
+                break
+            if outcome == SEND_REJECTED or attempt == NONCE_RETRY_LIMIT:
+                raise
+            record_retry("rpc", "eth_sendRawTransaction")
+    
+    # 等待交易或其替换交易被确认；超时或查询出错时按链上状态处理该nonce
+    try:
+        tx_hash, tx_receipt = await tx_watchdog.watch(
+            signer.address,
+            nonce,
+            tx_hash,
+            fees,
+            lambda bumped: _broadcast(sign(signer.account, nonce, bumped)),
+            settings.RECEIPT_TIMEOUT,
+            on_replaced=lambda new_hash: nonce_manager.mark_sent(nonce, new_hash),
+        )
+    except Exception as e:
+        await _settle_unwatched_nonce(nonce_manager, signer.address, nonce, e)
+        raise
+    nonce_manager.mark_mined(nonce)
+    return tx_hash, tx_receipt
+
+
+async def _settle_unwatched_nonce(nonce_manager: NonceManager, address: str, nonce: int, error: Exception) -> None:
+    """
+    看门狗没有返回回执时清理nonce状态
+
+    该nonce上已有交易被打包(本交易或其替换交易)时不再跟踪；否则检查交易是否被节点丢弃，
+    并填补留下的空洞。清理失败只记录日志，调用方仍抛出看门狗的原始错误
+    """
+    logger.warning(f"等待交易确认失败: nonce {nonce}, {type(error).__name__}: {str(error)}")
+    try:
+        if nonce < await _fetch_mined_nonce(address):
+            nonce_manager.mark_mined(nonce)
+        else:
+            await nonce_manager.recover_gaps()
+    except Exception as e:
+        logger.error(f"检查nonce {nonce} 状态失败: {str(e)}")
+
+
 async def record_to_blockchain(user_address: str, request_hash: str, cid: str, signature: str) -> str:
     """
     在区块链上记录请求
@@ -128,49 +436,17 @@ async def record_to_blockchain(user_address: str, request_hash: str, cid: str, s
             logger.error("私钥未配置")
             raise ValueError("私钥未配置")
         
-        if not w3.is_connected():
-            logger.error("无法连接到区块链")
-            raise ConnectionError("无法连接到区块链")
-        
-        # 确保用户地址也是校验和格式
-        user_address = w3.to_checksum_address(user_address)
-        
-        # 获取合约实例
-        contract_address = w3.to_checksum_address(CONTRACT_ADDRESS)
-        contract = w3.eth.contract(address=contract_address, abi=CONTRACT_ABI)
-        
-        # 格式化请求哈希
-        request_hash_bytes = bytes.fromhex(request_hash[2:] if request_hash.startswith('0x') else request_hash)
-        
-        # 格式化签名
+        # 校验并格式化用户地址、请求哈希和签名
+        user_address = normalize_address(user_address)
+        request_hash_bytes = Web3.to_bytes(hexstr=normalize_request_hash(request_hash))
         signature_bytes = bytes.fromhex(signature[2:] if signature.startswith('0x') else signature)
         
-        # 当前gas价格
-        gas_price = w3.eth.gas_price
-        # 可选: 增加gas价格以加快确认
-        gas_price = int(gas_price * 1.1)  # 增加10%
-        
-        # 构建交易
-        tx = contract.functions.recordRequest(
-            user_address,
-            request_hash_bytes,
-            cid,
-            signature_bytes
-        ).build_transaction({
-            'from': SERVER_ADDRESS,
-            'gas': 2000000,
-            'gasPrice': gas_price,
-            'nonce': w3.eth.get_transaction_count(SERVER_ADDRESS)
-        })
-        
-        # 签名交易
-        signed_tx = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-        
-        # 发送交易
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        
-        # 等待交易被确认
-        tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+        tx_hash, tx_receipt = await _transact(
+            "recordRequest",
+            (user_address, request_hash_bytes, cid, signature_bytes),
+            len(cid.encode('utf-8')),
+            RECORD_GAS_LIMIT,
+        )
         
         if tx_receipt.status == 1:  # 1表示成功
             logger.info(f"交易成功记录到区块链，交易哈希: {tx_hash.hex()}")
@@ -188,37 +464,125 @@ async def record_to_blockchain(user_address: str, request_hash: str, cid: str, s
         raise
 
 
-async def get_user_requests(user_address: str) -> List[Dict[str, Any]]:
+def sign_message_hash(message_hash: bytes) -> str:
     """
-    获取用户的所有请求
+    以服务器私钥对32字节消息哈希进行以太坊签名
+    
+    合约按 "\\x19Ethereum Signed Message:\\n32" 前缀恢复签名者
+    """
+    if not PRIVATE_KEY:
+        logger.error("私钥未配置")
+        raise ValueError("私钥未配置")
+    signature = w3.eth.account.sign_message(
+        encode_defunct(hexstr=message_hash.hex()),
+        private_key=PRIVATE_KEY
+    )
+    return signature.signature.hex()
+
+
+async def anchor_batch(root: bytes, leaves: List[Tuple[str, str, str]]) -> str:
+    """
+    将一批请求的Merkle根上链
+    
+    合约按叶子重新计算Merkle根，并为每条请求发出 RequestRecorded 事件，
+    批次中的请求由事件索引进入用户历史
+    
+    Args:
+        root: Merkle根
+        leaves: 批次中每条请求的 (用户地址, 请求哈希, CID)，顺序与构建Merkle树时一致
+    
+    Returns:
+        str: 交易哈希
+    """
+    try:
+        users = [Web3.to_checksum_address(user_address) for user_address, _, _ in leaves]
+        # 与单条上链一致，请求哈希必须正好32字节，不做填充
+        request_hashes = [
+            Web3.to_bytes(hexstr=normalize_request_hash(request_hash)) for _, request_hash, _ in leaves
+        ]
+        cids = [cid for _, _, cid in leaves]
+        # 合约校验 keccak256(abi.encodePacked(root)) 的签名
+        signature = sign_message_hash(w3.keccak(root))
+        signature_bytes = bytes.fromhex(signature[2:] if signature.startswith('0x') else signature)
+        # gas随叶子数和CID长度增长，按调用数据大小分桶缓存
+        size = sum(len(cid.encode('utf-8')) + 64 for cid in cids)
+        tx_hash, tx_receipt = await _transact(
+            "anchorBatch",
+            (root, users, request_hashes, cids, signature_bytes),
+            size,
+            ANCHOR_GAS_LIMIT + ANCHOR_GAS_PER_LEAF * len(leaves),
+        )
+        if tx_receipt.status != 1:
+            logger.error(f"批次上链交易失败，交易哈希: {tx_hash.hex()}")
+            raise Exception("区块链交易失败")
+        logger.info(f"批次Merkle根已上链: {root.hex()}, 共 {len(leaves)} 条, 交易哈希: {tx_hash.hex()}")
+        return tx_hash.hex()
+    except Exception as e:
+        logger.error(f"批次上链时出错: {str(e)}")
+        raise
+
+
+# 从最新记录开始分页时传给合约的 before
+UINT256_MAX = 2 ** 256 - 1
+
+
+async def get_user_requests_page(
+    user_address: str,
+    limit: int,
+    before: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    按时间倒序分页获取用户的请求
     
     Args:
         user_address: 用户的以太坊地址
+        limit: 每页记录数
+        before: 上一页游标中的记录下标，只返回下标小于它的记录；None表示从最新记录开始
     
     Returns:
-        list: 用户请求的列表
+        Tuple: (用户请求列表, 下一页游标；没有更多记录时为None)
+    """
+    if before is None:
+        before = UINT256_MAX
+    return await chain_read_flight.do(
+        ("user_requests", user_address.lower(), before, limit),
+        lambda: _get_user_requests_page(user_address, limit, before),
+    )
+
+
+async def _get_user_requests_page(
+    user_address: str,
+    limit: int,
+    before: int,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    调用合约分页读取用户的请求
     """
     try:
         # 确保用户地址是校验和格式
         user_address = w3.to_checksum_address(user_address)
         
-        # 获取合约实例
-        contract_address = w3.to_checksum_address(CONTRACT_ADDRESS)
-        contract = w3.eth.contract(address=contract_address, abi=CONTRACT_ABI)
+        # 获取缓存的合约实例
+        contract = get_chain_context().contract
         
-        # 调用合约方法
-        result = contract.functions.getUserRequests(user_address).call()
+        # 调用合约方法，每页的返回数据量和RPC开销与记录总数无关
+        request_hashes, cids, timestamps, total = await run_in_chain_executor(
+            contract.functions.getUserRequestsPage(user_address, before, limit).call
+        )
         
         # 整理结果
         requests = []
-        for i in range(len(result[0])):
+        for i in range(len(request_hashes)):
             requests.append({
-                "requestHash": result[0][i].hex(),
-                "cid": result[1][i],
-                "timestamp": result[2][i]
+                "requestHash": request_hashes[i].hex(),
+                "cid": cids[i],
+                "timestamp": timestamps[i]
             })
         
-        return requests
+        # 本页最后一条的下标即为下一页的 before
+        next_before = min(before, total) - len(requests)
+        next_cursor = encode_cursor(CHAIN_CURSOR, next_before) if requests and next_before > 0 else None
+        return requests, next_cursor
     except Exception as e:
         logger.error(f"获取用户请求时出错: {str(e)}")
         raise
@@ -235,6 +599,21 @@ async def verify_transaction(tx_hash: str, timeout: int = 30) -> Dict[str, Any]:
     Returns:
         Dict: 交易详情
     """
+    # 被提高费用替换的交易不会上链，改为验证同一nonce上实际打包的交易
+    lineage = tx_watchdog.lineage(tx_hash)
+    if lineage is not None and lineage["status"] == "mined":
+        tx_hash = lineage["txHash"]
+    key = ("transaction", tx_hash.lower().removeprefix("0x"))
+    result = await chain_read_flight.do(key, lambda: _verify_transaction(tx_hash, timeout))
+    if lineage is not None and lineage["replacedTxHashes"]:
+        result = {**result, "replacedTxHashes": lineage["replacedTxHashes"]}
+    return result
+
+
+async def _verify_transaction(tx_hash: str, timeout: int) -> Dict[str, Any]:
+    """
+    等待交易回执并解析事件
+    """
     try:
         # 移除前缀(如果有)
         if tx_hash.startswith('0x'):
@@ -243,61 +622,72 @@ async def verify_transaction(tx_hash: str, timeout: int = 30) -> Dict[str, Any]:
         # 转换为bytes
         tx_hash_bytes = bytes.fromhex(tx_hash)
         
-        # 等待直到交易被挖出或超时
-        start_time = time.time()
-        while time.time() - start_time < timeout:
+        # 回执和交易详情互不依赖，合并为一个批量请求并在节点间对冲
+        receipt_raw, tx_raw = await json_rpc_batch(
+            [
+                ("eth_getTransactionReceipt", ["0x" + tx_hash]),
+                ("eth_getTransactionByHash", ["0x" + tx_hash]),
+            ],
+            hedge=True,
+        )
+        for result in (receipt_raw, tx_raw):
+            if isinstance(result, JsonRpcError):
+                raise result
+        
+        if receipt_raw is not None:
+            tx_receipt = format_receipt(receipt_raw)
+        else:
+            # 尚未打包，等待交易被打包或超时，由确认跟踪器统一查询回执
+            tx_receipt = await wait_for_receipt(tx_hash_bytes, timeout)
+        if tx_raw is None:
+            tx_raw = await json_rpc("eth_getTransactionByHash", ["0x" + tx_hash], hedge=True)
+        if tx_raw is None:
+            raise TransactionNotFound(f"交易 0x{tx_hash} 不存在")
+        tx_details = {
+            "from": Web3.to_checksum_address(tx_raw["from"]),
+            "to": Web3.to_checksum_address(tx_raw["to"]) if tx_raw.get("to") else None,
+        }
+        
+        # 提取事件数据，按缓存的事件主题过滤，只解码本合约的 RequestRecorded 日志
+        context = get_chain_context()
+        contract = context.contract
+        events = []
+        for log in tx_receipt.logs:
             try:
-                tx_receipt = w3.eth.get_transaction_receipt(tx_hash_bytes)
-                tx_details = w3.eth.get_transaction(tx_hash_bytes)
-                
-                if tx_receipt:
-                    # 提取事件数据
-                    contract_address = w3.to_checksum_address(CONTRACT_ADDRESS)
-                    contract = w3.eth.contract(address=contract_address, abi=CONTRACT_ABI)
-                    events = []
-                    for log in tx_receipt.logs:
-                        try:
-                            log_address = w3.to_checksum_address(log['address'])
-                            if log_address.lower() == contract_address.lower():
-                                parsed_log = contract.events.RequestRecorded().process_log(log)
-                                
-                                # 创建符合我们API期望的事件对象
-                                event_data = {
-                                    "event": parsed_log.get('event', ''),
-                                    "address": parsed_log.get('address', ''),
-                                    "blockNumber": parsed_log.get('blockNumber', 0),
-                                    "returnValues": {}  # 初始化为空字典
-                                }
-                                
-                                # 提取args中的数据到returnValues
-                                if hasattr(parsed_log, 'args'):
-                                    args = dict(parsed_log.args)
-                                    # 确保值是可序列化的
-                                    for key, value in args.items():
-                                        if isinstance(value, bytes):
-                                            args[key] = '0x' + value.hex()
-                                    event_data['returnValues'] = args
-                                    
-                                events.append(event_data)
-                        except Exception as e:
-                            logger.warning(f"解析事件日志时出错: {str(e)}")
-                            logger.warning(f"异常详情: {e.__class__.__name__}: {str(e)}")
+                if context.is_event(log, "RequestRecorded"):
+                    parsed_log = contract.events.RequestRecorded().process_log(log)
                     
-                    return {
-                        "hash": tx_hash,
-                        "blockNumber": tx_receipt.blockNumber,
-                        "from": tx_details['from'],
-                        "to": tx_details['to'],
-                        "status": "成功" if tx_receipt.status == 1 else "失败",
-                        "gasUsed": tx_receipt.gasUsed,
-                        "events": events
+                    # 创建符合我们API期望的事件对象
+                    event_data = {
+                        "event": parsed_log.get('event', ''),
+                        "address": parsed_log.get('address', ''),
+                        "blockNumber": parsed_log.get('blockNumber', 0),
+                        "returnValues": {}  # 初始化为空字典
                     }
-            except TransactionNotFound:
-                # 交易尚未被挖出
-                time.sleep(2)  # 等待2秒后重试
+                    
+                    # 提取args中的数据到returnValues
+                    if hasattr(parsed_log, 'args'):
+                        args = dict(parsed_log.args)
+                        # 确保值是可序列化的
+                        for key, value in args.items():
+                            if isinstance(value, bytes):
+                                args[key] = '0x' + value.hex()
+                        event_data['returnValues'] = args
+                        
+                    events.append(event_data)
+            except Exception as e:
+                logger.warning(f"解析事件日志时出错: {str(e)}")
+                logger.warning(f"异常详情: {e.__class__.__name__}: {str(e)}")
         
-        # 超时
-        raise TimeoutError(f"等待交易确认超时: {tx_hash}")
+        return {
+            "hash": tx_hash,
+            "blockNumber": tx_receipt.blockNumber,
+            "from": tx_details['from'],
+            "to": tx_details['to'],
+            "status": "成功" if tx_receipt.status == 1 else "失败",
+            "gasUsed": tx_receipt.gasUsed,
+            "events": events
+        }
     except Exception as e:
         logger.error(f"验证交易时出错: {str(e)}")
         logger.error(f"异常类型: {e.__class__.__name__}")
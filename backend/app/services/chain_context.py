@@ -0,0 +1,120 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from eth_abi import encode
+from eth_account.signers.local import LocalAccount
+from eth_utils import event_abi_to_log_topic, function_abi_to_4byte_selector, to_checksum_address
+from eth_utils.abi import collapse_if_tuple
+from web3 import Web3
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class ChainContext:
+    """
+    启动时解析一次的链上下文
+
+    缓存合约实例、校验和地址、函数选择器、参数类型、事件主题和链ID。
+    交易在本地由预编码的调用数据构建并签名，不再经过 build_transaction，
+    因此除广播外不产生额外的RPC请求(eth_chainId、web3_clientVersion、eth_estimateGas)。
+    """
+
+    def __init__(
+        self,
+        w3: Web3,
+        contract_address: str,
+        abi: List[Dict[str, Any]],
+        chain_id: int,
+        account: Optional[LocalAccount] = None,
+    ):
+        self.w3 = w3
+        self.contract_address = to_checksum_address(contract_address)
+        self.contract = w3.eth.contract(address=self.contract_address, abi=abi)
+        self.chain_id = chain_id
+        self.account = account
+
+        self.selectors: Dict[str, bytes] = {}
+        self._arg_types: Dict[str, List[str]] = {}
+        self.event_topics: Dict[str, bytes] = {}
+        for entry in abi:
+            if entry.get("type") == "function":
+                self.selectors[entry["name"]] = function_abi_to_4byte_selector(entry)
+                self._arg_types[entry["name"]] = [collapse_if_tuple(arg) for arg in entry.get("inputs", [])]
+            elif entry.get("type") == "event":
+                self.event_topics[entry["name"]] = event_abi_to_log_topic(entry)
+
+    @classmethod
+    def resolve(
+        cls,
+        w3: Web3,
+        contract_address: str,
+        abi: List[Dict[str, Any]],
+        configured_chain_id: int,
+        account: Optional[LocalAccount] = None,
+    ) -> "ChainContext":
+        """
+        查询一次链ID并构建上下文(同步，在线程池中执行)
+
+        节点不可用时使用配置的链ID，签名的交易仍可在节点恢复后广播
+        """
+        try:
+            chain_id = w3.eth.chain_id
+            if chain_id != configured_chain_id:
+                logger.warning(f"警告: 配置的链ID ({configured_chain_id}) 与连接的网络链ID ({chain_id}) 不匹配")
+        except Exception as e:
+            logger.warning(f"查询链ID失败，使用配置的链ID {configured_chain_id}: {str(e)}")
+            chain_id = configured_chain_id
+        return cls(w3, contract_address, abi, chain_id, account)
+
+    def encode_call(self, function_name: str, *args: Any) -> bytes:
+        """
+        按缓存的选择器和参数类型编码合约调用数据
+
+        Raises:
+            ValueError: ABI中没有该函数
+        """
+        if function_name not in self.selectors:
+            raise ValueError(f"合约ABI中没有函数 {function_name}")
+        return self.selectors[function_name] + encode(self._arg_types[function_name], args)
+
+    def build_transaction(self, data: bytes, nonce: int, gas: int, fees: Dict[str, int]) -> Dict[str, Any]:
+        """
+        在本地构建调用合约的交易，不访问节点
+
+        Args:
+            fees: {"gasPrice"} 或 {"maxFeePerGas", "maxPriorityFeePerGas"}，后者构建 EIP-1559 交易
+        """
+        tx = {
+            "chainId": self.chain_id,
+            "to": self.contract_address,
+            "value": 0,
+            "data": data,
+            "nonce": nonce,
+            "gas": gas,
+            **fees,
+        }
+        if "maxFeePerGas" in fees:
+            tx["type"] = 2
+        return tx
+
+    def sign_transaction(self, tx: Dict[str, Any], account: Optional[LocalAccount] = None) -> bytes:
+        """
+        用指定账户(默认为缓存的主账户)在本地签名交易
+
+        Raises:
+            ValueError: 私钥未配置
+        """
+        account = account or self.account
+        if account is None:
+            raise ValueError("私钥未配置")
+        return account.sign_transaction(tx).rawTransaction
+
+    def is_event(self, log: Any, event_name: str) -> bool:
+        """判断日志是否为本合约的指定事件"""
+        topics = log["topics"]
+        return (
+            bool(topics)
+            and log["address"].lower() == self.contract_address.lower()
+            and bytes(topics[0]) == self.event_topics.get(event_name)
+        )
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+
+from ..core.config import settings
+from .json_rpc import JsonRpcError, json_rpc, json_rpc_batch
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 回执和日志中需要从十六进制转换为整数的字段
+_RECEIPT_INT_FIELDS = (
+    "blockNumber", "cumulativeGasUsed", "effectiveGasPrice", "gasUsed",
+    "status", "transactionIndex", "type",
+)
+_LOG_INT_FIELDS = ("blockNumber", "logIndex", "transactionIndex")
+_BYTES_FIELDS = ("blockHash", "transactionHash", "data", "logsBloom")
+
+ReceiptListener = Callable[[str, AttributeDict], None]
+
+
+def _format_log(log: Dict[str, Any]) -> AttributeDict:
+    formatted = dict(log)
+    for field in _LOG_INT_FIELDS:
+        if formatted.get(field) is not None:
+            formatted[field] = int(formatted[field], 16)
+    for field in _BYTES_FIELDS:
+        if formatted.get(field) is not None:
+            formatted[field] = HexBytes(formatted[field])
+    formatted["topics"] = [HexBytes(topic) for topic in formatted.get("topics", [])]
+    if formatted.get("address"):
+        formatted["address"] = to_checksum_address(formatted["address"])
+    return AttributeDict(formatted)
+
+
+def format_receipt(receipt: Dict[str, Any]) -> AttributeDict:
+    """将原始JSON-RPC回执转换为与 web3 返回值相同的结构"""
+    formatted = dict(receipt)
+    for field in _RECEIPT_INT_FIELDS:
+        if formatted.get(field) is not None:
+            formatted[field] = int(formatted[field], 16)
+    for field in _BYTES_FIELDS:
+        if formatted.get(field) is not None:
+            formatted[field] = HexBytes(formatted[field])
+    for field in ("from", "to", "contractAddress"):
+        if formatted.get(field):
+            formatted[field] = to_checksum_address(formatted[field])
+    formatted["logs"] = [_format_log(log) for log in formatted.get("logs", [])]
+    return AttributeDict(formatted)
+
+
+def _normalize_hash(tx_hash: Any) -> str:
+    if isinstance(tx_hash, (bytes, bytearray)):
+        tx_hash = tx_hash.hex()
+    tx_hash = tx_hash.lower()
+    return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+
+
+class ConfirmationTracker:
+    """
+    共享的交易确认跟踪器
+
+    一个后台任务跟随新区块，每出一个新块只用批量 JSON-RPC 查询一次所有待确认交易的回执，
+    再分别唤醒等待各交易的调用方。无论有多少交易待确认，每个区块的RPC请求数都只随批次数增长，
+    没有待确认交易时不发送任何请求。
+    """
+
+    def __init__(self, poll_interval: float, batch_size: int):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        # 新加入、尚未查询过的交易，不等新区块即查询一次(可能早已打包)
+        self._unchecked: Set[str] = set()
+        self._listeners: List[ReceiptListener] = []
+        self._head: Optional[int] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._polls = 0
+        self._rpc_requests = 0
+        self._resolved = 0
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def head(self) -> Optional[int]:
+        """最近一次查询到的区块高度"""
+        return self._head
+
+    def watch(self, tx_hash: Any, future: Optional[asyncio.Future] = None) -> asyncio.Future:
+        """
+        开始跟踪交易，回执到达时设置 future 的结果
+
+        同一个 future 可以跟踪多笔交易(如同一nonce的替换交易)，任意一笔确认即完成
+        """
+        key = _normalize_hash(tx_hash)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(future)
+        self._unchecked.add(key)
+        self._ensure_running()
+        self._wakeup.set()
+        return future
+
+    def unwatch(self, tx_hash: Any, future: asyncio.Future) -> None:
+        """停止为 future 跟踪交易"""
+        key = _normalize_hash(tx_hash)
+        waiters = self._waiters.get(key)
+        if waiters is None:
+            return
+        if future in waiters:
+            waiters.remove(future)
+        if not waiters:
+            del self._waiters[key]
+            self._unchecked.discard(key)
+
+    async def wait(self, tx_hash: Any, timeout: float) -> AttributeDict:
+        """
+        等待交易回执
+
+        Raises:
+            TimeoutError: 超时仍未获取到回执
+        """
+        future = self.watch(tx_hash)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"等待交易确认超时: {_normalize_hash(tx_hash)}")
+        finally:
+            self.unwatch(tx_hash, future)
+
+    def add_listener(self, listener: ReceiptListener) -> None:
+        """注册回调，任何被跟踪的交易确认时调用"""
+        self._listeners.append(listener)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._waiters:
+                continue
+            try:
+                await self._poll()
+            except Exception as e:
+                logger.warning(f"查询交易回执失败: {str(e)}")
+
+    async def _poll(self) -> None:
+        """新区块时查询全部待确认交易，否则只查询新加入的交易"""
+        self._polls += 1
+        head = int(await json_rpc("eth_blockNumber", []), 16)
+        self._rpc_requests += 1
+        if head != self._head:
+            self._head = head
+            hashes = list(self._waiters)
+        else:
+            hashes = [key for key in self._unchecked if key in self._waiters]
+        self._unchecked.clear()
+
+        for start in range(0, len(hashes), self.batch_size):
+            chunk = hashes[start:start + self.batch_size]
+            results = await json_rpc_batch([("eth_getTransactionReceipt", [key]) for key in chunk])
+            self._rpc_requests += 1
+            for key, result in zip(chunk, results):
+                if isinstance(result, JsonRpcError):
+                    logger.warning(f"查询交易回执失败 {key}: {str(result)}")
+                elif result is not None:
+                    self._resolve(key, format_receipt(result))
+
+    def _resolve(self, key: str, receipt: AttributeDict) -> None:
+        for future in self._waiters.pop(key, []):
+            if not future.done():
+                future.set_result(receipt)
+        self._resolved += 1
+        for listener in self._listeners:
+            try:
+                listener(key, receipt)
+            except Exception as e:
+                logger.warning(f"交易确认回调出错: {str(e)}")
+
+    async def stop(self) -> None:
+        """停止后台任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._waiters),
+            "waiters": sum(len(waiters) for waiters in self._waiters.values()),
+            "head": self._head,
+            "polls": self._polls,
+            "rpc_requests": self._rpc_requests,
+            "resolved": self._resolved,
+        }
+
+
+# 全局确认跟踪器，首次等待时启动，由 main.py 的 lifespan 停止
+confirmation_tracker = ConfirmationTracker(
+    poll_interval=settings.RECEIPT_POLL_INTERVAL,
+    batch_size=settings.RECEIPT_BATCH_SIZE,
+)
@@ -0,0 +1,353 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from eth_abi import decode
+from eth_utils import keccak, to_checksum_address
+
+from ..core.config import settings
+from ..utils.cursor import INDEX_CURSOR, encode_cursor
+from .json_rpc import JsonRpcError, json_rpc, json_rpc_batch, rpc_pool
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# RequestRecorded(address indexed user, bytes32 requestHash, string cid, uint256 timestamp)
+REQUEST_RECORDED_TOPIC = "0x" + keccak(text="RequestRecorded(address,bytes32,string,uint256)").hex()
+
+# 单次 eth_getLogs 范围的下限，节点因结果过多拒绝时按此缩小
+MIN_CHUNK_SIZE = 10
+
+
+class EventIndexStore:
+    """RequestRecorded 事件的本地SQLite索引，按用户和时间排序"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        # 索引写入和API查询在不同线程中执行，共用一个连接时需要串行化
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        if self._conn is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS request_events (
+                block_number INTEGER NOT NULL,
+                log_index INTEGER NOT NULL,
+                block_hash TEXT NOT NULL,
+                tx_hash TEXT NOT NULL,
+                user_address TEXT NOT NULL,
+                request_hash TEXT NOT NULL,
+                cid TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                PRIMARY KEY (block_number, log_index)
+            );
+            CREATE INDEX IF NOT EXISTS idx_request_events_user
+                ON request_events(user_address, timestamp DESC, block_number DESC, log_index DESC);
+            CREATE TABLE IF NOT EXISTS indexed_blocks (
+                block_number INTEGER PRIMARY KEY,
+                block_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS indexer_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    @property
+    def is_open(self) -> bool:
+        return self._conn is not None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def last_block(self) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM indexer_state WHERE key = 'last_block'").fetchone()
+        return row[0] if row else None
+
+    def recent_block_hashes(self) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT block_number, block_hash FROM indexed_blocks").fetchall())
+
+    def save_range(
+        self,
+        events: List[Tuple],
+        last_block: int,
+        block_hashes: Dict[int, str],
+        keep_from: int,
+    ) -> None:
+        """在一个事务中写入事件、推进进度并更新用于检测重组的区块哈希"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO request_events "
+                "(block_number, log_index, block_hash, tx_hash, user_address, request_hash, cid, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                events,
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO indexed_blocks (block_number, block_hash) VALUES (?, ?)",
+                block_hashes.items(),
+            )
+            self._conn.execute("DELETE FROM indexed_blocks WHERE block_number < ?", (keep_from,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO indexer_state (key, value) VALUES ('last_block', ?)", (last_block,)
+            )
+
+    def rewind(self, from_block: int) -> None:
+        """删除 from_block 及之后的索引数据(链重组)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM request_events WHERE block_number >= ?", (from_block,))
+            self._conn.execute("DELETE FROM indexed_blocks WHERE block_number >= ?", (from_block,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO indexer_state (key, value) VALUES ('last_block', ?)", (from_block - 1,)
+            )
+
+    def query_user(
+        self,
+        user_address: str,
+        limit: int,
+        cursor: Optional[Tuple[int, int, int]] = None,
+    ) -> List[Tuple]:
+        """按时间倒序查询用户记录"""
+        sql = (
+            "SELECT request_hash, cid, timestamp, tx_hash, block_number, log_index "
+            "FROM request_events WHERE user_address = ?"
+        )
+        params: List[Any] = [user_address.lower()]
+        if cursor is not None:
+            sql += " AND (timestamp, block_number, log_index) < (?, ?, ?)"
+            params.extend(cursor)
+        sql += " ORDER BY timestamp DESC, block_number DESC, log_index DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+class EventIndexer:
+    """
+    RequestRecorded 事件索引器
+
+    后台按区块范围分段调用 eth_getLogs 同步合约事件到本地SQLite；
+    保留最近 reorg_depth 个区块的哈希，发现哈希变化时回退并重新索引该部分。
+    """
+
+    def __init__(
+        self,
+        store: EventIndexStore,
+        contract_address: str,
+        start_block: int,
+        chunk_size: int,
+        reorg_depth: int,
+        poll_interval: float,
+    ):
+        self.store = store
+        self.contract_address = contract_address
+        self.start_block = start_block
+        self.chunk_size = chunk_size
+        self.reorg_depth = reorg_depth
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._head: Optional[int] = None
+        self._reorgs = 0
+        self._events_indexed = 0
+
+    @property
+    def synced(self) -> bool:
+        """是否已追上链头(落后不超过重组深度)"""
+        if not self.store.is_open:
+            return False
+        last_block = self.store.last_block()
+        return last_block is not None and self._head is not None and self._head - last_block <= self.reorg_depth
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.store.open)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"事件索引器已启动: 合约 {self.contract_address}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.store.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                logger.warning(f"事件索引同步失败: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    @staticmethod
+    def _block_hash_calls(numbers: List[int]) -> List[Tuple[str, list]]:
+        return [("eth_getBlockByNumber", [hex(n), False]) for n in numbers]
+
+    @staticmethod
+    def _parse_block_hashes(numbers: List[int], results: List[Any]) -> Dict[int, str]:
+        return {
+            number: result["hash"]
+            for number, result in zip(numbers, results)
+            if not isinstance(result, JsonRpcError) and result is not None
+        }
+
+    async def _block_hashes(self, numbers: List[int], url: str) -> Dict[int, str]:
+        results = await json_rpc_batch(self._block_hash_calls(numbers), url)
+        return self._parse_block_hashes(numbers, results)
+
+    async def _check_reorg(self, stored: Dict[int, str], current: Dict[int, str]) -> None:
+        """比较最近区块的哈希，发现重组时回退到分叉点"""
+        forked = [number for number, block_hash in stored.items() if current.get(number) != block_hash]
+        if forked:
+            fork_block = min(forked)
+            logger.warning(f"检测到链重组，从区块 {fork_block} 开始重新索引")
+            await asyncio.to_thread(self.store.rewind, fork_block)
+            self._reorgs += 1
+
+    async def _get_logs(self, from_block: int, to_block: int, url: str) -> List[Dict[str, Any]]:
+        return await json_rpc("eth_getLogs", [{
+            "address": self.contract_address,
+            "topics": [REQUEST_RECORDED_TOPIC],
+            "fromBlock": hex(from_block),
+            "toBlock": hex(to_block),
+        }], url)
+
+    @staticmethod
+    def _decode_log(log: Dict[str, Any]) -> Tuple:
+        request_hash, cid, timestamp = decode(
+            ["bytes32", "string", "uint256"], bytes.fromhex(log["data"][2:])
+        )
+        user_address = "0x" + log["topics"][1][-40:]
+        return (
+            int(log["blockNumber"], 16),
+            int(log["logIndex"], 16),
+            log["blockHash"],
+            log["transactionHash"],
+            user_address.lower(),
+            "0x" + request_hash.hex(),
+            cid,
+            timestamp,
+        )
+
+    async def sync_once(self) -> int:
+        """
+        同步到当前链头
+
+        Returns:
+            int: 本次写入的事件数
+        """
+        # 一次同步内固定使用评分最优的节点，避免各节点高度不一致时按较高的链头读取了较低节点的日志
+        url = rpc_pool.ranked()[0].url
+        # 链头和最近区块哈希互不依赖，合并为一个批量请求
+        stored = await asyncio.to_thread(self.store.recent_block_hashes)
+        numbers = sorted(stored)
+        results = await json_rpc_batch([("eth_blockNumber", []), *self._block_hash_calls(numbers)], url)
+        if isinstance(results[0], JsonRpcError):
+            raise results[0]
+        self._head = int(results[0], 16)
+        if stored:
+            await self._check_reorg(stored, self._parse_block_hashes(numbers, results[1:]))
+
+        last_block = await asyncio.to_thread(self.store.last_block)
+        from_block = self.start_block if last_block is None else last_block + 1
+        indexed = 0
+        chunk_size = self.chunk_size
+        while from_block <= self._head:
+            to_block = min(from_block + chunk_size - 1, self._head)
+            try:
+                logs = await self._get_logs(from_block, to_block, url)
+            except JsonRpcError as e:
+                # 结果过多或范围过大时缩小范围重试
+                if chunk_size <= MIN_CHUNK_SIZE:
+                    raise
+                chunk_size = max(MIN_CHUNK_SIZE, chunk_size // 2)
+                logger.info(f"eth_getLogs 范围过大，缩小到 {chunk_size} 个区块: {str(e)}")
+                continue
+
+            events = [self._decode_log(log) for log in logs if not log.get("removed")]
+            # 只记录接近链头、可能被重组的区块哈希
+            keep_from = self._head - self.reorg_depth + 1
+            recent = list(range(max(from_block, keep_from), to_block + 1))
+            block_hashes = await self._block_hashes(recent, url) if recent else {}
+            await asyncio.to_thread(self.store.save_range, events, to_block, block_hashes, keep_from)
+
+            indexed += len(events)
+            from_block = to_block + 1
+        self._events_indexed += indexed
+        return indexed
+
+    async def get_user_history(
+        self,
+        user_address: str,
+        limit: int,
+        after: Optional[Tuple[int, ...]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        分页查询用户记录，按时间倒序
+
+        Args:
+            after: 上一页游标中的排序键 (timestamp, block_number, log_index)
+
+        Returns:
+            Tuple: (记录列表, 下一页游标；没有更多记录时为None)
+
+        Raises:
+            ValueError: 游标格式无效
+        """
+        if after is not None and len(after) != 3:
+            raise ValueError("无效的分页游标")
+        rows = await asyncio.to_thread(self.store.query_user, user_address, limit + 1, after)
+        items = [
+            {
+                "requestHash": row[0],
+                "cid": row[1],
+                "timestamp": row[2],
+                "txHash": row[3],
+                "blockNumber": row[4],
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(INDEX_CURSOR, last[2], last[4], last[5])
+        return items, next_cursor
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "contract": self.contract_address,
+            "head": self._head,
+            "last_block": self.store.last_block() if self.store.is_open else None,
+            "synced": self.synced,
+            "events_indexed": self._events_indexed,
+            "reorgs": self._reorgs,
+        }
+
+
+# 全局事件索引器，由 main.py 的 lifespan 启动和停止
+event_indexer = EventIndexer(
+    store=EventIndexStore(settings.INDEXER_DB_PATH),
+    contract_address=to_checksum_address(settings.CONTRACT_ADDRESS) if settings.CONTRACT_ADDRESS else "",
+    start_block=settings.INDEXER_START_BLOCK,
+    chunk_size=settings.INDEXER_CHUNK_SIZE,
+    reorg_depth=settings.INDEXER_REORG_DEPTH,
+    poll_interval=settings.INDEXER_POLL_INTERVAL,
+)
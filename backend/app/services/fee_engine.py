@@ -0,0 +1,268 @@
+import logging
+import statistics
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+from ..core.config import settings
+from ..utils.metrics import registry
+from ..utils.singleflight import SingleFlight
+from .json_rpc import JsonRpcError, json_rpc
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# eth_feeHistory 查询的小费分位数，自动调节时在这些档位间移动
+PRIORITY_PERCENTILES = (10, 25, 50, 75, 90)
+
+# EIP-1559 每个区块 base fee 的最大涨幅
+BASE_FEE_MAX_CHANGE = 1.125
+
+# 用于调节分位数的最近确认样本数，以及每次调节前至少需要的样本数
+INCLUSION_SAMPLES = 20
+MIN_SAMPLES_TO_TUNE = 5
+
+# 交易从发送到确认经过的区块数和时间
+INCLUSION_BLOCKS = registry.histogram(
+    "chain_tx_inclusion_blocks",
+    "交易从报价到被打包经过的区块数",
+    ("percentile",),
+    buckets=(1, 2, 3, 5, 8, 13, 21),
+)
+INCLUSION_SECONDS = registry.histogram(
+    "chain_tx_inclusion_seconds",
+    "交易从发送到确认的耗时",
+    ("percentile",),
+)
+
+
+class FeeQuote:
+    """一次费用报价，fields 直接合并到交易字段中"""
+
+    __slots__ = ("fields", "block", "percentile", "created_at")
+
+    def __init__(self, fields: Dict[str, int], block: Optional[int], percentile: Optional[int]):
+        self.fields = fields
+        self.block = block
+        self.percentile = percentile
+        self.created_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.fields, "block": self.block, "percentile": self.percentile}
+
+
+class FeeEngine:
+    """
+    EIP-1559 费用估算
+
+    由 eth_feeHistory 最近区块的小费分位数得到 maxPriorityFeePerGas，maxFeePerGas 按
+    target_blocks 个区块内 base fee 的最大涨幅留出余量，保证在目标区块数内不会因 base fee
+    上涨而滞留。根据实际打包所需的区块数在分位数档位间调节：慢于目标时提高小费，
+    一直快于目标时降低小费。节点不支持 eth_feeHistory 时退回 legacy gasPrice。
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        target_blocks: int,
+        history_blocks: int,
+        percentile: int,
+        min_priority_fee: int,
+        max_fee_cap: int,
+        quote_ttl: float,
+    ):
+        self.mode = mode
+        self.target_blocks = target_blocks
+        self.history_blocks = history_blocks
+        self.min_priority_fee = min_priority_fee
+        self.max_fee_cap = max_fee_cap
+        self.quote_ttl = quote_ttl
+        self._level = min(
+            range(len(PRIORITY_PERCENTILES)), key=lambda i: abs(PRIORITY_PERCENTILES[i] - percentile)
+        )
+        self._quote: Optional[FeeQuote] = None
+        self._flight = SingleFlight("fee_quote")
+        self._samples: Deque[int] = deque(maxlen=INCLUSION_SAMPLES)
+        self._quotes = 0
+        self._adjustments = 0
+
+    @property
+    def percentile(self) -> int:
+        return PRIORITY_PERCENTILES[self._level]
+
+    async def quote(self) -> FeeQuote:
+        """获取当前费用报价，quote_ttl 秒内复用同一报价"""
+        quote = self._quote
+        if quote is not None and time.monotonic() - quote.created_at < self.quote_ttl:
+            return quote
+        return await self._flight.do("quote", self._fetch_quote)
+
+    async def _fetch_quote(self) -> FeeQuote:
+        if self.mode == "eip1559":
+            try:
+                quote = await self._fee_history_quote()
+            except JsonRpcError as e:
+                logger.warning(f"eth_feeHistory 不可用，使用 legacy gasPrice: {str(e)}")
+                quote = await self._legacy_quote()
+        else:
+            quote = await self._legacy_quote()
+        self._quote = quote
+        self._quotes += 1
+        return quote
+
+    async def _legacy_quote(self) -> FeeQuote:
+        gas_price = int(await json_rpc("eth_gasPrice", [], hedge=True), 16)
+        # 增加10%以加快确认
+        return FeeQuote({"gasPrice": int(gas_price * 1.1)}, None, None)
+
+    async def _fee_history_quote(self) -> FeeQuote:
+        history = await json_rpc(
+            "eth_feeHistory", [hex(self.history_blocks), "latest", list(PRIORITY_PERCENTILES)], hedge=True
+        )
+        # baseFeePerGas 比区块数多一项，最后一项是下一个区块的 base fee
+        next_base_fee = int(history["baseFeePerGas"][-1], 16)
+        newest_block = int(history["oldestBlock"], 16) + len(history["gasUsedRatio"]) - 1
+
+        # 空块的小费为0，不参与统计
+        rewards = [
+            int(block_rewards[self._level], 16)
+            for block_rewards, ratio in zip(history.get("reward") or [], history["gasUsedRatio"])
+            if ratio > 0
+        ]
+        priority_fee = max(int(statistics.median(rewards)) if rewards else 0, self.min_priority_fee)
+
+        max_fee = int(next_base_fee * BASE_FEE_MAX_CHANGE ** self.target_blocks) + priority_fee
+        if self.max_fee_cap:
+            max_fee = max(min(max_fee, self.max_fee_cap), priority_fee)
+        return FeeQuote(
+            {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": priority_fee},
+            newest_block,
+            self.percentile,
+        )
+
+    def record_inclusion(self, quote: FeeQuote, block_number: int, seconds: float) -> None:
+        """记录交易实际打包所需的区块数和时间，并据此调节小费分位数"""
+        label = str(quote.percentile) if quote.percentile is not None else "legacy"
+        INCLUSION_SECONDS.observe(seconds, percentile=label)
+        if quote.block is None:
+            return
+        blocks = max(1, block_number - quote.block)
+        INCLUSION_BLOCKS.observe(blocks, percentile=label)
+        # 只用当前档位的报价调节，避免调节前发出的交易反复影响
+        if quote.percentile != self.percentile:
+            return
+        self._samples.append(blocks)
+        if len(self._samples) >= MIN_SAMPLES_TO_TUNE:
+            self._tune()
+
+    def _tune(self) -> None:
+        mean = statistics.mean(self._samples)
+        if mean > self.target_blocks and self._level < len(PRIORITY_PERCENTILES) - 1:
+            self._level += 1
+        elif max(self._samples) < self.target_blocks and self._level > 0:
+            self._level -= 1
+        else:
+            return
+        logger.info(f"平均打包区块数 {mean:.1f}，目标 {self.target_blocks}，小费分位数调整为 {self.percentile}")
+        self._adjustments += 1
+        self._samples.clear()
+        self._quote = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "target_blocks": self.target_blocks,
+            "percentile": self.percentile,
+            "quote": self._quote.to_dict() if self._quote is not None else None,
+            "quotes": self._quotes,
+            "adjustments": self._adjustments,
+            "recent_inclusion_blocks": list(self._samples),
+        }
+
+
+class GasLimitCache:
+    """
+    按函数和参数长度分桶缓存 eth_estimateGas 结果
+
+    同一函数的gas消耗主要随动态参数(CID字符串)占用的32字节字数变化，同一个桶内只估算一次，
+    再乘以安全余量作为gas上限。首次写入某用户记录的存储开销更高，因此用实际回执的 gasUsed
+    抬高缓存值，因gas不足失败时放大上限。
+    """
+
+    def __init__(self, margin: float, word_size: int = 32):
+        self.margin = margin
+        self.word_size = word_size
+        self._limits: Dict[Hashable, int] = {}
+        self._flight = SingleFlight("gas_estimate")
+        self._hits = 0
+        self._estimates = 0
+        self._fallbacks = 0
+
+    def _key(self, function_name: str, size: int) -> Hashable:
+        return function_name, (size + self.word_size - 1) // self.word_size
+
+    async def get(
+        self,
+        function_name: str,
+        size: int,
+        estimate: Callable[[], Awaitable[int]],
+        default: int,
+    ) -> int:
+        """
+        获取gas上限，桶内没有缓存时调用 estimate 估算
+
+        Args:
+            function_name: 合约函数名
+            size: 动态参数的字节数
+            estimate: 无参数的异步估算函数
+            default: 估算失败时使用的gas上限
+        """
+        key = self._key(function_name, size)
+        limit = self._limits.get(key)
+        if limit is not None:
+            self._hits += 1
+            return limit
+        try:
+            return await self._flight.do(key, lambda: self._estimate(key, estimate))
+        except Exception as e:
+            logger.warning(f"估算 {function_name} gas失败，使用默认上限 {default}: {str(e)}")
+            self._fallbacks += 1
+            return default
+
+    async def _estimate(self, key: Hashable, estimate: Callable[[], Awaitable[int]]) -> int:
+        limit = int(await estimate() * (1 + self.margin))
+        self._estimates += 1
+        self._limits[key] = max(limit, self._limits.get(key, 0))
+        return self._limits[key]
+
+    def observe(self, function_name: str, size: int, gas_used: int, gas_limit: int, status: int) -> None:
+        """根据回执更新缓存的gas上限"""
+        key = self._key(function_name, size)
+        if status != 1 and gas_used >= gas_limit:
+            # gas不足导致失败
+            self._limits[key] = int(gas_limit * (1 + self.margin))
+            logger.warning(f"{function_name} 交易gas不足，上限调整为 {self._limits[key]}")
+        elif key in self._limits:
+            self._limits[key] = max(self._limits[key], int(gas_used * (1 + self.margin)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "margin": self.margin,
+            "limits": {f"{name}:{bucket}": limit for (name, bucket), limit in self._limits.items()},
+            "hits": self._hits,
+            "estimates": self._estimates,
+            "fallbacks": self._fallbacks,
+        }
+
+
+# 全局费用估算器和gas上限缓存
+fee_engine = FeeEngine(
+    mode=settings.FEE_MODE,
+    target_blocks=settings.FEE_TARGET_BLOCKS,
+    history_blocks=settings.FEE_HISTORY_BLOCKS,
+    percentile=settings.FEE_PRIORITY_PERCENTILE,
+    min_priority_fee=settings.FEE_MIN_PRIORITY_FEE,
+    max_fee_cap=settings.FEE_MAX_FEE_PER_GAS,
+    quote_ttl=settings.FEE_QUOTE_TTL,
+)
+gas_limits = GasLimitCache(margin=settings.GAS_ESTIMATE_MARGIN)
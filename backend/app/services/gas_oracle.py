@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..core.config import settings
+from ..utils.cache import TTLCache
+from ..utils.singleflight import SingleFlight
+from .http_client import get_http_session
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 链名称别名，统一为配置中使用的名称
+CHAIN_ALIASES = {
+    "eth": "ethereum",
+    "mainnet": "ethereum",
+    "bnb": "bsc",
+    "binance": "bsc",
+    "bnb chain": "bsc",
+    "matic": "polygon",
+    "arb": "arbitrum",
+    "op": "optimism",
+    "avax": "avalanche",
+}
+
+
+def _parse_chain_config(entries: List[str]) -> Dict[str, int]:
+    """解析 "名称:链ID" 形式的配置项"""
+    chains = {}
+    for entry in entries:
+        name, _, chain_id = entry.partition(":")
+        try:
+            chains[name.strip().lower()] = int(chain_id)
+        except ValueError:
+            logger.warning(f"忽略无效的GAS预言机链配置: {entry}")
+    return chains
+
+
+def normalize_chain(chain: str) -> str:
+    """将链名称规范化为配置中的名称"""
+    name = (chain or "").strip().lower()
+    return CHAIN_ALIASES.get(name, name)
+
+
+class GasOracle:
+    """
+    多链GAS费预言机
+
+    每条链有独立的缓存和超时，多条链并发获取，单条链失败或超时不影响其他链
+    """
+
+    def __init__(self, chains: Dict[str, int], ttl: float, stale_ttl: float, timeout: float):
+        self.chains = chains
+        self.timeout = timeout
+        self._caches = {name: TTLCache(f"gas:{name}", ttl, stale_ttl) for name in chains}
+        self._flight = SingleFlight("gas_oracle")
+
+    async def _fetch(self, chain_id: int) -> Dict[str, Any]:
+        """从Infura Gas API获取指定链的建议GAS费，失败时抛出异常以免错误数据进入缓存"""
+        url = f"https://gas.api.infura.io/v3/{settings.INFURA_API_KEY}/networks/{chain_id}/suggestedGasFees"
+        async with get_http_session().get(url) as response:
+            if response.status != 200:
+                raise Exception(f"获取链 {chain_id} 的GAS费失败，状态码: {response.status}")
+
+            data = await response.json()
+
+            # suggestedMaxFeePerGas值是以ETH为单位，需要转换为Gwei (1 ETH = 10^9 Gwei)
+            try:
+                low = round(float(data.get("low", {}).get("suggestedMaxFeePerGas", 0)) * 1e9)
+                medium = round(float(data.get("medium", {}).get("suggestedMaxFeePerGas", 0)) * 1e9)
+                high = round(float(data.get("high", {}).get("suggestedMaxFeePerGas", 0)) * 1e9)
+            except (ValueError, TypeError) as e:
+                raise Exception(f"解析Infura Gas API数据时出错: {str(e)}")
+
+            return {
+                "low": low,
+                "average": medium,
+                "high": high,
+                "timestamp": datetime.now().isoformat()
+            }
+
+    async def get_chain_gas_price(self, chain: str, force: bool = False) -> Dict[str, Any]:
+        """
+        获取单条链的GAS费(带缓存和超时)，失败时返回空字典
+
+        Args:
+            chain: 链名称(支持别名)
+            force: 为True时跳过缓存直接请求上游
+        """
+        name = normalize_chain(chain)
+        chain_id = self.chains.get(name)
+        if chain_id is None:
+            return {}
+        if not settings.INFURA_API_KEY:
+            logger.warning("Infura API密钥未配置")
+            return {}
+
+        async def fetch_with_timeout() -> Dict[str, Any]:
+            return await asyncio.wait_for(self._fetch(chain_id), timeout=self.timeout)
+
+        try:
+            return await self._caches[name].get_or_fetch(
+                "latest", lambda: self._flight.do(name, fetch_with_timeout), force=force
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"获取 {name} GAS费超时")
+            return {}
+        except Exception as e:
+            logger.warning(f"获取 {name} GAS费时出错: {str(e)}")
+            return {}
+
+    async def get_gas_prices(self, chains: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        并发获取多条链的GAS费
+
+        Args:
+            chains: 链名称(支持别名)，为空时获取所有已配置的链；未配置的链会被忽略
+
+        Returns:
+            Dict: 链名称到GAS费数据的映射
+        """
+        if chains is None:
+            names = list(self.chains)
+        else:
+            names = []
+            for chain in chains:
+                name = normalize_chain(chain)
+                if name in self.chains and name not in names:
+                    names.append(name)
+
+        results = await asyncio.gather(*(self.get_chain_gas_price(name) for name in names))
+        return {
+            name: {"chain_id": self.chains[name], **result}
+            for name, result in zip(names, results)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各链缓存统计"""
+        return {
+            "chains": {name: cache.stats() for name, cache in self._caches.items()},
+            "single_flight": self._flight.stats(),
+        }
+
+
+# 全局GAS预言机
+gas_oracle = GasOracle(
+    chains=_parse_chain_config(settings.GAS_ORACLE_CHAINS),
+    ttl=settings.GAS_PRICE_CACHE_TTL,
+    stale_ttl=settings.MARKET_CACHE_STALE_TTL,
+    timeout=settings.GAS_ORACLE_TIMEOUT,
+)
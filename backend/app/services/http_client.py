@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from ..core.config import settings
+from ..utils.tracing import record_upstream
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class HTTPClientRegistry:
+    """
+    应用级共享的 aiohttp 会话
+
+    所有外部HTTP调用(DeepSeek、Pinata、IPFS网关、Infura、alternative.me)复用同一个连接池，
+    避免每次调用都重新进行 TCP+TLS 握手。由 main.py 的 lifespan 在启动时创建、关闭时释放。
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        limit_per_host: int,
+        keepalive_timeout: float,
+        dns_cache_ttl: int,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._requests_per_host: Dict[str, int] = defaultdict(int)
+        self._connections_created = 0
+        self._connections_reused = 0
+        self._dns_cache_hits = 0
+        self._dns_cache_misses = 0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """共享会话，尚未启动时按需创建"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """创建带连接池限制、keep-alive和DNS缓存的会话"""
+        self._connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        return aiohttp.ClientSession(
+            connector=self._connector,
+            trace_configs=[self._build_trace_config()],
+        )
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        """通过 aiohttp 的 trace 钩子统计连接复用、DNS缓存情况以及每个外部请求的耗时和状态码"""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self._requests_per_host[params.url.host or ""] += 1
+            context.started_at = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            duration = time.perf_counter() - context.started_at
+            record_upstream(params.url.host or "", params.method, str(params.response.status), duration)
+
+        async def on_request_exception(session, context, params):
+            duration = time.perf_counter() - context.started_at
+            record_upstream(params.url.host or "", params.method, "error", duration)
+
+        async def on_connection_create_end(session, context, params):
+            self._connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self._connections_reused += 1
+
+        async def on_dns_cache_hit(session, context, params):
+            self._dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, context, params):
+            self._dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    async def start(self, warmup_urls: Optional[List[str]] = None) -> None:
+        """创建共享会话并预热到已知主机的连接"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        logger.info(f"HTTP连接池已启动: limit={self.limit}, limit_per_host={self.limit_per_host}")
+        if warmup_urls:
+            await self.warm_up(warmup_urls)
+
+    async def warm_up(self, urls: List[str], timeout: float = 5) -> None:
+        """
+        向已知主机发送HEAD请求，提前完成DNS解析和TLS握手，连接保留在池中供后续请求复用
+
+        预热失败不影响启动
+        """
+        origins = sorted({f"{parts.scheme}://{parts.netloc}/" for parts in map(urlsplit, urls) if parts.netloc})
+
+        async def _head(origin: str) -> None:
+            try:
+                async with self.session.head(origin, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    await response.release()
+            except Exception as e:
+                logger.warning(f"预热连接失败 {origin}: {str(e)}")
+
+        await asyncio.gather(*(_head(origin) for origin in origins))
+        logger.info(f"已预热 {len(origins)} 个主机的连接")
+
+    async def close(self) -> None:
+        """关闭共享会话并释放所有连接"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._connector = None
+
+    def stats(self) -> Dict[str, Any]:
+        """返回连接池使用情况"""
+        connector = self._connector
+        in_use = 0
+        in_use_per_host: Dict[str, int] = {}
+        idle = 0
+        if connector is not None and not connector.closed:
+            # aiohttp 未公开这些计数，读取内部结构仅用于监控
+            in_use = len(getattr(connector, "_acquired", ()))
+            in_use_per_host = {
+                key.host: len(conns)
+                for key, conns in getattr(connector, "_acquired_per_host", {}).items()
+                if conns
+            }
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        return {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "connections_in_use": in_use,
+            "connections_in_use_per_host": in_use_per_host,
+            "idle_connections": idle,
+            "connections_created": self._connections_created,
+            "connections_reused": self._connections_reused,
+            "dns_cache_hits": self._dns_cache_hits,
+            "dns_cache_misses": self._dns_cache_misses,
+            "requests_per_host": dict(self._requests_per_host),
+        }
+
+
+# 全局共享的HTTP客户端
+http_clients = HTTPClientRegistry(
+    limit=settings.HTTP_POOL_LIMIT,
+    limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+    keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+    dns_cache_ttl=settings.HTTP_DNS_CACHE_TTL,
+)
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """获取共享的 aiohttp 会话，调用方不应关闭它"""
+    return http_clients.session
+
+
+def get_warmup_urls() -> List[str]:
+    """需要在启动时预热连接的已知外部服务"""
+    urls = [
+        "https://api.alternative.me/fng/",
+        "https://api.pinata.cloud/",
+        settings.IPFS_GATEWAY_URL,
+        settings.DEEPSEEK_API_URL,
+    ]
+    if settings.INFURA_API_KEY:
+        urls.append("https://gas.api.infura.io/")
+    return [url for url in urls if url]
@@ -1,10 +1,12 @@
 import os
 import json
 import logging
-import aiohttp
 import asyncio
+import aiohttp
 from typing import Dict, Any, Union, Optional
 from ..core.config import settings
+from .http_client import get_http_session
+from ..utils.singleflight import SingleFlight
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -18,6 +20,99 @@ IPFS_GATEWAY_URL = settings.IPFS_GATEWAY_URL
 # Pinata API 接口
 PINATA_PIN_JSON_URL = "https://api.pinata.cloud/pinning/pinJSONToIPFS"
 PINATA_PIN_BY_HASH_URL = "https://api.pinata.cloud/pinning/pinByHash"
+PINATA_PIN_FILE_URL = "https://api.pinata.cloud/pinning/pinFileToIPFS"
+
+
+class CIDMismatchError(Exception):
+    """Pinata返回的CID与本地预先计算的CID不一致"""
+
+    def __init__(self, expected: str, actual: str):
+        super().__init__(f"IPFS CID不一致: 本地计算 {expected}, Pinata返回 {actual}")
+        self.expected = expected
+        self.actual = actual
+
+# 合并对同一CID的并发读取
+ipfs_flight = SingleFlight("ipfs")
+
+def _pinata_headers() -> Dict[str, str]:
+    """Pinata认证请求头"""
+    # 检查Pinata凭证
+    if not PINATA_API_KEY and not PINATA_JWT:
+        logger.error("Pinata API凭证未配置")
+        raise ValueError("Pinata API凭证未配置")
+    
+    # 使用JWT token如果存在
+    if PINATA_JWT:
+        return {"Authorization": f"Bearer {PINATA_JWT}"}
+    # 回退到使用API密钥
+    return {
+        "pinata_api_key": PINATA_API_KEY,
+        "pinata_secret_api_key": PINATA_SECRET_KEY
+    }
+
+
+def _pinata_metadata(metadata: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    """Pinata元数据"""
+    pinata_metadata: Dict[str, Any] = {
+        "name": metadata.get("name", "ai-advice.json") if metadata else "ai-advice.json"
+    }
+    
+    if metadata and "type" in metadata:
+        pinata_metadata["keyvalues"] = {"type": metadata["type"]}
+    return pinata_metadata
+
+
+async def pin_content_to_ipfs(
+    content: bytes,
+    expected_cid: str,
+    metadata: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    将已序列化的字节作为单个文件上传到Pinata，并校验返回的CID
+    
+    上传的字节与本地计算CID使用的字节完全相同，因此CID在上传前即可确定
+    
+    Args:
+        content: 文件内容
+        expected_cid: 本地预先计算的CIDv0
+        metadata: 可选的元数据，用于描述内容
+    
+    Returns:
+        str: IPFS内容标识符(CID)
+    
+    Raises:
+        CIDMismatchError: Pinata返回的CID与预期不一致
+    """
+    try:
+        pinata_metadata = _pinata_metadata(metadata)
+        form = aiohttp.FormData()
+        form.add_field("file", content, filename=pinata_metadata["name"], content_type="application/json")
+        form.add_field("pinataMetadata", json.dumps(pinata_metadata))
+        form.add_field("pinataOptions", json.dumps({"cidVersion": 0, "wrapWithDirectory": False}))
+        
+        async with get_http_session().post(PINATA_PIN_FILE_URL, data=form, headers=_pinata_headers()) as response:
+            if response.status not in (200, 201):
+                error_text = await response.text()
+                logger.error(f"Pinata存储请求失败: {error_text}")
+                raise Exception(f"Pinata存储请求失败: {response.status}")
+            
+            response_data = await response.json()
+        
+        cid = response_data.get("IpfsHash")
+        if not cid:
+            raise ValueError("从Pinata响应中未获取到CID")
+        if cid != expected_cid:
+            raise CIDMismatchError(expected_cid, cid)
+        
+        logger.info(f"数据已成功存储到IPFS，CID: {cid}")
+        return cid
+    except CIDMismatchError as e:
+        logger.critical(str(e))
+        raise
+    except Exception as e:
+        logger.error(f"存储数据到IPFS时出错: {str(e)}")
+        raise
+
 
 async def store_data_to_ipfs(data: Dict[str, Any], metadata: Optional[Dict[str, str]] = None) -> str:
     """
@@ -31,31 +126,14 @@ async def store_data_to_ipfs(data: Dict[str, Any], metadata: Optional[Dict[str,
         str: IPFS内容标识符(CID)
     """
     try:
-        # 检查Pinata凭证
-        if not PINATA_API_KEY and not PINATA_JWT:
-            logger.error("Pinata API凭证未配置")
-            raise ValueError("Pinata API凭证未配置")
-        
         # 准备请求头
         headers = {
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            **_pinata_headers()
         }
         
-        # 使用JWT token如果存在
-        if PINATA_JWT:
-            headers["Authorization"] = f"Bearer {PINATA_JWT}"
-        else:
-            # 回退到使用API密钥
-            headers["pinata_api_key"] = PINATA_API_KEY
-            headers["pinata_secret_api_key"] = PINATA_SECRET_KEY
-        
         # 准备请求体
-        pinata_metadata = {
-            "name": metadata.get("name", "ai-advice.json") if metadata else "ai-advice.json"
-        }
-        
-        if metadata and "type" in metadata:
-            pinata_metadata["keyvalues"] = {"type": metadata["type"]}
+        pinata_metadata = _pinata_metadata(metadata)
         
         request_body = {
             "pinataContent": data,
@@ -63,23 +141,22 @@ async def store_data_to_ipfs(data: Dict[str, Any], metadata: Optional[Dict[str,
         }
         
         # 发送请求到Pinata
-        async with aiohttp.ClientSession() as session:
-            async with session.post(PINATA_PIN_JSON_URL, json=request_body, headers=headers) as response:
-                if response.status not in (200, 201):
-                    error_text = await response.text()
-                    logger.error(f"Pinata存储请求失败: {error_text}")
-                    raise Exception(f"Pinata存储请求失败: {response.status}")
+        async with get_http_session().post(PINATA_PIN_JSON_URL, json=request_body, headers=headers) as response:
+            if response.status not in (200, 201):
+                error_text = await response.text()
+                logger.error(f"Pinata存储请求失败: {error_text}")
+                raise Exception(f"Pinata存储请求失败: {response.status}")
                 
-                # 解析响应
-                response_data = await response.json()
-                cid = response_data.get("IpfsHash")
+            # 解析响应
+            response_data = await response.json()
+            cid = response_data.get("IpfsHash")
                 
-                if not cid:
-                    raise ValueError("从Pinata响应中未获取到CID")
+            if not cid:
+                raise ValueError("从Pinata响应中未获取到CID")
                 
-                logger.info(f"数据已成功存储到IPFS，CID: {cid}")
+            logger.info(f"数据已成功存储到IPFS，CID: {cid}")
                 
-                return cid
+            return cid
     except Exception as e:
         logger.error(f"存储数据到IPFS时出错: {str(e)}")
         raise
@@ -96,23 +173,29 @@ async def retrieve_data_from_ipfs(cid: str, is_binary: bool = False) -> Union[Di
     Returns:
         Dict或bytes: 检索到的数据，根据is_binary参数返回不同类型
     """
+    return await ipfs_flight.do(("retrieve", cid, is_binary), lambda: _retrieve_data_from_ipfs(cid, is_binary))
+
+
+async def _retrieve_data_from_ipfs(cid: str, is_binary: bool) -> Union[Dict[str, Any], bytes]:
+    """
+    从IPFS网关读取数据
+    """
     try:
         # 构建URL
         url = f"{IPFS_GATEWAY_URL}{cid}"
         
         # 发送请求
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"从IPFS检索数据失败: {error_text}")
-                    raise Exception(f"从IPFS检索数据失败: {response.status}")
+        async with get_http_session().get(url) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"从IPFS检索数据失败: {error_text}")
+                raise Exception(f"从IPFS检索数据失败: {response.status}")
                 
-                # 根据参数决定返回格式
-                if is_binary:
-                    return await response.read()
-                else:
-                    return await response.json()
+            # 根据参数决定返回格式
+            if is_binary:
+                return await response.read()
+            else:
+                return await response.json()
     except Exception as e:
         logger.error(f"从IPFS检索数据时出错: {str(e)}")
         raise
@@ -145,14 +228,20 @@ async def check_ipfs_content_availability(cid: str, timeout: int = 5) -> bool:
     Returns:
         bool: 内容是否可用
     """
+    return await ipfs_flight.do(("head", cid), lambda: _check_ipfs_content_availability(cid, timeout))
+
+
+async def _check_ipfs_content_availability(cid: str, timeout: int) -> bool:
+    """
+    向IPFS网关发送HEAD请求检查内容
+    """
     try:
         # 构建URL
         url = f"{IPFS_GATEWAY_URL}{cid}"
         
         # 发送HEAD请求检查可用性
-        async with aiohttp.ClientSession() as session:
-            async with session.head(url, timeout=timeout) as response:
-                return response.status == 200
+        async with get_http_session().head(url, timeout=timeout) as response:
+            return response.status == 200
     except asyncio.TimeoutError:
         logger.warning(f"检查CID超时: {cid}")
         return False
@@ -0,0 +1,390 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import aiohttp
+
+from ..core.config import settings
+from ..utils.tracing import record_retry
+from .http_client import get_http_session
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+_request_ids = itertools.count(1)
+
+# 错误率对评分的放大系数: 一半请求失败的节点评分约为同延迟健康节点的6倍
+FAILURE_PENALTY = 10.0
+
+Calls = Sequence[Tuple[str, list]]
+Results = List[Union[Any, "JsonRpcError"]]
+
+
+class JsonRpcError(Exception):
+    """JSON-RPC 调用返回的错误"""
+
+    def __init__(self, method: str, error: Any):
+        message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+        super().__init__(f"{method}: {message}")
+        self.method = method
+        self.error = error
+
+
+async def post_json_rpc_batch(
+    url: str,
+    calls: Calls,
+    session: Optional[aiohttp.ClientSession] = None,
+) -> Results:
+    """
+    向指定节点发送一次 JSON-RPC 批量请求
+
+    Args:
+        url: RPC地址
+        calls: (方法名, 参数) 列表
+        session: HTTP会话，默认使用共享会话
+
+    Returns:
+        List: 与 calls 顺序一致的结果；单个调用失败时对应位置为 JsonRpcError
+
+    Raises:
+        JsonRpcError: 节点对整个批量请求返回错误
+        Exception: HTTP请求失败或超时
+    """
+    if not calls:
+        return []
+    ids = [next(_request_ids) for _ in calls]
+    payload = [
+        {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        for request_id, (method, params) in zip(ids, calls)
+    ]
+    session = session or get_http_session()
+    timeout = aiohttp.ClientTimeout(total=settings.RPC_REQUEST_TIMEOUT)
+    async with session.post(url, json=payload, timeout=timeout) as response:
+        if response.status != 200:
+            error_text = await response.text()
+            raise Exception(f"JSON-RPC批量请求失败: {response.status} {error_text[:200]}")
+        body = await response.json(content_type=None)
+
+    # 单个请求出错时部分节点返回对象而不是数组
+    if isinstance(body, dict):
+        raise JsonRpcError("batch", body.get("error", body))
+
+    by_id = {item.get("id"): item for item in body}
+    results: Results = []
+    for request_id, (method, _) in zip(ids, calls):
+        item = by_id.get(request_id)
+        if item is None:
+            results.append(JsonRpcError(method, "响应中缺少该请求"))
+        elif "error" in item:
+            results.append(JsonRpcError(method, item["error"]))
+        else:
+            results.append(item.get("result"))
+    return results
+
+
+class RpcEndpoint:
+    """
+    一个RPC节点的健康状态和延迟评分
+
+    web3 的同步调用在线程池中更新同一对象，计数在锁内修改
+    """
+
+    def __init__(self, url: str, ewma_alpha: float, failure_threshold: int, cooldown: float):
+        self.url = url
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        # 响应耗时的指数加权移动平均(秒)，尚无样本时为None
+        self.latency: Optional[float] = None
+        # 请求失败率的指数加权移动平均
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.block_number: Optional[int] = None
+        self.lagging = False
+        self.down_until = 0.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return not self.lagging and time.monotonic() >= self.down_until
+
+    def score(self, prior: float) -> float:
+        """
+        越小越优先: 平均延迟按当前并发请求数和失败率放大
+
+        Args:
+            prior: 尚无延迟样本时使用的延迟(各节点的平均值)，既不优先也不排后
+        """
+        latency = self.latency if self.latency is not None else prior
+        return latency * (1 + self.in_flight) * (1 + FAILURE_PENALTY * self.error_rate + self.consecutive_failures)
+
+    def begin(self) -> float:
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+        return time.perf_counter()
+
+    def succeed(self, started: float) -> None:
+        duration = time.perf_counter() - started
+        with self._lock:
+            self.in_flight -= 1
+            self.consecutive_failures = 0
+            self.down_until = 0.0
+            self.error_rate = (1 - self.ewma_alpha) * self.error_rate
+            if self.latency is None:
+                self.latency = duration
+            else:
+                self.latency = self.ewma_alpha * duration + (1 - self.ewma_alpha) * self.latency
+
+    def fail(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.error_rate = self.ewma_alpha + (1 - self.ewma_alpha) * self.error_rate
+            # 连续失败达到阈值后暂停使用，冷却期后由健康检查或下一次请求重新试用
+            if self.consecutive_failures >= self.failure_threshold:
+                self.down_until = time.monotonic() + self.cooldown
+
+    def abandon(self) -> None:
+        """对冲请求中落后的一方被取消，不计入成功或失败"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "in_flight": self.in_flight,
+            "block_number": self.block_number,
+            "lagging": self.lagging,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class RpcProviderPool:
+    """
+    多RPC节点池
+
+    - 按延迟EWMA、并发数和失败率为节点评分，每次请求选择评分最优的健康节点
+    - 节点请求失败时依次切换到下一个节点；连续失败的节点暂停使用一段时间
+    - 只读请求可以对冲: 首选节点 hedge_delay 秒内未返回时向下一个节点并行发送，先返回者胜出
+    - 后台定期查询各节点区块高度，落后超过 max_block_lag 个区块的节点不参与选择
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        post: Callable[[str, Calls], Awaitable[Results]],
+        ewma_alpha: float,
+        hedge_delay: float,
+        failure_threshold: int,
+        cooldown: float,
+        health_interval: float,
+        max_block_lag: int,
+    ):
+        self.endpoints = [
+            RpcEndpoint(url, ewma_alpha, failure_threshold, cooldown)
+            for url in dict.fromkeys(url for url in urls if url)
+        ]
+        self._post = post
+        self.hedge_delay = hedge_delay
+        self.health_interval = health_interval
+        self.max_block_lag = max_block_lag
+        self._task: Optional[asyncio.Task] = None
+        self._failovers = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+
+    def ranked(self) -> List[RpcEndpoint]:
+        """健康节点按评分排序，不健康的节点排在最后作为兜底"""
+        samples = [e.latency for e in self.endpoints if e.latency is not None]
+        prior = sum(samples) / len(samples) if samples else 0.0
+        # 都没有延迟样本时评分均为0，再按失败情况排序
+        healthy = sorted(
+            (e for e in self.endpoints if e.healthy),
+            key=lambda e: (e.score(prior), e.error_rate, e.consecutive_failures),
+        )
+        unhealthy = sorted((e for e in self.endpoints if not e.healthy), key=lambda e: e.down_until)
+        return healthy + unhealthy
+
+    async def _attempt(self, endpoint: RpcEndpoint, calls: Calls) -> Results:
+        started = endpoint.begin()
+        try:
+            results = await self._post(endpoint.url, calls)
+        except JsonRpcError:
+            # 节点正常响应了错误，属于调用本身的问题，不切换节点
+            endpoint.succeed(started)
+            raise
+        except asyncio.CancelledError:
+            endpoint.abandon()
+            raise
+        except Exception:
+            endpoint.fail()
+            raise
+        endpoint.succeed(started)
+        return results
+
+    async def call_batch(self, calls: Calls, hedge: bool = False) -> Results:
+        """
+        发送一次批量请求
+
+        Args:
+            calls: (方法名, 参数) 列表
+            hedge: 是否对冲，只应用于只读请求
+        """
+        candidates = self.ranked()
+        if not candidates:
+            raise ValueError("未配置RPC节点")
+        if hedge and len(candidates) > 1 and candidates[1].healthy:
+            return await self._hedged(calls, candidates)
+        return await self._failover(calls, candidates)
+
+    async def _failover(self, calls: Calls, candidates: List[RpcEndpoint]) -> Results:
+        last_error: Optional[Exception] = None
+        for index, endpoint in enumerate(candidates):
+            if index > 0:
+                self._failovers += 1
+                record_retry("rpc", "failover")
+            try:
+                return await self._attempt(endpoint, calls)
+            except JsonRpcError:
+                raise
+            except Exception as e:
+                logger.warning(f"RPC节点 {endpoint.url} 请求失败: {str(e)}")
+                last_error = e
+        raise last_error
+
+    async def _hedged(self, calls: Calls, candidates: List[RpcEndpoint]) -> Results:
+        primary = asyncio.create_task(self._attempt(candidates[0], calls))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if primary in done and not isinstance(primary.exception(), Exception):
+            return primary.result()
+        if primary in done and isinstance(primary.exception(), JsonRpcError):
+            raise primary.exception()
+
+        # 首选节点较慢或已失败，向其余节点发送同一请求
+        self._hedges += 1
+        backup = asyncio.create_task(self._failover(calls, candidates[1:]))
+        pending = {backup} if primary in done else {primary, backup}
+        last_error: Optional[BaseException] = primary.exception() if primary in done else None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if task is backup:
+                            self._hedge_wins += 1
+                        return task.result()
+                    if isinstance(error, JsonRpcError):
+                        raise error
+                    last_error = error
+            raise last_error
+        finally:
+            losers = [task for task in (primary, backup) if not task.done()]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+
+    async def check_health(self) -> None:
+        """查询所有节点的区块高度，更新延迟和落后状态"""
+        async def probe(endpoint: RpcEndpoint) -> None:
+            try:
+                result = (await self._attempt(endpoint, [("eth_blockNumber", [])]))[0]
+                if not isinstance(result, JsonRpcError):
+                    endpoint.block_number = int(result, 16)
+            except Exception as e:
+                logger.warning(f"RPC节点 {endpoint.url} 健康检查失败: {str(e)}")
+
+        await asyncio.gather(*(probe(endpoint) for endpoint in self.endpoints))
+        heads = [e.block_number for e in self.endpoints if e.block_number is not None]
+        if not heads:
+            return
+        best = max(heads)
+        for endpoint in self.endpoints:
+            lagging = endpoint.block_number is not None and best - endpoint.block_number > self.max_block_lag
+            if lagging and not endpoint.lagging:
+                logger.warning(f"RPC节点 {endpoint.url} 落后 {best - endpoint.block_number} 个区块，暂停使用")
+            endpoint.lagging = lagging
+
+    async def _run(self) -> None:
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self) -> None:
+        """启动后台健康检查，只有一个节点时不需要"""
+        if self._task is None and len(self.endpoints) > 1:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "endpoints": [endpoint.stats() for endpoint in self.ranked()],
+            "failovers": self._failovers,
+            "hedges": self._hedges,
+            "hedge_wins": self._hedge_wins,
+        }
+
+
+# 全局RPC节点池，BLOCKCHAIN_RPC_URL 与 RPC_URLS 中的节点共同参与选择
+rpc_pool = RpcProviderPool(
+    urls=[settings.BLOCKCHAIN_RPC_URL, *settings.RPC_URLS],
+    post=post_json_rpc_batch,
+    ewma_alpha=settings.RPC_EWMA_ALPHA,
+    hedge_delay=settings.RPC_HEDGE_DELAY,
+    failure_threshold=settings.RPC_FAILURE_THRESHOLD,
+    cooldown=settings.RPC_COOLDOWN,
+    health_interval=settings.RPC_HEALTH_INTERVAL,
+    max_block_lag=settings.RPC_MAX_BLOCK_LAG,
+)
+
+
+async def json_rpc_batch(
+    calls: Calls,
+    url: str = "",
+    hedge: bool = False,
+) -> Results:
+    """
+    发送一次 JSON-RPC 批量请求
+
+    Args:
+        calls: (方法名, 参数) 列表
+        url: 指定RPC地址；默认由节点池选择
+        hedge: 是否对冲请求，只应用于只读请求
+
+    Returns:
+        List: 与 calls 顺序一致的结果；单个调用失败时对应位置为 JsonRpcError
+    """
+    if not calls:
+        return []
+    if url:
+        return await post_json_rpc_batch(url, calls)
+    return await rpc_pool.call_batch(calls, hedge=hedge)
+
+
+async def json_rpc(method: str, params: list, url: str = "", hedge: bool = False) -> Any:
+    """发送单个 JSON-RPC 请求"""
+    result = (await json_rpc_batch([(method, params)], url, hedge))[0]
+    if isinstance(result, JsonRpcError):
+        raise result
+    return result
@@ -0,0 +1,221 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 记录的指标，每个指标在文件中占一列 float64
+METRICS = ("fear_greed", "gas_low", "gas_average", "gas_high")
+
+# 文件头: 魔数、版本、容量、写入位置、样本数
+_HEADER = struct.Struct("<8sIIQQ")
+_MAGIC = b"MKTHIST1"
+_VERSION = 1
+
+
+class MarketHistoryStore:
+    """
+    基于内存映射文件的市场数据环形缓冲区
+
+    时间戳和每个指标各占一列连续的 float64 数组(列式存储)，直接映射到文件上，
+    进程重启后历史数据仍然保留。写满后覆盖最旧的样本。
+    """
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._timestamps: Optional[memoryview] = None
+        self._columns: Dict[str, memoryview] = {}
+        self._head = 0
+        self._count = 0
+
+    @property
+    def _file_size(self) -> int:
+        return _HEADER.size + 8 * self.capacity * (1 + len(METRICS))
+
+    def open(self) -> None:
+        """打开(或创建)历史文件并映射到内存"""
+        if self._mmap is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        exists = os.path.exists(self.path) and os.path.getsize(self.path) == self._file_size
+        self._file = open(self.path, "r+b" if exists else "w+b")
+        if not exists:
+            self._file.truncate(self._file_size)
+        self._mmap = mmap.mmap(self._file.fileno(), self._file_size)
+
+        magic, version, capacity, head, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic == _MAGIC and version == _VERSION and capacity == self.capacity:
+            self._head = head
+            self._count = count
+        else:
+            if exists:
+                logger.warning(f"市场历史文件格式不匹配，重新初始化: {self.path}")
+            self._head = 0
+            self._count = 0
+            self._write_header()
+
+        column_bytes = 8 * self.capacity
+        view = memoryview(self._mmap)
+        offset = _HEADER.size
+        self._timestamps = view[offset:offset + column_bytes].cast("d")
+        for metric in METRICS:
+            offset += column_bytes
+            self._columns[metric] = view[offset:offset + column_bytes].cast("d")
+        logger.info(f"市场历史已加载: {self._count} 条样本 ({self.path})")
+
+    def close(self) -> None:
+        """刷新到磁盘并关闭映射"""
+        if self._mmap is None:
+            return
+        with self._lock:
+            self._timestamps.release()
+            for column in self._columns.values():
+                column.release()
+            self._columns = {}
+            self._timestamps = None
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+            self._file.close()
+            self._file = None
+
+    def _write_header(self) -> None:
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, _VERSION, self.capacity, self._head, self._count)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, values: Dict[str, Optional[float]]) -> None:
+        """
+        追加一条样本，缺失的指标记为 NaN
+
+        Args:
+            timestamp: Unix时间戳(秒)
+            values: 指标名到数值的映射
+        """
+        if self._mmap is None:
+            self.open()
+        with self._lock:
+            index = self._head
+            self._timestamps[index] = float(timestamp)
+            for metric in METRICS:
+                value = values.get(metric)
+                self._columns[metric][index] = float(value) if value is not None else float("nan")
+            self._head = (index + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self._write_header()
+
+    def record_market_data(self, data: Dict[str, Any], timestamp: Optional[float] = None) -> None:
+        """从 get_all_market_data 结构中提取指标并记录"""
+        fear_greed = data.get("fear_greed_index") or {}
+        gas = data.get("eth_gas_price") or {}
+        self.append(timestamp if timestamp is not None else time.time(), {
+            "fear_greed": fear_greed.get("value"),
+            "gas_low": gas.get("low"),
+            "gas_average": gas.get("average"),
+            "gas_high": gas.get("high"),
+        })
+
+    def _physical(self, logical: int) -> int:
+        """逻辑位置(0 为最旧)到数组下标的映射"""
+        start = (self._head - self._count) % self.capacity
+        return (start + logical) % self.capacity
+
+    def _lower_bound(self, timestamp: float) -> int:
+        """第一个时间戳 >= timestamp 的逻辑位置(样本按时间单调追加)"""
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._timestamps[self._physical(mid)] < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def query(
+        self,
+        metric: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        buckets: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        查询时间范围内的样本，可按时间分桶降采样
+
+        Args:
+            metric: 指标名，见 METRICS
+            start: 起始时间戳(含)，默认最早
+            end: 结束时间戳(含)，默认最新
+            buckets: 分桶数量；为空时返回原始样本
+
+        Returns:
+            原始样本 [{"t", "value"}] 或分桶结果 [{"t", "min", "max", "avg", "count"}]
+        """
+        if metric not in METRICS:
+            raise ValueError(f"未知的指标: {metric}")
+        if self._mmap is None:
+            self.open()
+
+        with self._lock:
+            if self._count == 0:
+                return []
+            first = self._lower_bound(start) if start is not None else 0
+            last = self._lower_bound(end + 1e-9) if end is not None else self._count
+            column = self._columns[metric]
+            samples = []
+            for logical in range(first, last):
+                index = self._physical(logical)
+                value = column[index]
+                if value == value:  # 跳过 NaN
+                    samples.append((self._timestamps[index], value))
+
+        if not buckets:
+            return [{"t": t, "value": v} for t, v in samples]
+        if not samples:
+            return []
+
+        range_start = start if start is not None else samples[0][0]
+        range_end = end if end is not None else samples[-1][0]
+        width = max((range_end - range_start) / buckets, 1e-9)
+
+        result: List[Optional[Dict[str, Any]]] = [None] * buckets
+        for t, v in samples:
+            slot = min(int((t - range_start) / width), buckets - 1)
+            bucket = result[slot]
+            if bucket is None:
+                result[slot] = {"t": range_start + slot * width, "min": v, "max": v, "sum": v, "count": 1}
+            else:
+                bucket["min"] = min(bucket["min"], v)
+                bucket["max"] = max(bucket["max"], v)
+                bucket["sum"] += v
+                bucket["count"] += 1
+
+        return [
+            {
+                "t": bucket["t"],
+                "min": bucket["min"],
+                "max": bucket["max"],
+                "avg": bucket["sum"] / bucket["count"],
+                "count": bucket["count"],
+            }
+            for bucket in result
+            if bucket is not None
+        ]
+
+
+# 全局历史存储，由 main.py 的 lifespan 打开和关闭
+market_history = MarketHistoryStore(settings.MARKET_HISTORY_PATH, settings.MARKET_HISTORY_CAPACITY)
@@ -0,0 +1,145 @@
+import asyncio
+import copy
+import logging
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from ..core.config import settings
+from .market_data import get_all_market_data
+from .market_history import market_history
+from .market_stream import market_broadcaster
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """
+    某一时刻的市场数据快照，发布后不可修改，可被任意多个请求并发读取
+    """
+    fear_greed_index: Mapping[str, Any]
+    market_trend: Mapping[str, Any]
+    eth_gas_price: Mapping[str, Any]
+    timestamp: str
+    version: int
+    updated_at: float
+
+    @classmethod
+    def from_market_data(cls, data: Dict[str, Any], version: int) -> "MarketSnapshot":
+        """由 get_all_market_data 的结果构建快照"""
+        return cls(
+            fear_greed_index=MappingProxyType(dict(data.get("fear_greed_index") or {})),
+            market_trend=MappingProxyType(dict(data.get("market_trend") or {})),
+            eth_gas_price=MappingProxyType(dict(data.get("eth_gas_price") or {})),
+            timestamp=data.get("timestamp", ""),
+            version=version,
+            updated_at=time.time(),
+        )
+
+    def fingerprint(self) -> Tuple:
+        """提取快照中的数值部分，忽略时间戳，用于判断数据是否有变化"""
+        return (
+            self.fear_greed_index.get("value"),
+            self.fear_greed_index.get("value_classification"),
+            self.market_trend.get("trend"),
+            self.eth_gas_price.get("low"),
+            self.eth_gas_price.get("average"),
+            self.eth_gas_price.get("high"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为与 get_all_market_data 相同结构的普通字典(副本)"""
+        return {
+            "fear_greed_index": copy.deepcopy(dict(self.fear_greed_index)),
+            "market_trend": copy.deepcopy(dict(self.market_trend)),
+            "eth_gas_price": copy.deepcopy(dict(self.eth_gas_price)),
+            "timestamp": self.timestamp,
+        }
+
+
+class MarketDataPoller:
+    """
+    后台定时刷新市场数据并发布快照
+
+    请求路径只读取当前快照，不再直接访问外部API。刷新时跳过数据源缓存直接请求上游，
+    数值没有变化时保留当前快照，version 和 updated_at 不变，ETag 保持稳定
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._snapshot: Optional[MarketSnapshot] = None
+        self._version = 0
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def snapshot(self) -> Optional[MarketSnapshot]:
+        """当前快照，尚未刷新过时为None"""
+        return self._snapshot
+
+    async def refresh(self) -> MarketSnapshot:
+        """立即刷新一次市场数据，数值有变化时发布新快照"""
+        async with self._refresh_lock:
+            data = await get_all_market_data(force=True)
+            snapshot = MarketSnapshot.from_market_data(data, self._version + 1)
+            try:
+                market_history.record_market_data(data, snapshot.updated_at)
+            except Exception as e:
+                logger.warning(f"记录市场历史失败: {str(e)}")
+            if self._snapshot is not None and snapshot.fingerprint() == self._snapshot.fingerprint():
+                return self._snapshot
+            self._version = snapshot.version
+            self._snapshot = snapshot
+            market_broadcaster.publish(self._snapshot)
+            return self._snapshot
+
+    async def start(self) -> None:
+        """启动后台刷新任务，首次刷新完成后返回"""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"首次刷新市场数据失败: {str(e)}")
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"市场数据轮询已启动，刷新间隔: {self.interval}秒")
+
+    async def stop(self) -> None:
+        """停止后台刷新任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("市场数据轮询已停止")
+
+    async def _run(self) -> None:
+        """按固定间隔刷新，单次失败不影响后续刷新"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"刷新市场数据失败，继续使用旧快照: {str(e)}")
+
+
+# 全局轮询器实例，由 main.py 的 lifespan 启动和停止
+market_poller = MarketDataPoller(settings.MARKET_POLL_INTERVAL)
+
+
+async def get_market_snapshot() -> MarketSnapshot:
+    """
+    获取当前市场快照
+
+    轮询器未启动(例如脚本中直接调用)时同步刷新一次作为兜底
+    """
+    snapshot = market_poller.snapshot
+    if snapshot is None:
+        snapshot = await market_poller.refresh()
+    return snapshot
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set, Tuple
+
+from ..core.config import settings
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class MarketSubscriber:
+    """单个推送订阅者，持有有界队列"""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class MarketBroadcaster:
+    """
+    市场快照的扇出推送
+
+    轮询器每次刷新后调用 publish，只有数值发生变化时才推送给所有订阅者。
+    每个订阅者有独立的有界队列，队列写满(消费过慢)的订阅者会被断开，不会拖慢其他订阅者。
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Set[MarketSubscriber] = set()
+        self._last_fingerprint: Optional[Tuple] = None
+        self._published = 0
+        self._dropped = 0
+
+    @staticmethod
+    def _fingerprint(snapshot) -> Tuple:
+        """提取快照中的数值部分，忽略时间戳，用于判断是否有变化"""
+        return snapshot.fingerprint()
+
+    def subscribe(self) -> MarketSubscriber:
+        """注册新的订阅者"""
+        subscriber = MarketSubscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: MarketSubscriber) -> None:
+        """移除订阅者"""
+        self._subscribers.discard(subscriber)
+
+    def publish(self, snapshot) -> bool:
+        """
+        向所有订阅者推送快照
+
+        Returns:
+            bool: 数值有变化并已推送时为True
+        """
+        fingerprint = self._fingerprint(snapshot)
+        if fingerprint == self._last_fingerprint:
+            return False
+        self._last_fingerprint = fingerprint
+        self._published += 1
+
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(snapshot)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+        return True
+
+    def _drop(self, subscriber: MarketSubscriber) -> None:
+        """断开消费过慢的订阅者：清空其队列并放入结束标记"""
+        self._subscribers.discard(subscriber)
+        subscriber.dropped = True
+        self._dropped += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+        logger.warning("市场推送订阅者消费过慢，已断开")
+
+    def stats(self) -> Dict[str, Any]:
+        """返回订阅者数量和推送统计"""
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self._published,
+            "dropped": self._dropped,
+        }
+
+
+# 全局推送器，由市场轮询器在每次刷新后调用
+market_broadcaster = MarketBroadcaster(settings.MARKET_STREAM_QUEUE_SIZE)
@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 节点返回这些错误时说明本地nonce落后于链上，需要重新同步
+NONCE_TOO_LOW_MARKERS = (
+    "nonce too low",
+    "nonce has already been used",
+)
+
+# 同一nonce上已有我们自己的待打包交易，新交易费用不足以替换它；nonce仍被占用，不是过低
+UNDERPRICED_MARKERS = (
+    "replacement transaction underpriced",
+    "replacement fee too low",
+)
+
+# 节点已收到过这笔交易(例如超时后重发)
+ALREADY_KNOWN_MARKERS = (
+    "already known",
+    "known transaction",
+)
+
+# handle_send_error 的处理结果
+SEND_RETRY = "retry"
+SEND_REJECTED = "rejected"
+SEND_UNKNOWN = "unknown"
+
+
+def _matches(error: Exception, markers: Tuple[str, ...]) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in markers)
+
+
+def is_nonce_too_low_error(error: Exception) -> bool:
+    """判断发送交易的错误是否由nonce过低引起"""
+    return _matches(error, NONCE_TOO_LOW_MARKERS)
+
+
+def is_underpriced_replacement_error(error: Exception) -> bool:
+    """判断发送交易的错误是否为替换交易费用不足"""
+    return _matches(error, UNDERPRICED_MARKERS)
+
+
+def is_rejected_error(error: Exception) -> bool:
+    """
+    判断节点是否明确拒绝了交易
+
+    节点返回JSON-RPC错误响应时交易没有进入交易池(web3 以错误对象作为 ValueError 的参数抛出)；
+    超时、连接中断等错误无法确定节点是否已收到交易
+    """
+    if _matches(error, ALREADY_KNOWN_MARKERS):
+        return False
+    if getattr(error, "rpc_response", None) is not None:
+        return True
+    details = getattr(error, "error", None)
+    if details is None and error.args:
+        details = error.args[0]
+    return isinstance(details, dict) and "message" in details
+
+
+class NonceManager:
+    """
+    进程内的交易nonce分配器
+
+    - 启动时从链上 pending 交易数同步起始nonce
+    - 在锁内分配nonce，并发提交的交易不会拿到相同的nonce
+    - 节点明确拒绝的交易归还nonce，下一笔交易优先复用，避免出现空洞
+    - 广播结果不明(超时、连接中断)的交易保留nonce，由 recover_gaps 按交易哈希判断是否被丢弃
+    - 已广播但被节点丢弃的交易由 recover_gaps 检测，立即在该nonce上发送填补交易，
+      不让后续nonce的交易一直等待
+    - 节点返回 nonce too low 时重新同步
+
+    Args:
+        address: 发送交易的账户地址
+        fetch_pending_count: 返回该账户 pending 交易数的异步函数
+        transaction_exists: 判断交易是否仍在节点中(已打包或在交易池中)的异步函数
+        fill_gap: 在指定nonce上发送填补交易(如0值转给自己)并返回交易哈希的异步函数
+    """
+
+    def __init__(
+        self,
+        address: str,
+        fetch_pending_count: Callable[[], Awaitable[int]],
+        transaction_exists: Callable[[str], Awaitable[bool]],
+        fill_gap: Callable[[int], Awaitable[str]],
+    ):
+        self.address = address
+        self._fetch_pending_count = fetch_pending_count
+        self._transaction_exists = transaction_exists
+        self._fill_gap = fill_gap
+        self._lock = asyncio.Lock()
+        self._next: Optional[int] = None
+        # 已分配且尚未确认的nonce -> 交易哈希(尚未广播时为None)
+        self._in_flight: Dict[int, Optional[str]] = {}
+        # 归还待复用的nonce(最小堆)
+        self._released: List[int] = []
+        self._resyncs = 0
+        self._gaps_recovered = 0
+        self._gaps_filled = 0
+
+    async def sync(self) -> int:
+        """从链上同步下一个可用nonce"""
+        async with self._lock:
+            return await self._sync_locked()
+
+    async def _sync_locked(self) -> int:
+        pending = await self._fetch_pending_count()
+        # 链上已使用的nonce不再复用，也不再跟踪
+        self._released = [nonce for nonce in self._released if nonce >= pending]
+        heapq.heapify(self._released)
+        self._in_flight = {nonce: tx_hash for nonce, tx_hash in self._in_flight.items() if nonce >= pending}
+        if self._next is None or pending > self._next:
+            self._next = pending
+        self._resyncs += 1
+        logger.info(f"nonce已同步: {self.address} 下一个nonce {self._next}")
+        return self._next
+
+    async def allocate(self) -> int:
+        """分配一个nonce，优先复用归还的nonce"""
+        async with self._lock:
+            if self._next is None:
+                await self._sync_locked()
+            if self._released:
+                nonce = heapq.heappop(self._released)
+            else:
+                nonce = self._next
+                self._next += 1
+            self._in_flight[nonce] = None
+            return nonce
+
+    def mark_sent(self, nonce: int, tx_hash: str) -> None:
+        """记录nonce对应的已广播交易"""
+        if nonce in self._in_flight:
+            self._in_flight[nonce] = tx_hash
+
+    def mark_mined(self, nonce: int) -> None:
+        """交易已打包，nonce不再需要跟踪"""
+        self._in_flight.pop(nonce, None)
+
+    def release(self, nonce: int) -> None:
+        """交易确定未被节点接收，归还nonce供下一笔交易复用"""
+        self._in_flight.pop(nonce, None)
+        if nonce not in self._released:
+            heapq.heappush(self._released, nonce)
+
+    async def handle_send_error(self, nonce: int, error: Exception) -> str:
+        """
+        处理广播交易失败
+
+        Returns:
+            str: SEND_RETRY 表示nonce过低，已重新同步，调用方可以用新nonce重试；
+                SEND_REJECTED 表示节点明确拒绝，nonce已归还；
+                SEND_UNKNOWN 表示交易可能已到达节点，nonce保留，调用方应按交易哈希继续等待确认
+        """
+        if is_nonce_too_low_error(error):
+            self._in_flight.pop(nonce, None)
+            logger.warning(f"nonce {nonce} 过低，重新同步: {str(error)}")
+            await self.sync()
+            return SEND_RETRY
+        if is_underpriced_replacement_error(error):
+            # 该nonce已被本账户另一笔待打包交易占用，不归还复用；替换交易的费用上调由看门狗处理
+            self._in_flight.pop(nonce, None)
+            logger.warning(f"nonce {nonce} 已被待打包交易占用: {str(error)}")
+            return SEND_REJECTED
+        if is_rejected_error(error):
+            self.release(nonce)
+            return SEND_REJECTED
+        logger.warning(f"nonce {nonce} 的交易广播结果不明，保留nonce: {str(error)}")
+        return SEND_UNKNOWN
+
+    async def recover_gaps(self) -> List[int]:
+        """
+        检测并填补被节点丢弃的交易造成的nonce空洞
+
+        链上 pending 交易数之后、本地已分配的nonce中，已广播但节点查不到的交易视为已丢弃。
+        空洞之后已广播的交易在空洞被填补前无法打包，因此立即在该nonce上发送填补交易；
+        填补交易发送失败时才把nonce归还给下一笔交易复用
+
+        Returns:
+            List[int]: 检测到的空洞nonce
+        """
+        async with self._lock:
+            pending = await self._fetch_pending_count()
+            recovered = []
+            for nonce, tx_hash in sorted(self._in_flight.items()):
+                # 已打包的nonce和仍在签名中的交易不算空洞
+                if nonce < pending or tx_hash is None:
+                    continue
+                if await self._transaction_exists(tx_hash):
+                    continue
+                recovered.append(nonce)
+                try:
+                    self._in_flight[nonce] = await self._fill_gap(nonce)
+                    self._gaps_filled += 1
+                except Exception as e:
+                    logger.error(f"填补nonce {nonce} 失败，归还复用: {str(e)}")
+                    del self._in_flight[nonce]
+                    heapq.heappush(self._released, nonce)
+            if recovered:
+                self._gaps_recovered += len(recovered)
+                logger.warning(f"检测到被丢弃交易造成的nonce空洞: {recovered}")
+            return recovered
+
+    def stats(self) -> Dict[str, Any]:
+        """返回nonce分配状态"""
+        return {
+            "address": self.address,
+            "next_nonce": self._next,
+            "in_flight": {str(nonce): tx_hash for nonce, tx_hash in sorted(self._in_flight.items())},
+            "released": sorted(self._released),
+            "resyncs": self._resyncs,
+            "gaps_recovered": self._gaps_recovered,
+            "gaps_filled": self._gaps_filled,
+        }
@@ -0,0 +1,66 @@
+import logging
+from typing import Any, Dict
+
+import requests
+from web3 import Web3
+from web3.providers.base import BaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from ..utils.tracing import record_retry
+from .json_rpc import RpcProviderPool
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class PooledHTTPProvider(BaseProvider):
+    """
+    按RPC节点池评分选择节点的 web3 同步 provider
+
+    与异步的 json_rpc_batch 共用同一组节点的延迟和健康状态。连接失败或超时时切换到下一个节点；
+    广播交易只在连接未建立时切换，已发出的请求超时后无法确定节点是否收到，重发交给nonce管理处理。
+    """
+
+    def __init__(self, pool: RpcProviderPool, request_timeout: float):
+        super().__init__()
+        self.pool = pool
+        self.request_timeout = request_timeout
+        self._providers: Dict[str, Web3.HTTPProvider] = {}
+
+    def _provider(self, url: str) -> Web3.HTTPProvider:
+        provider = self._providers.get(url)
+        if provider is None:
+            provider = Web3.HTTPProvider(url, request_kwargs={"timeout": self.request_timeout})
+            self._providers[url] = provider
+        return provider
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        last_error: Exception = ValueError("未配置RPC节点")
+        for index, endpoint in enumerate(self.pool.ranked()):
+            if index > 0:
+                record_retry("rpc", "failover")
+            started = endpoint.begin()
+            try:
+                response = self._provider(endpoint.url).make_request(method, params)
+            except requests.exceptions.RequestException as e:
+                endpoint.fail()
+                if method == "eth_sendRawTransaction" and not isinstance(e, requests.exceptions.ConnectionError):
+                    raise
+                logger.warning(f"RPC节点 {endpoint.url} 请求 {method} 失败: {str(e)}")
+                last_error = e
+                continue
+            except Exception:
+                endpoint.abandon()
+                raise
+            endpoint.succeed(started)
+            return response
+        raise last_error
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        try:
+            response = self.make_request(RPCEndpoint("web3_clientVersion"), [])
+        except Exception:
+            if show_traceback:
+                raise
+            return False
+        return "error" not in response
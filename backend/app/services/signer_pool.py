@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+from eth_account.signers.local import LocalAccount
+
+from .nonce_manager import NonceManager
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class Signer:
+    """一个热钱包签名账户及其独立的nonce序列"""
+
+    __slots__ = ("account", "address", "nonces", "pending", "sent")
+
+    def __init__(self, account: LocalAccount, nonces: NonceManager):
+        self.account = account
+        self.address = account.address
+        self.nonces = nonces
+        # 正在使用该账户发送或等待确认的交易数
+        self.pending = 0
+        self.sent = 0
+
+
+class SignerPool:
+    """
+    签名账户池
+
+    合约授权多个advisor地址，每个账户各有一条nonce序列。提交交易时选择待确认交易最少的账户，
+    负载相同时选择累计发送最少的账户，使各账户的nonce序列并行推进，
+    一个账户上的慢交易不会阻塞其他账户。
+    """
+
+    def __init__(self, accounts: List[LocalAccount], nonce_manager_factory: Callable[[LocalAccount], NonceManager]):
+        self.signers = [Signer(account, nonce_manager_factory(account)) for account in accounts]
+
+    def __len__(self) -> int:
+        return len(self.signers)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[Signer]:
+        """
+        选择负载最低的账户，在上下文结束前计入该账户的待确认交易数
+
+        Raises:
+            ValueError: 没有配置签名账户
+        """
+        if not self.signers:
+            raise ValueError("私钥未配置")
+        signer = min(self.signers, key=lambda item: (item.pending, item.sent))
+        signer.pending += 1
+        signer.sent += 1
+        try:
+            yield signer
+        finally:
+            signer.pending -= 1
+
+    async def sync(self) -> None:
+        """从链上同步所有账户的nonce，单个账户失败时在其首次分配nonce时重试"""
+        results = await asyncio.gather(
+            *(signer.nonces.sync() for signer in self.signers), return_exceptions=True
+        )
+        for signer, result in zip(self.signers, results):
+            if isinstance(result, Exception):
+                logger.warning(f"同步 {signer.address} 的nonce失败: {str(result)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "signers": [
+                {**signer.nonces.stats(), "pending": signer.pending, "sent": signer.sent}
+                for signer in self.signers
+            ],
+        }
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..utils.metrics import registry
+from .confirmation_tracker import ConfirmationTracker, confirmation_tracker
+from .fee_engine import fee_engine
+from .nonce_manager import is_underpriced_replacement_error
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 同一nonce的替换交易次数
+TX_REPLACEMENTS = registry.counter(
+    "chain_tx_replacements_total",
+    "因长时间未打包而提高费用重新发送的交易数",
+    ("result",),
+)
+
+Resend = Callable[[Dict[str, int]], Awaitable[bytes]]
+
+
+def bump_fees(fees: Dict[str, int], current: Dict[str, int], percent: float) -> Dict[str, int]:
+    """
+    计算替换交易的费用
+
+    节点要求替换交易的每个费用字段都比原交易至少高10%，取按比例上调和当前报价中较高者
+    """
+    factor = 1 + percent / 100
+    bumped = {field: max(math.ceil(value * factor), current.get(field, 0)) for field, value in fees.items()}
+    if "maxFeePerGas" in bumped:
+        bumped["maxFeePerGas"] = max(bumped["maxFeePerGas"], bumped["maxPriorityFeePerGas"])
+    return bumped
+
+
+def _hex(tx_hash: Any) -> str:
+    tx_hash = tx_hash.hex() if isinstance(tx_hash, (bytes, bytearray)) else tx_hash
+    return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+
+
+class TrackedTransaction:
+    """一个账户的一个nonce上先后发送的所有交易"""
+
+    __slots__ = ("sender", "nonce", "hashes", "fees", "sent_block", "sent_at", "mined_hash", "status")
+
+    def __init__(self, sender: str, nonce: int, tx_hash: str, fees: Dict[str, int], sent_block: Optional[int]):
+        self.sender = sender
+        self.nonce = nonce
+        self.hashes: List[str] = [tx_hash]
+        self.fees = fees
+        self.sent_block = sent_block
+        self.sent_at = time.time()
+        self.mined_hash: Optional[str] = None
+        self.status = "pending"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sender": self.sender,
+            "nonce": self.nonce,
+            "status": self.status,
+            "txHash": self.mined_hash or self.hashes[-1],
+            "replacedTxHashes": [tx_hash for tx_hash in self.hashes if tx_hash != self.mined_hash],
+            "fees": self.fees,
+            "sentAt": self.sent_at,
+        }
+
+
+class TransactionWatchdog:
+    """
+    卡住交易的检测和替换
+
+    跟踪每笔已广播的交易，超过 stuck_blocks 个区块仍未打包时，用相同nonce和提高后的费用
+    重新签名发送，避免一笔低价交易阻塞其后所有nonce。同一nonce的所有交易都交给确认跟踪器，
+    任意一笔被打包即完成，并记录被替换的交易哈希，可由任一哈希查到最终打包的交易。
+    """
+
+    def __init__(
+        self,
+        tracker: ConfirmationTracker,
+        stuck_blocks: int,
+        max_replacements: int,
+        bump_percent: float,
+        check_interval: float,
+        history_size: int,
+    ):
+        self.tracker = tracker
+        self.stuck_blocks = stuck_blocks
+        self.max_replacements = max_replacements
+        self.bump_percent = bump_percent
+        self.check_interval = check_interval
+        self.history_size = history_size
+        self._pending: Dict[Tuple[str, int], TrackedTransaction] = {}
+        # 交易哈希 -> 记录，包括被替换的哈希
+        self._by_hash: "OrderedDict[str, TrackedTransaction]" = OrderedDict()
+
+    async def watch(
+        self,
+        sender: str,
+        nonce: int,
+        tx_hash: bytes,
+        fees: Dict[str, int],
+        resend: Resend,
+        timeout: float,
+        on_replaced: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[bytes, Any]:
+        """
+        等待交易或其替换交易被打包
+
+        Args:
+            sender: 发送账户地址
+            nonce: 交易nonce
+            tx_hash: 首笔交易哈希
+            fees: 首笔交易的费用字段
+            resend: 以新费用重新签名并广播同一笔交易，返回新哈希
+            timeout: 总超时时间(秒)
+            on_replaced: 发送替换交易后以新哈希调用
+
+        Returns:
+            Tuple[bytes, Any]: (实际被打包的交易哈希, 交易回执)
+
+        Raises:
+            TimeoutError: 超时仍未打包
+        """
+        record = TrackedTransaction(sender, nonce, _hex(tx_hash), fees, self.tracker.head)
+        self._pending[(sender, nonce)] = record
+        self._remember(record.hashes[0], record)
+
+        future = self.tracker.watch(record.hashes[0])
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    record.status = "timeout"
+                    raise TimeoutError(f"等待交易确认超时: nonce {nonce}, 交易 {', '.join(record.hashes)}")
+                try:
+                    receipt = await asyncio.wait_for(asyncio.shield(future), min(remaining, self.check_interval))
+                except asyncio.TimeoutError:
+                    await self._check_stuck(record, future, resend, on_replaced)
+                    continue
+
+                record.mined_hash = _hex(receipt.transactionHash)
+                record.status = "mined"
+                if len(record.hashes) > 1:
+                    logger.info(f"nonce {nonce} 的交易已打包: {record.mined_hash}，先后发送 {len(record.hashes)} 笔")
+                return receipt.transactionHash, receipt
+        finally:
+            for hash_hex in record.hashes:
+                self.tracker.unwatch(hash_hex, future)
+            if not future.done():
+                future.cancel()
+            self._pending.pop((sender, nonce), None)
+
+    async def _check_stuck(
+        self,
+        record: TrackedTransaction,
+        future: asyncio.Future,
+        resend: Resend,
+        on_replaced: Optional[Callable[[str], None]],
+    ) -> None:
+        head = self.tracker.head
+        if head is None:
+            return
+        if record.sent_block is None:
+            record.sent_block = head
+            return
+        replacements = len(record.hashes) - 1
+        if head - record.sent_block < self.stuck_blocks or replacements >= self.max_replacements:
+            return
+
+        fees = bump_fees(record.fees, (await fee_engine.quote()).fields, self.bump_percent)
+        if fee_engine.max_fee_cap and fees.get("maxFeePerGas", 0) > fee_engine.max_fee_cap:
+            logger.warning(f"nonce {record.nonce} 的交易已卡住，但提高后的费用超过上限，不再替换")
+            record.sent_block = head
+            return
+        try:
+            new_hash = _hex(await resend(fees))
+        except Exception as e:
+            if is_underpriced_replacement_error(e):
+                # 节点要求的涨幅高于本次上调(部分节点要求超过10%)，以本次费用为基准在下次检查时继续上调，
+                # nonce仍被原交易占用，不重新同步也不改用其他nonce
+                logger.warning(f"替换 nonce {record.nonce} 的交易费用不足，下次检查时继续提高: {str(e)}")
+                TX_REPLACEMENTS.inc(result="underpriced")
+                record.fees = fees
+                return
+            # 原交易可能恰好已打包(nonce过低)，下次检查时再处理
+            logger.warning(f"替换 nonce {record.nonce} 的交易失败: {str(e)}")
+            TX_REPLACEMENTS.inc(result="error")
+            record.sent_block = head
+            return
+
+        logger.warning(
+            f"nonce {record.nonce} 的交易 {self.stuck_blocks} 个区块内未打包，"
+            f"已提高费用替换: {record.hashes[-1]} -> {new_hash}"
+        )
+        TX_REPLACEMENTS.inc(result="sent")
+        record.hashes.append(new_hash)
+        record.fees = fees
+        record.sent_block = head
+        self._remember(new_hash, record)
+        self.tracker.watch(new_hash, future)
+        if on_replaced is not None:
+            on_replaced(new_hash)
+
+    def _remember(self, tx_hash: str, record: TrackedTransaction) -> None:
+        self._by_hash[tx_hash.lower()] = record
+        while len(self._by_hash) > self.history_size:
+            self._by_hash.popitem(last=False)
+
+    def lineage(self, tx_hash: Any) -> Optional[Dict[str, Any]]:
+        """按任一交易哈希(包括被替换的)查询该nonce上的交易记录"""
+        record = self._by_hash.get(_hex(tx_hash).lower())
+        return record.to_dict() if record is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "stuck_blocks": self.stuck_blocks,
+            "max_replacements": self.max_replacements,
+            "pending": [record.to_dict() for record in self._pending.values()],
+            "tracked_hashes": len(self._by_hash),
+        }
+
+
+# 全局交易看门狗
+tx_watchdog = TransactionWatchdog(
+    tracker=confirmation_tracker,
+    stuck_blocks=settings.TX_STUCK_BLOCKS,
+    max_replacements=settings.TX_MAX_REPLACEMENTS,
+    bump_percent=settings.TX_FEE_BUMP_PERCENT,
+    check_interval=settings.RECEIPT_POLL_INTERVAL,
+    history_size=settings.TX_HISTORY_SIZE,
+)
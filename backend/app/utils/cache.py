@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    """缓存条目"""
+
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value: Any, fetched_at: float):
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+class TTLCache:
+    """
+    带过期时间(TTL)和过期后后台刷新(stale-while-revalidate)的异步缓存
+
+    - 条目在 ttl 秒内视为新鲜，直接返回
+    - 过期后 stale_ttl 秒内仍直接返回旧值，同时只启动一个后台刷新任务
+    - 超出 stale_ttl 的条目视为未命中，调用方等待重新获取
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[Hashable, _CacheEntry] = {}
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._refresh_errors = 0
+
+    async def get_or_fetch(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]], force: bool = False) -> Any:
+        """
+        获取缓存值，必要时调用 fetcher 获取并写入缓存
+
+        Args:
+            key: 缓存键
+            fetcher: 无参数的异步函数，返回最新值；获取失败时应抛出异常
+            force: 为True时跳过缓存直接获取；获取失败时仍返回 stale 窗口内的旧值
+
+        Returns:
+            Any: 缓存值或新获取的值
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+
+        if force:
+            self._refreshes += 1
+            try:
+                value = await fetcher()
+            except Exception:
+                self._refresh_errors += 1
+                if entry is not None and now - entry.fetched_at < self.ttl + self.stale_ttl:
+                    return entry.value
+                raise
+            self.set(key, value)
+            return value
+
+        if entry is not None:
+            age = now - entry.fetched_at
+            if age < self.ttl:
+                self._hits += 1
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self._stale_hits += 1
+                self._schedule_refresh(key, fetcher)
+                return entry.value
+
+        self._misses += 1
+        value = await fetcher()
+        self.set(key, value)
+        return value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """返回新鲜的缓存值，不存在或已过期时返回None，不触发获取"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.fetched_at >= self.ttl:
+            return None
+        return entry.value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """写入缓存值"""
+        self._entries[key] = _CacheEntry(value, time.monotonic())
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """使指定键或全部缓存失效"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def _schedule_refresh(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]]) -> None:
+        """为过期条目启动后台刷新，同一个键同时只有一个刷新任务"""
+        task = self._refreshing.get(key)
+        if task is not None and not task.done():
+            return
+        self._refreshing[key] = asyncio.create_task(self._refresh(key, fetcher))
+
+    async def _refresh(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]]) -> None:
+        """后台刷新，失败时保留旧值"""
+        try:
+            self._refreshes += 1
+            value = await fetcher()
+            self.set(key, value)
+        except Exception as e:
+            self._refresh_errors += 1
+            logger.warning(f"缓存 {self.name} 后台刷新失败 ({key}): {str(e)}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率、条目年龄等统计信息"""
+        now = time.monotonic()
+        lookups = self._hits + self._stale_hits + self._misses
+        return {
+            "name": self.name,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "hits": self._hits,
+            "stale_hits": self._stale_hits,
+            "misses": self._misses,
+            "hit_rate": round((self._hits + self._stale_hits) / lookups, 4) if lookups else 0.0,
+            "refreshes": self._refreshes,
+            "refresh_errors": self._refresh_errors,
+            "entries": {
+                str(key): {"age": round(now - entry.fetched_at, 3)}
+                for key, entry in self._entries.items()
+            },
+        }
+
+
+class LRUCache:
+    """
+    容量有限、带过期时间的LRU缓存
+
+    超出容量时淘汰最久未使用的条目，过期条目在读取时移除
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取缓存值，不存在或已过期时返回None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        if time.monotonic() - entry.fetched_at >= self.ttl:
+            del self._entries[key]
+            self._expirations += 1
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry.value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """写入缓存值，必要时淘汰最久未使用的条目"""
+        self._entries[key] = _CacheEntry(value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """使指定键或全部缓存失效"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率和淘汰统计"""
+        lookups = self._hits + self._misses
+        return {
+            "name": self.name,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "size": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+        }
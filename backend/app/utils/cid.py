@@ -0,0 +1,104 @@
+import hashlib
+import json
+from typing import Any, List, Tuple
+
+# 与 go-ipfs/kubo 及 Pinata 默认导入参数一致: 256KiB 定长分块、平衡树、每个节点最多174个子链接
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+
+# UnixFS Data.Type 中的 File 类型
+_UNIXFS_FILE = 2
+
+_BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def encode_json_content(data: Any) -> bytes:
+    """
+    将数据序列化为上传到IPFS的字节
+
+    CID由这些字节计算，上传时必须使用完全相同的字节
+    """
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field_bytes(field: int, payload: bytes) -> bytes:
+    """protobuf 长度前缀字段(wire type 2)"""
+    return _varint(field << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _field_varint(field: int, value: int) -> bytes:
+    """protobuf 整数字段(wire type 0)"""
+    return _varint(field << 3) + _varint(value)
+
+
+def _unixfs_file(data: bytes, filesize: int, blocksizes: List[int]) -> bytes:
+    """UnixFS Data 消息"""
+    out = _field_varint(1, _UNIXFS_FILE)
+    if data:
+        out += _field_bytes(2, data)
+    out += _field_varint(3, filesize)
+    for size in blocksizes:
+        out += _field_varint(4, size)
+    return out
+
+
+def _dag_pb_node(unixfs_data: bytes, links: List[Tuple[bytes, int]]) -> bytes:
+    """dag-pb PBNode，规范编码中 Links 在 Data 之前"""
+    out = b""
+    for multihash, tsize in links:
+        out += _field_bytes(2, _field_bytes(1, multihash) + _field_bytes(2, b"") + _field_varint(3, tsize))
+    return out + _field_bytes(1, unixfs_data)
+
+
+def _sha256_multihash(block: bytes) -> bytes:
+    return b"\x12\x20" + hashlib.sha256(block).digest()
+
+
+def _base58btc(data: bytes) -> str:
+    number = int.from_bytes(data, "big")
+    encoded = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = _BASE58_ALPHABET[remainder] + encoded
+    leading_zeros = len(data) - len(data.lstrip(b"\x00"))
+    return "1" * leading_zeros + encoded
+
+
+def compute_cid_v0(content: bytes) -> str:
+    """
+    计算文件内容的 CIDv0 (dag-pb + UnixFS, sha2-256, base58btc)
+
+    与 `ipfs add --cid-version=0` 以及 Pinata 以 cidVersion=0 上传单个文件的结果一致
+    """
+    # 叶子节点: (multihash, 节点块大小, 文件数据大小)
+    level: List[Tuple[bytes, int, int]] = []
+    chunks = [content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE)] or [b""]
+    for chunk in chunks:
+        block = _dag_pb_node(_unixfs_file(chunk, len(chunk), []), [])
+        level.append((_sha256_multihash(block), len(block), len(chunk)))
+
+    # 自底向上按 MAX_LINKS 分组，直到只剩一个根节点
+    while len(level) > 1:
+        parents: List[Tuple[bytes, int, int]] = []
+        for i in range(0, len(level), MAX_LINKS):
+            group = level[i:i + MAX_LINKS]
+            filesize = sum(child[2] for child in group)
+            unixfs_data = _unixfs_file(b"", filesize, [child[2] for child in group])
+            block = _dag_pb_node(unixfs_data, [(child[0], child[1]) for child in group])
+            tree_size = len(block) + sum(child[1] for child in group)
+            parents.append((_sha256_multihash(block), tree_size, filesize))
+        level = parents
+
+    return _base58btc(level[0][0])
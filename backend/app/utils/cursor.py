@@ -0,0 +1,36 @@
+import base64
+from typing import Tuple
+
+# 游标来源: 本地事件索引 / 合约分页查询
+INDEX_CURSOR = "idx"
+CHAIN_CURSOR = "chain"
+
+
+def encode_cursor(kind: str, *keys: int) -> str:
+    """
+    生成不透明的分页游标
+
+    游标中带有来源，同一次翻页始终从同一数据源读取，数据源切换时旧游标不会被误解
+    """
+    raw = ":".join([kind, *(str(key) for key in keys)])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Tuple[int, ...]]:
+    """
+    解析分页游标
+
+    Returns:
+        Tuple: (来源, 排序键)
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        kind, *keys = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        parsed = tuple(int(key) for key in keys)
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    if kind not in (INDEX_CURSOR, CHAIN_CURSOR) or not parsed:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return kind, parsed
@@ -1,6 +1,10 @@
 import json
 import hashlib
-from eth_utils import keccak
+import re
+from eth_utils import is_address, keccak, to_checksum_address
+
+# 请求哈希必须是 0x 开头的32字节十六进制，与合约的 bytes32 一致
+REQUEST_HASH_PATTERN = re.compile(r"^0x[0-9a-fA-F]{64}$")
 
 
 def generate_hash(data):
@@ -67,4 +71,40 @@ def sha256_hash(data):
     hash_obj = hashlib.sha256(data)
     
     # 返回十六进制哈希
-    return hash_obj.hexdigest() 
\ No newline at end of file
+    return hash_obj.hexdigest()
+
+
+def normalize_address(address):
+    """
+    校验并标准化以太坊地址
+
+    Args:
+        address: 钱包地址
+
+    Returns:
+        str: 校验和格式的地址
+
+    Raises:
+        ValueError: 地址格式无效
+    """
+    if not isinstance(address, str) or not is_address(address):
+        raise ValueError(f"无效的钱包地址: {address}")
+    return to_checksum_address(address)
+
+
+def normalize_request_hash(request_hash):
+    """
+    校验并标准化请求哈希
+
+    Args:
+        request_hash: 请求哈希
+
+    Returns:
+        str: 小写的 0x 开头32字节十六进制字符串
+
+    Raises:
+        ValueError: 不是32字节的十六进制哈希
+    """
+    if not isinstance(request_hash, str) or not REQUEST_HASH_PATTERN.match(request_hash):
+        raise ValueError(f"无效的请求哈希，需要 0x 开头的32字节十六进制: {request_hash}")
+    return request_hash.lower()
@@ -0,0 +1,157 @@
+import gzip
+import hashlib
+import json
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+from ..core.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只使用gzip
+    brotli = None
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    由若干部分生成弱ETag
+
+    使用弱ETag是因为同一内容可能以不同的压缩编码返回
+    """
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def _normalize_etag(etag: str) -> str:
+    """去掉弱标记，用于弱比较"""
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: Optional[float] = None) -> bool:
+    """
+    根据 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效
+
+    If-None-Match 存在时优先使用，忽略 If-Modified-Since
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        expected = _normalize_etag(etag)
+        return any(_normalize_etag(candidate) == expected for candidate in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def _validator_headers(
+    etag: Optional[str],
+    last_modified: Optional[float],
+    cache_control: Optional[str],
+) -> Dict[str, str]:
+    """构建缓存校验相关的响应头"""
+    headers = {"Vary": "Accept-Encoding"}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return headers
+
+
+def not_modified_response(
+    etag: Optional[str],
+    last_modified: Optional[float] = None,
+    cache_control: Optional[str] = None,
+) -> Response:
+    """返回304响应"""
+    return Response(status_code=304, headers=_validator_headers(etag, last_modified, cache_control))
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding 为 {编码: q值}，q值无效的项忽略"""
+    weights: Dict[str, float] = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value.strip())
+                except ValueError:
+                    q = 0.0
+        weights[coding.lower()] = q
+    return weights
+
+
+def _choose_encoding(request: Request) -> Optional[str]:
+    """根据 Accept-Encoding 选择压缩编码，优先brotli；q=0(含 q=0.0、q=0.000)表示拒绝该编码"""
+    weights = _parse_accept_encoding(request.headers.get("accept-encoding", ""))
+    wildcard = weights.get("*", 0.0)
+
+    def accepted(coding: str) -> bool:
+        return weights.get(coding, wildcard) > 0
+
+    if brotli is not None and accepted("br"):
+        return "br"
+    if accepted("gzip"):
+        return "gzip"
+    return None
+
+
+def cached_json_response(
+    request: Request,
+    content: Any,
+    etag: Optional[str] = None,
+    last_modified: Optional[float] = None,
+    cache_control: Optional[str] = None,
+) -> Response:
+    """
+    构建带ETag/Last-Modified和压缩协商的JSON响应
+
+    Args:
+        request: 当前请求
+        content: 可JSON序列化的响应内容
+        etag: 预先计算的ETag；为空时由响应体生成
+        last_modified: 内容最后修改时间(Unix时间戳)
+        cache_control: Cache-Control 响应头
+
+    Returns:
+        Response: 客户端缓存有效时为304，否则为(可能已压缩的)JSON响应
+    """
+    # 已知ETag时先校验，命中则无需序列化
+    if etag is not None and is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified, cache_control)
+
+    body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if etag is None:
+        etag = make_etag(hashlib.sha256(body).hexdigest())
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified, cache_control)
+
+    headers = _validator_headers(etag, last_modified, cache_control)
+    if len(body) >= settings.COMPRESSION_MIN_SIZE:
+        encoding = _choose_encoding(request)
+        if encoding == "br":
+            body = brotli.compress(body, quality=settings.BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=settings.GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type="application/json", headers=headers)
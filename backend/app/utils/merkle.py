@@ -0,0 +1,58 @@
+from typing import List, Sequence
+
+from eth_utils import keccak, to_bytes, to_canonical_address
+
+
+def hash_leaf(user_address: str, request_hash: str, cid: str) -> bytes:
+    """
+    批次中一条请求的叶子哈希
+
+    与合约一致: keccak256(abi.encodePacked(user, requestHash, cid))，requestHash 必须正好32字节
+    """
+    request_hash_bytes = to_bytes(hexstr=request_hash)
+    if len(request_hash_bytes) != 32:
+        raise ValueError(f"请求哈希必须是32字节: {request_hash}")
+    return keccak(to_canonical_address(user_address) + request_hash_bytes + cid.encode("utf-8"))
+
+
+def _hash_pair(a: bytes, b: bytes) -> bytes:
+    """按字节序排序后拼接哈希，证明中无需记录左右位置"""
+    return keccak(a + b) if a < b else keccak(b + a)
+
+
+def build_tree(leaves: Sequence[bytes]) -> List[List[bytes]]:
+    """
+    构建Merkle树
+
+    Returns:
+        List[List[bytes]]: 从叶子层到根层的各层节点；奇数个节点时最后一个直接提升到上一层
+    """
+    if not leaves:
+        raise ValueError("Merkle树至少需要一个叶子")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def get_proof(levels: List[List[bytes]], index: int) -> List[bytes]:
+    """获取第 index 个叶子到根的兄弟节点列表"""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(level[sibling])
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf: bytes, proof: Sequence[bytes], root: bytes) -> bool:
+    """校验叶子是否属于以 root 为根的Merkle树"""
+    computed = leaf
+    for sibling in proof:
+        computed = _hash_pair(computed, sibling)
+    return computed == root
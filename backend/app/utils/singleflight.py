@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    合并并发的相同调用
+
+    同一个键在执行期间的所有调用共享同一次执行的结果(或异常)，
+    调用结束后键即被释放，下一次调用会重新执行。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._executions = 0
+        self._shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行 fn，若相同键的调用正在进行则等待其结果
+
+        Args:
+            key: 调用键，相同键的并发调用会被合并
+            fn: 无参数的异步函数
+
+        Returns:
+            fn 的返回值
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self._shared += 1
+            # shield: 某个等待方被取消时不影响共享的执行
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fn())
+        self._calls[key] = future
+        self._executions += 1
+
+        def _release(done: asyncio.Future) -> None:
+            if self._calls.get(key) is done:
+                del self._calls[key]
+            # 避免所有等待方都被取消时出现 "exception was never retrieved"
+            if not done.cancelled():
+                done.exception()
+
+        future.add_done_callback(_release)
+        return await asyncio.shield(future)
+
+    def in_flight(self) -> int:
+        """正在执行的调用数量"""
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回执行次数和被合并的调用次数"""
+        return {
+            "name": self.name,
+            "executions": self._executions,
+            "shared": self._shared,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,23 @@
+import json
+from typing import Any, Optional
+
+
+def format_sse_event(event: str, data: Any, event_id: Optional[Any] = None) -> str:
+    """
+    将数据格式化为一条Server-Sent Events消息
+
+    Args:
+        event: 事件名称
+        data: 可JSON序列化的事件数据
+        event_id: 可选的事件ID，客户端重连时通过 Last-Event-ID 带回
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+# SSE响应的公共响应头，禁止缓存和反向代理缓冲
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
@@ -0,0 +1,136 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from .metrics import registry
+
+# 建议流程各阶段耗时
+STAGE_DURATION = registry.histogram(
+    "advice_stage_duration_seconds",
+    "建议流程各阶段耗时",
+    ("stage", "status"),
+)
+
+# 外部HTTP/RPC调用耗时，status 为HTTP状态码或 ok/error
+UPSTREAM_DURATION = registry.histogram(
+    "upstream_request_duration_seconds",
+    "外部HTTP和区块链RPC调用耗时",
+    ("upstream", "operation", "status"),
+)
+
+# 外部调用的重试次数
+UPSTREAM_RETRIES = registry.counter(
+    "upstream_retries_total",
+    "外部调用的重试次数",
+    ("upstream", "operation"),
+)
+
+# 本服务HTTP接口耗时
+SERVER_REQUEST_DURATION = registry.histogram(
+    "http_server_request_duration_seconds",
+    "本服务HTTP接口耗时",
+    ("method", "route", "status"),
+)
+
+
+class Trace:
+    """
+    一次请求的分阶段耗时记录
+
+    只在客户端携带追踪头时创建，记录的span通过 Server-Timing 响应头回显
+    """
+
+    def __init__(self, trace_id: str):
+        self.id = trace_id
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, name: str, kind: str, duration: float, status: str, **attributes: Any) -> None:
+        self.spans.append({
+            "name": name,
+            "kind": kind,
+            "offset": round(time.time() - duration - self.started_at, 6),
+            "duration": round(duration, 6),
+            "status": status,
+            **attributes,
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"traceId": self.id, "spans": list(self.spans)}
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头，每个span一项，耗时单位为毫秒"""
+        entries = []
+        for index, span_info in enumerate(self.spans):
+            token = "".join(c if c.isalnum() or c in "-_" else "_" for c in span_info["name"])
+            entries.append(
+                f'{index}-{token};dur={span_info["duration"] * 1000:.1f};desc="{span_info["kind"]}:{span_info["status"]}"'
+            )
+        return ", ".join(entries)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """当前上下文中的追踪，未开启时为None"""
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """在当前上下文中激活追踪(后台worker执行任务时使用)"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, kind: str = "stage", **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    记录一段代码的耗时
+
+    kind 为 "stage" 时计入阶段直方图，否则视为外部调用，kind 作为 upstream 标签；
+    产出的字典可用于补充属性(如 status_code)，其中的 status 会覆盖默认的 ok/error
+
+    用法:
+        with span("ipfs_store"):
+            cid = await store_data_to_ipfs(...)
+    """
+    info: Dict[str, Any] = dict(attributes)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield info
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        status = str(info.pop("status", status))
+        if kind == "stage":
+            STAGE_DURATION.observe(duration, stage=name, status=status)
+        else:
+            UPSTREAM_DURATION.observe(duration, upstream=kind, operation=name, status=status)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, kind, duration, status, **info)
+
+
+def record_upstream(upstream: str, operation: str, status: str, duration: float) -> None:
+    """记录已经测得耗时的外部调用(用于aiohttp的trace钩子)"""
+    UPSTREAM_DURATION.observe(duration, upstream=upstream, operation=operation, status=status)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(f"{operation} {upstream}", "http", duration, status)
+
+
+def record_retry(upstream: str, operation: str) -> None:
+    """记录一次外部调用重试"""
+    UPSTREAM_RETRIES.inc(upstream=upstream, operation=operation)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(f"retry {operation}", upstream, 0.0, "retry")
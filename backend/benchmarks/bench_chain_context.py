@@ -0,0 +1,173 @@
+"""
+对比逐次构建合约实例/调用 build_transaction 与使用 ChainContext 预编码本地构建交易的开销
+
+节点由计数的本地 provider 代替，统计每笔交易的CPU时间和RPC请求数(不包含网络延迟，
+真实环境中每省掉一个RPC请求即省掉一次到节点的往返)。
+
+用法:
+    python benchmarks/bench_chain_context.py --iterations 500
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Callable, Dict
+
+from eth_account import Account
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chain_context import ChainContext  # noqa: E402
+
+CHAIN_ID = 11155111
+CONTRACT_ADDRESS = "0x1234567890123456789012345678901234567890"
+USER_ADDRESS = "0x742d35cc6634c0532925a3b844bc454e4438f44e"
+REQUEST_HASH = "0x" + "ab" * 32
+CID = "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o"
+SIGNATURE = "0x" + "cd" * 65
+
+ABI = [
+    {
+        "inputs": [
+            {"name": "user", "type": "address"},
+            {"name": "requestHash", "type": "bytes32"},
+            {"name": "cid", "type": "string"},
+            {"name": "signature", "type": "bytes"},
+        ],
+        "name": "recordRequest",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "name": "user", "type": "address"},
+            {"indexed": False, "name": "requestHash", "type": "bytes32"},
+            {"indexed": False, "name": "cid", "type": "string"},
+            {"indexed": False, "name": "timestamp", "type": "uint256"},
+        ],
+        "name": "RequestRecorded",
+        "type": "event",
+    },
+]
+
+# 计数 provider 对各方法的固定返回值
+RESPONSES: Dict[str, Any] = {
+    "web3_clientVersion": "bench/v1",
+    "eth_chainId": hex(CHAIN_ID),
+    "eth_gasPrice": hex(10 ** 9),
+    "eth_estimateGas": hex(60000),
+    "eth_sendRawTransaction": "0x" + "11" * 32,
+}
+
+
+class CountingProvider(BaseProvider):
+    """记录RPC方法调用次数，直接返回固定结果"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter = Counter()
+
+    def make_request(self, method, params):
+        self.calls[method] += 1
+        return {"jsonrpc": "2.0", "id": 1, "result": RESPONSES[method]}
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        self.make_request("web3_clientVersion", [])
+        return True
+
+
+def send_rebuilt(w3: Web3, account, nonce: int) -> bytes:
+    """改动前的路径: 每笔交易重建合约实例并调用 build_transaction"""
+    if not w3.is_connected():
+        raise ConnectionError("无法连接到区块链")
+    user_address = w3.to_checksum_address(USER_ADDRESS)
+    contract_address = w3.to_checksum_address(CONTRACT_ADDRESS)
+    contract = w3.eth.contract(address=contract_address, abi=ABI)
+    gas_price = int(w3.eth.gas_price * 1.1)
+    tx = contract.functions.recordRequest(
+        user_address,
+        bytes.fromhex(REQUEST_HASH[2:]),
+        CID,
+        bytes.fromhex(SIGNATURE[2:]),
+    ).build_transaction({
+        "from": account.address,
+        "gas": 2000000,
+        "gasPrice": gas_price,
+        "nonce": nonce,
+    })
+    signed_tx = w3.eth.account.sign_transaction(tx, account.key)
+    return w3.eth.send_raw_transaction(signed_tx.rawTransaction)
+
+
+def send_with_context(w3: Web3, context: ChainContext, nonce: int) -> bytes:
+    """改动后的路径: 预编码调用数据并在本地构建交易"""
+    data = context.encode_call(
+        "recordRequest",
+        USER_ADDRESS,
+        bytes.fromhex(REQUEST_HASH[2:]),
+        CID,
+        bytes.fromhex(SIGNATURE[2:]),
+    )
+    gas_price = int(w3.eth.gas_price * 1.1)
+    tx = context.build_transaction(data, nonce, 2000000, {"gasPrice": gas_price})
+    return w3.eth.send_raw_transaction(context.sign_transaction(tx))
+
+
+def run(name: str, provider: CountingProvider, send: Callable[[int], bytes], iterations: int) -> Dict[str, Any]:
+    # 预热，排除首次导入和缓存填充的开销
+    for nonce in range(10):
+        send(nonce)
+    provider.calls.clear()
+
+    start = time.process_time()
+    for nonce in range(iterations):
+        send(nonce)
+    cpu = time.process_time() - start
+
+    rpc_total = sum(provider.calls.values())
+    print(f"{name}")
+    print(f"  CPU时间/笔: {cpu / iterations * 1e6:9.1f} µs")
+    print(f"  RPC请求/笔: {rpc_total / iterations:9.2f}")
+    for method, count in sorted(provider.calls.items()):
+        print(f"    {method}: {count / iterations:.2f}")
+    return {"cpu": cpu / iterations, "rpc": rpc_total / iterations}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ChainContext 交易构建基准测试")
+    parser.add_argument("--iterations", type=int, default=500, help="每种方式发送的交易数")
+    args = parser.parse_args()
+
+    account = Account.create()
+
+    rebuilt_provider = CountingProvider()
+    rebuilt_w3 = Web3(rebuilt_provider)
+    rebuilt = run(
+        "重建合约实例 + build_transaction",
+        rebuilt_provider,
+        lambda nonce: send_rebuilt(rebuilt_w3, account, nonce),
+        args.iterations,
+    )
+
+    context_provider = CountingProvider()
+    context_w3 = Web3(context_provider)
+    context = ChainContext.resolve(context_w3, CONTRACT_ADDRESS, ABI, CHAIN_ID, account)
+    cached = run(
+        "ChainContext 预编码 + 本地构建",
+        context_provider,
+        lambda nonce: send_with_context(context_w3, context, nonce),
+        args.iterations,
+    )
+
+    print()
+    print(f"CPU时间减少: {(1 - cached['cpu'] / rebuilt['cpu']) * 100:.1f}%")
+    print(f"每笔交易少发送 {rebuilt['rpc'] - cached['rpc']:.2f} 个RPC请求")
+
+
+if __name__ == "__main__":
+    main()
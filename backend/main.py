@@ -1,10 +1,25 @@
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import logging
+import time
+from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.routers import advice, market_data
+from app.services.http_client import http_clients, get_warmup_urls
+from app.services.market_history import market_history
+from app.services.market_poller import market_poller
+from app.services.advice_jobs import advice_jobs
+from app.services.blockchain import init_chain_context, shutdown_chain_executor, signer_pool
+from app.services.batch_anchor import batch_anchorer
+from app.services.confirmation_tracker import confirmation_tracker
+from app.services.event_indexer import event_indexer
+from app.services.fee_engine import fee_engine, gas_limits
+from app.services.json_rpc import rpc_pool
+from app.services.tx_watchdog import tx_watchdog
+from app.utils.metrics import registry, CONTENT_TYPE_LATEST
+from app.utils.tracing import SERVER_REQUEST_DURATION, Trace, use_trace
 
 # 配置日志
 logging.basicConfig(
@@ -13,11 +28,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger("main")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期: 启动时开始后台任务，关闭时停止"""
+    await http_clients.start(get_warmup_urls() if settings.HTTP_WARMUP else None)
+    market_history.open()
+    # 多个RPC节点时定期检查各节点的延迟和区块高度
+    rpc_pool.start()
+    # 解析链ID并缓存合约实例、函数选择器和事件主题
+    await init_chain_context()
+    # 同步各签名账户的nonce，失败的账户在第一次分配nonce时重试
+    await signer_pool.sync()
+    await market_poller.start()
+    batch_anchorer.start()
+    indexer_enabled = settings.INDEXER_ENABLED and bool(settings.CONTRACT_ADDRESS)
+    if indexer_enabled and settings.INDEXER_START_BLOCK <= 0:
+        # 从创世区块扫描整条链的日志会长时间占用RPC配额，必须显式配置合约部署区块
+        logger.error("已启用事件索引但未配置 INDEXER_START_BLOCK(合约部署所在区块)，事件索引未启动")
+        indexer_enabled = False
+    if indexer_enabled:
+        await event_indexer.start()
+    elif settings.ANCHOR_MODE == "batch":
+        logger.warning("批次上链的请求只记录在事件中，未启用事件索引时不会出现在历史记录里")
+    await advice_jobs.start()
+    yield
+    await advice_jobs.stop()
+    await batch_anchorer.stop()
+    await event_indexer.stop()
+    await confirmation_tracker.stop()
+    await market_poller.stop()
+    await rpc_pool.stop()
+    market_history.close()
+    await http_clients.close()
+    shutdown_chain_executor()
+
 app = FastAPI(
     title=settings.APP_NAME,
     description="基于区块链和IPFS的去中心化AI投资顾问系统",
     version=settings.APP_VERSION,
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan
 )
 
 # 设置CORS
@@ -29,6 +79,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 接口耗时统计；请求携带追踪头时回显各阶段耗时
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace_id = request.headers.get(settings.TRACE_HEADER)
+    trace = Trace(trace_id) if trace_id else None
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        with use_trace(trace):
+            response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        route = request.scope.get("route")
+        SERVER_REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=str(status_code),
+        )
+    if trace is not None:
+        response.headers[settings.TRACE_HEADER] = trace.id
+        if trace.spans:
+            response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
 # 全局异常处理
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -47,6 +122,50 @@ app.include_router(market_data.router)
 async def health_check():
     return {"status": "ok", "version": settings.APP_VERSION}
 
+# HTTP连接池使用情况
+@app.get("/health/http-pool")
+async def http_pool_stats():
+    return {"success": True, "data": http_clients.stats()}
+
+# 队列和连接池的当前状态，在导出指标时读取
+registry.gauge("advice_job_queue_depth", "等待执行的建议任务数", lambda: advice_jobs.stats()["queued"])
+registry.gauge("http_pool_connections_in_use", "共享HTTP连接池中使用中的连接数", lambda: http_clients.stats()["connections_in_use"])
+
+# 各签名账户的nonce分配和负载状态
+@app.get("/health/nonce")
+async def nonce_stats():
+    return {"success": True, "data": signer_pool.stats()}
+
+# 交易确认跟踪器状态
+@app.get("/health/confirmations")
+async def confirmation_stats():
+    return {"success": True, "data": confirmation_tracker.stats()}
+
+# 待确认交易和替换情况
+@app.get("/health/transactions")
+async def transaction_stats():
+    return {"success": True, "data": tx_watchdog.stats()}
+
+# 费用报价和gas上限缓存状态
+@app.get("/health/fees")
+async def fee_stats():
+    return {"success": True, "data": {"fees": fee_engine.stats(), "gas_limits": gas_limits.stats()}}
+
+# 事件索引同步状态
+@app.get("/health/indexer")
+async def indexer_stats():
+    return {"success": True, "data": event_indexer.stats()}
+
+# RPC节点延迟、健康状态和切换次数
+@app.get("/health/rpc")
+async def rpc_stats():
+    return {"success": True, "data": rpc_pool.stats()}
+
+# Prometheus指标
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     logger.info(f"启动服务: {settings.HOST}:{settings.PORT}")
     uvicorn.run(
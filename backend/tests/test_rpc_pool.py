@@ -0,0 +1,205 @@
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.services.json_rpc import JsonRpcError, RpcProviderPool, post_json_rpc_batch
+
+
+class StubRpcNode:
+    """本地模拟的RPC节点，可设置响应延迟、HTTP错误和区块高度"""
+
+    def __init__(self, name: str, delay: float = 0.0, status: int = 200, block: int = 100):
+        self.name = name
+        self.delay = delay
+        self.status = status
+        self.block = block
+        self.requests = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.requests.append(payload)
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.Response(status=self.status, text="unavailable")
+        # 按相反顺序返回，验证结果按请求id而不是响应顺序匹配
+        return web.json_response([self._respond(item) for item in reversed(payload)])
+
+    def _respond(self, item: dict) -> dict:
+        method = item["method"]
+        if method == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": item["id"], "result": hex(self.block)}
+        if method == "eth_getTransactionReceipt":
+            return {"jsonrpc": "2.0", "id": item["id"], "result": {"node": self.name, "status": "0x1"}}
+        if method == "eth_getTransactionByHash":
+            return {"jsonrpc": "2.0", "id": item["id"], "result": {"node": self.name, "hash": item["params"][0]}}
+        return {"jsonrpc": "2.0", "id": item["id"], "error": {"code": -32601, "message": "method not found"}}
+
+
+@asynccontextmanager
+async def rpc_pool(*nodes: StubRpcNode, **options):
+    """为每个模拟节点启动本地HTTP服务，并创建使用这些节点的节点池"""
+    servers = []
+    for node in nodes:
+        app = web.Application()
+        app.router.add_post("/", node.handle)
+        server = TestServer(app, host="127.0.0.1")
+        await server.start_server()
+        servers.append(server)
+    session = aiohttp.ClientSession()
+    params = {
+        "ewma_alpha": 0.5,
+        "hedge_delay": 0.05,
+        "failure_threshold": 2,
+        "cooldown": 60.0,
+        "health_interval": 60.0,
+        "max_block_lag": 5,
+    }
+    params.update(options)
+    pool = RpcProviderPool(
+        urls=[str(server.make_url("/")) for server in servers],
+        post=partial(post_json_rpc_batch, session=session),
+        **params,
+    )
+    try:
+        yield pool
+    finally:
+        await session.close()
+        for server in servers:
+            await server.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_results_in_call_order():
+    """
+    测试批量请求只发送一次HTTP请求，结果按调用顺序返回
+    """
+    node = StubRpcNode("a")
+    async with rpc_pool(node) as pool:
+        receipt, tx, unknown = await pool.call_batch([
+            ("eth_getTransactionReceipt", ["0x01"]),
+            ("eth_getTransactionByHash", ["0x01"]),
+            ("eth_unknown", []),
+        ])
+
+    assert len(node.requests) == 1
+    assert receipt["status"] == "0x1"
+    assert tx["hash"] == "0x01"
+    assert isinstance(unknown, JsonRpcError)
+
+
+@pytest.mark.asyncio
+async def test_failover_and_circuit_breaker():
+    """
+    测试首选节点返回HTTP错误时切换到下一个节点，连续失败后该节点暂停使用
+    """
+    broken = StubRpcNode("broken", status=503)
+    healthy = StubRpcNode("healthy")
+    async with rpc_pool(broken, healthy) as pool:
+        broken_endpoint, healthy_endpoint = pool.endpoints
+
+        result = await pool.call_batch([("eth_getTransactionReceipt", ["0x01"])])
+        assert result[0]["node"] == "healthy"
+        assert broken_endpoint.failures == 1
+        assert pool.stats()["failovers"] == 1
+
+        # 失败过的节点评分变差，不再排在首位
+        assert pool.ranked()[0] is healthy_endpoint
+        result = await pool.call_batch([("eth_getTransactionReceipt", ["0x01"])])
+        assert result[0]["node"] == "healthy"
+        assert len(broken.requests) == 1
+
+        # 按原顺序再次请求失败，连续失败达到阈值后暂停使用，只作兜底
+        await pool._failover([("eth_blockNumber", [])], [broken_endpoint, healthy_endpoint])
+        assert broken_endpoint.consecutive_failures == 2
+        assert not broken_endpoint.healthy
+        assert pool.ranked()[-1] is broken_endpoint
+
+
+@pytest.mark.asyncio
+async def test_recovered_endpoint_does_not_outrank_healthy_one():
+    """
+    测试从未成功过的节点冷却结束后不会因为没有延迟样本而排在首位
+    """
+    broken = StubRpcNode("broken", status=503)
+    healthy = StubRpcNode("healthy", delay=0.02)
+    async with rpc_pool(broken, healthy, cooldown=0.0) as pool:
+        broken_endpoint, healthy_endpoint = pool.endpoints
+        for _ in range(3):
+            await pool.call_batch([("eth_getTransactionReceipt", ["0x01"])])
+
+        assert broken_endpoint.latency is None
+        assert broken_endpoint.healthy
+        assert pool.ranked()[0] is healthy_endpoint
+
+
+@pytest.mark.asyncio
+async def test_ranking_prefers_lower_latency():
+    """
+    测试节点按延迟EWMA排序，较快的节点排在前面
+    """
+    slow = StubRpcNode("slow", delay=0.1)
+    fast = StubRpcNode("fast")
+    async with rpc_pool(slow, fast) as pool:
+        await pool.check_health()
+        slow_endpoint, fast_endpoint = pool.endpoints
+        assert fast_endpoint.latency < slow_endpoint.latency
+        assert pool.ranked()[0] is fast_endpoint
+
+        result = await pool.call_batch([("eth_getTransactionReceipt", ["0x01"])])
+        assert result[0]["node"] == "fast"
+
+
+@pytest.mark.asyncio
+async def test_hedged_read_returns_fastest_response():
+    """
+    测试对冲请求: 首选节点超过 hedge_delay 未返回时，由下一个节点的响应胜出
+    """
+    slow = StubRpcNode("slow", delay=1.0)
+    fast = StubRpcNode("fast")
+    async with rpc_pool(slow, fast) as pool:
+        slow_endpoint = pool.endpoints[0]
+        # 没有延迟样本时按配置顺序选择，首选节点是慢节点
+        assert pool.ranked()[0] is slow_endpoint
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await pool.call_batch([("eth_getTransactionByHash", ["0x02"])], hedge=True)
+        elapsed = loop.time() - started
+
+        assert result[0]["node"] == "fast"
+        assert elapsed < 0.5
+        assert pool.stats()["hedge_wins"] == 1
+        # 被取消的慢请求不计为失败
+        assert slow_endpoint.failures == 0
+        assert slow_endpoint.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_health_check_excludes_lagging_endpoint():
+    """
+    测试区块高度落后过多的节点不参与选择
+    """
+    behind = StubRpcNode("behind", block=90)
+    synced = StubRpcNode("synced", block=100)
+    async with rpc_pool(behind, synced) as pool:
+        await pool.check_health()
+        behind_endpoint, synced_endpoint = pool.endpoints
+
+        assert behind_endpoint.block_number == 90
+        assert behind_endpoint.lagging
+        assert not behind_endpoint.healthy
+        assert pool.ranked()[0] is synced_endpoint
+
+        result = await pool.call_batch([("eth_getTransactionReceipt", ["0x01"])], hedge=True)
+        assert result[0]["node"] == "synced"
+        assert pool.stats()["hedges"] == 0
+
+        # 追上链头后恢复使用
+        behind.block = 100
+        await pool.check_health()
+        assert behind_endpoint.healthy
@@ -10,6 +10,9 @@ contract InvestmentAdvisor {
     address public owner;
     address public advisorServer;
     
+    // Authorized advisor signer accounts (advisorServer is always included)
+    mapping(address => bool) public advisors;
+    
     // Structure to store user requests
     struct RequestRecord {
         bytes32[] requestHashes;
@@ -20,6 +23,15 @@ contract InvestmentAdvisor {
     // 将 public 改为 internal，并提供自定义 getter 函数
     mapping(address => RequestRecord) internal _userRequests;
     
+    // Structure to store anchored Merkle batches
+    struct BatchRecord {
+        uint64 count;
+        uint64 timestamp;
+    }
+    
+    // Merkle root => batch info
+    mapping(bytes32 => BatchRecord) public batches;
+    
     // Events
     event RequestRecorded(
         address indexed user,
@@ -28,15 +40,24 @@ contract InvestmentAdvisor {
         uint256 timestamp
     );
     
+    event BatchAnchored(
+        bytes32 indexed root,
+        uint256 count,
+        uint256 timestamp
+    );
+    
+    event AdvisorAdded(address indexed advisor);
+    event AdvisorRemoved(address indexed advisor);
+    
     // Modifier: only owner can call
     modifier onlyOwner() {
         require(msg.sender == owner, "Only owner can call this function");
         _;
     }
     
-    // Modifier: only authorized advisor server can call
+    // Modifier: only authorized advisor accounts can call
     modifier onlyAdvisor() {
-        require(msg.sender == advisorServer, "Only authorized advisor can call this function");
+        require(advisors[msg.sender], "Only authorized advisor can call this function");
         _;
     }
     
@@ -46,14 +67,44 @@ contract InvestmentAdvisor {
     constructor() {
         owner = msg.sender;
         advisorServer = msg.sender; // Initially owner is also the advisor server
+        advisors[msg.sender] = true;
+        emit AdvisorAdded(msg.sender);
     }
     
     /**
      * @dev Change advisor server address
+     * The previous advisor server stays authorized until removed with removeAdvisor
      * @param _newAdvisor New advisor server address
      */
     function setAdvisorServer(address _newAdvisor) external onlyOwner {
         advisorServer = _newAdvisor;
+        if (!advisors[_newAdvisor]) {
+            advisors[_newAdvisor] = true;
+            emit AdvisorAdded(_newAdvisor);
+        }
+    }
+    
+    /**
+     * @dev Authorize an additional advisor signer account
+     * Each advisor sends transactions from its own nonce sequence, so submissions run in parallel
+     * @param advisor Advisor address
+     */
+    function addAdvisor(address advisor) external onlyOwner {
+        require(advisor != address(0), "Invalid advisor address");
+        require(!advisors[advisor], "Advisor already authorized");
+        advisors[advisor] = true;
+        emit AdvisorAdded(advisor);
+    }
+    
+    /**
+     * @dev Revoke an advisor signer account
+     * @param advisor Advisor address
+     */
+    function removeAdvisor(address advisor) external onlyOwner {
+        require(advisors[advisor], "Advisor not authorized");
+        require(advisor != advisorServer, "Cannot remove advisor server");
+        advisors[advisor] = false;
+        emit AdvisorRemoved(advisor);
     }
     
     /**
@@ -77,8 +128,8 @@ contract InvestmentAdvisor {
         (uint8 v, bytes32 r, bytes32 s) = splitSignature(signature);
         address signer = ecrecover(ethSignedMessageHash, v, r, s);
         
-        // Verify signer is authorized advisor server
-        require(signer == advisorServer, "Signature verification failed");
+        // Verify signer is an authorized advisor
+        require(advisors[signer], "Signature verification failed");
         
         // Record request
         _userRequests[user].requestHashes.push(requestHash);
@@ -89,6 +140,106 @@ contract InvestmentAdvisor {
         emit RequestRecorded(user, requestHash, cid, block.timestamp);
     }
     
+    /**
+     * @dev Anchor a Merkle root covering a batch of requests
+     * Leaves are keccak256(abi.encodePacked(user, requestHash, cid)), pairs are hashed in sorted order,
+     * an odd node at the end of a level is promoted unchanged. The root is recomputed from the leaves
+     * and a RequestRecorded event is emitted for every leaf, so batched requests appear in
+     * event-based history. Per-user storage is skipped to keep the gas saving of batching:
+     * batched requests are not returned by getUserRequestCount / getUserRequestAt / getUserRequestsPage.
+     * @param root Merkle root
+     * @param users User address of each leaf
+     * @param requestHashes Request hash of each leaf
+     * @param cids IPFS content identifier of each leaf
+     * @param signature Backend signature for root
+     */
+    function anchorBatch(
+        bytes32 root,
+        address[] calldata users,
+        bytes32[] calldata requestHashes,
+        string[] calldata cids,
+        bytes memory signature
+    ) external onlyAdvisor {
+        uint256 count = users.length;
+        require(count > 0, "Empty batch");
+        require(requestHashes.length == count && cids.length == count, "Leaf length mismatch");
+        require(batches[root].timestamp == 0, "Batch already anchored");
+        require(_merkleRoot(users, requestHashes, cids) == root, "Merkle root mismatch");
+        
+        // Verify signature (scoped to keep the stack small next to the calldata arrays)
+        {
+            bytes32 ethSignedMessageHash = keccak256(
+                abi.encodePacked("\x19Ethereum Signed Message:\n32", keccak256(abi.encodePacked(root)))
+            );
+            (uint8 v, bytes32 r, bytes32 s) = splitSignature(signature);
+            require(advisors[ecrecover(ethSignedMessageHash, v, r, s)], "Signature verification failed");
+        }
+        
+        batches[root] = BatchRecord(uint64(count), uint64(block.timestamp));
+        
+        for (uint256 i = 0; i < count; i++) {
+            emit RequestRecorded(users[i], requestHashes[i], cids[i], block.timestamp);
+        }
+        emit BatchAnchored(root, count, block.timestamp);
+    }
+    
+    /**
+     * @dev Compute the Merkle root of a batch, matching the backend tree construction
+     */
+    function _merkleRoot(
+        address[] calldata users,
+        bytes32[] calldata requestHashes,
+        string[] calldata cids
+    ) internal pure returns (bytes32) {
+        uint256 n = users.length;
+        bytes32[] memory level = new bytes32[](n);
+        for (uint256 i = 0; i < n; i++) {
+            level[i] = keccak256(abi.encodePacked(users[i], requestHashes[i], cids[i]));
+        }
+        while (n > 1) {
+            uint256 m = 0;
+            for (uint256 i = 0; i + 1 < n; i += 2) {
+                bytes32 a = level[i];
+                bytes32 b = level[i + 1];
+                level[m++] = a < b ? keccak256(abi.encodePacked(a, b)) : keccak256(abi.encodePacked(b, a));
+            }
+            if (n % 2 == 1) {
+                level[m++] = level[n - 1];
+            }
+            n = m;
+        }
+        return level[0];
+    }
+    
+    /**
+     * @dev Verify that a request is included in an anchored batch
+     * @param root Merkle root
+     * @param user User address
+     * @param requestHash Request hash
+     * @param cid IPFS content identifier
+     * @param proof Sibling hashes from leaf to root
+     */
+    function verifyBatchedRequest(
+        bytes32 root,
+        address user,
+        bytes32 requestHash,
+        string calldata cid,
+        bytes32[] calldata proof
+    ) external view returns (bool) {
+        if (batches[root].timestamp == 0) {
+            return false;
+        }
+        
+        bytes32 computed = keccak256(abi.encodePacked(user, requestHash, cid));
+        for (uint256 i = 0; i < proof.length; i++) {
+            bytes32 sibling = proof[i];
+            computed = computed < sibling
+                ? keccak256(abi.encodePacked(computed, sibling))
+                : keccak256(abi.encodePacked(sibling, computed));
+        }
+        return computed == root;
+    }
+    
     /**
      * @dev Split signature into v, r, s components
      * @param sig Signature
@@ -136,6 +287,39 @@ contract InvestmentAdvisor {
         );
     }
     
+    /**
+     * @dev Get one page of user's requests, newest first
+     * Records are append-only, so an index-based cursor stays stable while new requests are recorded.
+     * @param user User address
+     * @param before Return records with index < before (values above the count start from the newest record)
+     * @param limit Maximum number of records to return
+     * @return requestHashes Request hashes of the page
+     * @return cids IPFS content identifiers of the page
+     * @return timestamps Record timestamps of the page
+     * @return total Total number of user's requests
+     */
+    function getUserRequestsPage(address user, uint256 before, uint256 limit) external view returns (
+        bytes32[] memory requestHashes,
+        string[] memory cids,
+        uint256[] memory timestamps,
+        uint256 total
+    ) {
+        RequestRecord storage record = _userRequests[user];
+        total = record.requestHashes.length;
+        uint256 end = before < total ? before : total;
+        uint256 size = limit < end ? limit : end;
+
+        requestHashes = new bytes32[](size);
+        cids = new string[](size);
+        timestamps = new uint256[](size);
+        for (uint256 i = 0; i < size; i++) {
+            uint256 index = end - 1 - i;
+            requestHashes[i] = record.requestHashes[index];
+            cids[i] = record.cids[index];
+            timestamps[i] = record.timestamps[index];
+        }
+    }
+
     /**
      * @dev Custom getter for user requests (replaces the automatic public getter)
      * @param user User address
@@ -5,7 +5,7 @@ import {
   IPFSStorageData,
   APIError,
   generateRequestHash,
-  BlockchainRequest,
+  UserRequestsPage,
   MarketDataResponse,
   FearGreedIndex
 } from './types';
@@ -13,6 +13,12 @@ import {
 // API 基础URL - 根据环境配置
 export const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
 
+// 建议任务状态轮询间隔(毫秒)
+const ADVICE_JOB_POLL_INTERVAL = 1500;
+
+// 历史记录每页条数
+export const HISTORY_PAGE_SIZE = 50;
+
 // IPFS配置
 export const IPFS_GATEWAY = 'https://ipfs.io/ipfs';
 
@@ -20,6 +26,40 @@ export const IPFS_GATEWAY = 'https://ipfs.io/ipfs';
  * AI服务API客户端实现
  */
 export class ApiClient {
+  /**
+   * 轮询建议任务直到完成或失败
+   * @param jobId 任务ID
+   * @returns 任务的最终结果
+   */
+  private async waitForAdviceJob(jobId: string): Promise<any> {
+    while (true) {
+      const response = await fetch(`${API_BASE_URL}/api/advice/jobs/${jobId}`, {
+        headers: {
+          'Accept': 'application/json'
+        }
+      });
+      
+      if (!response.ok) {
+        const errorData = await response.json();
+        throw new APIError(
+          errorData.detail || '查询任务状态失败',
+          response.status,
+          errorData.error
+        );
+      }
+      
+      const { data: job } = await response.json();
+      if (job.status === 'completed') {
+        return job.result;
+      }
+      if (job.status === 'failed') {
+        throw new APIError(job.error || '生成建议失败', 500);
+      }
+      
+      await new Promise(resolve => setTimeout(resolve, ADVICE_JOB_POLL_INTERVAL));
+    }
+  }
+
   /**
    * 获取AI投资建议
    * @param userAddress 用户地址
@@ -52,7 +92,9 @@ export class ApiClient {
         );
       }
       
-      const result = await response.json();
+      // 后端立即返回任务ID，轮询直到建议生成并上链完成
+      const submitted = await response.json();
+      const result = await this.waitForAdviceJob(submitted.data.jobId);
       
       // 处理不同的响应类型
       const action = result.action || 'recommend';
@@ -171,13 +213,23 @@ export class ApiClient {
   }
 
   /**
-   * 获取用户的历史投资建议记录
+   * 分页获取用户的历史投资建议记录(按时间倒序)
    * @param userAddress 用户钱包地址
-   * @returns 历史记录列表
+   * @param limit 每页记录数
+   * @param cursor 上一页返回的 nextCursor，不传时获取第一页
+   * @returns 一页历史记录和下一页游标
    */
-  async getUserRequests(userAddress: string): Promise<BlockchainRequest[]> {
+  async getUserRequests(
+    userAddress: string,
+    limit: number = HISTORY_PAGE_SIZE,
+    cursor?: string | null
+  ): Promise<UserRequestsPage> {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/history/${userAddress}`);
+      const params = new URLSearchParams({ limit: String(limit) });
+      if (cursor) {
+        params.set('cursor', cursor);
+      }
+      const response = await fetch(`${API_BASE_URL}/api/history/${userAddress}?${params}`);
       
       if (!response.ok) {
         const errorData = await response.json();
@@ -188,10 +240,13 @@ export class ApiClient {
       }
       
       const result = await response.json();
-      return result.data || [];
+      return {
+        items: result.data || [],
+        nextCursor: result.nextCursor || null
+      };
     } catch (error) {
       console.error('获取用户历史记录失败:', error);
-      return [];
+      throw error;
     }
   }
 
@@ -28,6 +28,22 @@ export const AI_CONTRACT_ABI = [
     "stateMutability": "view",
     "type": "function"
   },
+  {
+    "inputs": [
+      { "name": "user", "type": "address" },
+      { "name": "before", "type": "uint256" },
+      { "name": "limit", "type": "uint256" }
+    ],
+    "name": "getUserRequestsPage",
+    "outputs": [
+      { "name": "requestHashes", "type": "bytes32[]" },
+      { "name": "cids", "type": "string[]" },
+      { "name": "timestamps", "type": "uint256[]" },
+      { "name": "total", "type": "uint256" }
+    ],
+    "stateMutability": "view",
+    "type": "function"
+  },
   {
     "anonymous": false,
     "inputs": [
@@ -38,6 +54,31 @@ export const AI_CONTRACT_ABI = [
     ],
     "name": "RequestRecorded",
     "type": "event"
+  },
+  {
+    "inputs": [
+      { "name": "root", "type": "bytes32" },
+      { "name": "user", "type": "address" },
+      { "name": "requestHash", "type": "bytes32" },
+      { "name": "cid", "type": "string" },
+      { "name": "proof", "type": "bytes32[]" }
+    ],
+    "name": "verifyBatchedRequest",
+    "outputs": [
+      { "name": "", "type": "bool" }
+    ],
+    "stateMutability": "view",
+    "type": "function"
+  },
+  {
+    "anonymous": false,
+    "inputs": [
+      { "indexed": true, "name": "root", "type": "bytes32" },
+      { "indexed": false, "name": "count", "type": "uint256" },
+      { "indexed": false, "name": "timestamp", "type": "uint256" }
+    ],
+    "name": "BatchAnchored",
+    "type": "event"
   }
 ] as const;
 
@@ -115,6 +115,12 @@ export interface BlockchainRequest {
   };
 }
 
+// /api/history 的一页记录，nextCursor 为 null 表示没有更早的记录
+export interface UserRequestsPage {
+  items: BlockchainRequest[];
+  nextCursor: string | null;
+}
+
 // 错误处理
 export class APIError extends Error {
   statusCode: number;
@@ -1,97 +1,68 @@
 import { useState, useEffect } from 'react'
-import { useAccount, useReadContract } from 'wagmi'
-import { Address } from 'viem'
+import { useAccount } from 'wagmi'
 import { 
-  AI_CONTRACT_ADDRESS, 
-  AI_CONTRACT_ABI, 
   apiClient, 
   getEtherscanLink
 } from '../api'
 import { BlockchainRequest, TradeItem } from '../api/types'
 import '../styles/AIAdvisorContract.css'
 
-// 从环境变量获取合约地址
-const CONTRACT_ADDRESS = AI_CONTRACT_ADDRESS;
-
 export function AIAdvisorContract() {
   const { address, isConnected } = useAccount()
   const [isLoading, setIsLoading] = useState(false)
   const [loadError, setLoadError] = useState(false)
+  const [historyError, setHistoryError] = useState(false)
   const [retryCount, setRetryCount] = useState(0)
   const [history, setHistory] = useState<BlockchainRequest[]>([])
-  const { data: userRequests, isError, refetch } = useReadContract({
-    address: CONTRACT_ADDRESS as Address,
-    abi: AI_CONTRACT_ABI,
-    functionName: 'getUserRequests',
-    args: address ? [address] : undefined,
-    query: {
-      enabled: Boolean(address),
-    }
-  })
+  // API分页: 下一页游标，为 null 表示没有更早的记录
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
   
+  // 历史记录只通过分页API加载，不再调用合约一次返回全部记录的 getUserRequests
   useEffect(() => {
-    if (userRequests && Array.isArray(userRequests)) {
-      // 转换区块链数据格式
-      const formattedRequests = userRequests[0].map((hash: any, index: number) => ({
-        requestHash: hash,
-        cid: userRequests[1][index],
-        timestamp: Number(userRequests[2][index])
-      }))
-      
-      // 更新状态
-      setHistory(formattedRequests)
-      
-      // 获取IPFS详情数据
-      loadIpfsDetails(formattedRequests)
-    } else if (address && isConnected) {
-      // 如果直接从合约获取数据失败，则尝试使用API获取
+    setHistory([])
+    setNextCursor(null)
+    if (address && isConnected) {
       fetchHistoryFromApi();
     }
-  }, [userRequests, address, isConnected])
+  }, [address, isConnected])
   
-  // 添加超时自动重试和失败恢复机制
+  // 首页加载失败时延迟自动重试一次
   useEffect(() => {
-    // 如果已加载数据，则不执行
-    if (history.length > 0) return;
+    if (!historyError || history.length > 0) return;
     
-    // 网络问题或其他原因导致数据未加载，设置重试定时器
     const retryTimer = setTimeout(() => {
-      if (history.length === 0 && address && isConnected) {
-        console.log("数据加载超时，尝试使用API获取历史记录");
+      if (address && isConnected) {
+        console.log("历史记录加载失败，重新从API获取");
         fetchHistoryFromApi();
       }
-    }, 5000); // 5秒后检查是否加载成功
+    }, 5000);
     
     return () => clearTimeout(retryTimer);
-  }, [history.length, address, isConnected]);
+  }, [historyError, history.length, address, isConnected]);
   
-  // 使用API获取历史记录
+  // 从API获取第一页历史记录
   const fetchHistoryFromApi = async () => {
     if (!address) return;
     
     try {
       setIsLoading(true);
-      console.log("尝试从API获取历史记录...");
+      console.log("从API获取历史记录...");
       
-      const historyData = await apiClient.getUserRequests(address);
+      const { items: historyData, nextCursor: cursor } = await apiClient.getUserRequests(address);
+      setHistoryError(false);
+      setHistory(historyData);
+      setNextCursor(cursor);
       
-      if (historyData && historyData.length > 0) {
-        console.log("成功从API获取历史记录:", historyData);
-        setHistory(historyData);
-        
+      if (historyData.length > 0) {
         // 获取IPFS详情数据
         loadIpfsDetails(historyData);
       } else {
         console.log("API返回的历史记录为空");
-        
-        // 如果当前历史记录为空，并且API返回为空，尝试再次刷新合约数据
-        if (history.length === 0) {
-          console.log("尝试再次从合约获取数据");
-          setTimeout(() => refetch(), 2000);
-        }
       }
     } catch (error) {
       console.error("从API获取历史记录失败:", error);
+      setHistoryError(true);
       
       // 如果失败并且当前历史为空，尝试使用本地存储的数据
       if (history.length === 0) {
@@ -99,9 +70,9 @@ export function AIAdvisorContract() {
           const cachedHistory = localStorage.getItem('advisorHistory');
           if (cachedHistory) {
             const parsedHistory = JSON.parse(cachedHistory);
-            if (parsedHistory && parsedHistory.length > 0 && parsedHistory[0].address === address) {
+            if (parsedHistory && parsedHistory.address === address && parsedHistory.data?.length > 0) {
               console.log("使用缓存的历史记录");
-              setHistory(parsedHistory.data || []);
+              setHistory(parsedHistory.data);
             }
           }
         } catch (cacheError) {
@@ -113,6 +84,27 @@ export function AIAdvisorContract() {
     }
   }
   
+  // 从API加载更早的一页历史记录，追加到列表末尾
+  const loadMoreHistory = async () => {
+    if (!address || !nextCursor) return;
+    
+    try {
+      setIsLoadingMore(true);
+      const page = await apiClient.getUserRequests(address, undefined, nextCursor);
+      const combined = [...history, ...page.items];
+      setHistory(combined);
+      setNextCursor(page.nextCursor);
+      
+      // 只会加载新记录的IPFS详情，已有详情的记录会被跳过
+      loadIpfsDetails(combined);
+    } catch (error) {
+      console.error("加载更多历史记录失败:", error);
+      alert('加载更多历史记录失败，请稍后重试');
+    } finally {
+      setIsLoadingMore(false);
+    }
+  }
+  
   // 缓存历史记录以备网络问题时使用
   useEffect(() => {
     if (history.length > 0 && address) {
@@ -221,9 +213,7 @@ export function AIAdvisorContract() {
   
   // 刷新历史记录
   const refreshHistory = () => {
-    refetch();
-    // 同时也尝试通过API获取
-    fetchHistoryFromApi();
+    return fetchHistoryFromApi();
   }
   
   /**
@@ -338,20 +328,8 @@ export function AIAdvisorContract() {
 
   // 渲染请求历史
   const renderHistory = () => {
-    // 显示网络错误但有备选方案
-    if (isError && history.length === 0 && retryCount === 0) {
-      return (
-        <div className="error-message">
-          <p>从区块链加载历史数据失败，正在尝试备选方案...</p>
-          <button onClick={fetchHistoryFromApi} className="retry-button">
-            立即重试
-          </button>
-        </div>
-      );
-    }
-    
-    // 完全无法加载数据
-    if (isError && history.length === 0 && retryCount >= 3) {
+    // 无法加载数据且没有缓存
+    if (historyError && history.length === 0) {
       return (
         <div className="error-message">
           <p>无法加载历史数据，请检查网络连接</p>
@@ -462,6 +440,18 @@ export function AIAdvisorContract() {
             </div>
           ))}
         </div>
+        
+        {nextCursor && (
+          <div className="history-load-more">
+            <button
+              onClick={loadMoreHistory}
+              className="retry-button"
+              disabled={isLoadingMore}
+            >
+              {isLoadingMore ? '加载中...' : '加载更早的记录'}
+            </button>
+          </div>
+        )}
       </>
     );
   }